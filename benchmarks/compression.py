@@ -0,0 +1,53 @@
+"""
+Compare stored size and encryption time of blog content with and without compression.
+
+The project's own documentation is used as realistic blog text.
+
+Usage: python -m benchmarks.compression [rounds]
+"""
+import os
+import sys
+import time
+from blog.utils.crypto import encrypt_content, decrypt_content
+
+
+# sizes in characters, up to the default rules.post.content_max_char
+CONTENT_SIZES = (200, 1000, 5000, 10000)
+CORPUS = ('README.md', 'CODE_OF_CONDUCT.md')
+
+
+def load_corpus() -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    corpus = ''
+    for name in CORPUS:
+        with open(os.path.join(root, name), encoding='utf-8') as document:
+            corpus += document.read()
+    return corpus
+
+
+def measure(content: str, compress: bool, rounds: int) -> tuple:
+    start = time.process_time()
+    for _ in range(rounds):
+        encrypted = encrypt_content(content, compress)
+    encrypt_time = (time.process_time() - start) / rounds
+    start = time.process_time()
+    for _ in range(rounds):
+        decrypt_content(encrypted)
+    return len(encrypted), encrypt_time, (time.process_time() - start) / rounds
+
+
+def main(args: list):
+    rounds = int(args[0]) if args else 200
+    corpus = load_corpus()
+    print(f'{rounds} rounds, stored bytes, encrypt / decrypt us cpu')
+    for size in CONTENT_SIZES:
+        content = corpus[:size]
+        results = [(name, measure(content, compress, rounds))
+                   for name, compress in (('plain', False), ('compressed', True))]
+        print(f'{size:>6} chars: ' + ', '.join(
+            f'{name} {stored} bytes {encrypt_time * 1e6:.1f} / {decrypt_time * 1e6:.1f}'
+            for name, (stored, encrypt_time, decrypt_time) in results))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
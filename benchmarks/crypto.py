@@ -0,0 +1,56 @@
+"""
+Compare CPU and wall time spent decrypting batches of blog content.
+
+Usage: python -m benchmarks.crypto [rounds]
+"""
+import sys
+import time
+from blog.constants import BLOG_CONTENT_KEY, BLOG_DECRYPT_WORKERS
+from blog.utils.crypto import AESCipher, encrypt_content, decrypt_many, decrypt_batch, get_cipher, \
+    get_plaintext_cache
+
+
+BATCH_SIZES = (1, 10, 100, 1000)
+
+
+def decrypt_uncached(contents: list) -> list:
+    # key derived for every document, as content was decrypted before ciphers were cached
+    return [AESCipher(BLOG_CONTENT_KEY).decrypt(content) for content in contents]
+
+
+def decrypt_serial(contents: list) -> list:
+    cipher = get_cipher()
+    return [cipher.decrypt(content) for content in contents]
+
+
+def measure(decrypt, contents: list, rounds: int) -> tuple:
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(rounds):
+        decrypt(contents)
+    return (time.perf_counter() - wall) / rounds, (time.process_time() - cpu) / rounds
+
+
+def main(args: list):
+    rounds = int(args[0]) if args else 20
+    # roughly the size of a post's content
+    content = 'content ' * 500
+    legacy, envelope = AESCipher(BLOG_CONTENT_KEY).encrypt(content), encrypt_content(content)
+    print(f'{BLOG_DECRYPT_WORKERS} decrypt workers, {rounds} rounds, wall / cpu ms per batch')
+    print(f'stored size: legacy {len(legacy)} bytes, envelope {len(envelope)} bytes')
+    for size in BATCH_SIZES:
+        envelopes = [encrypt_content(content) for _ in range(size)]
+        # warm the plaintext cache, hot posts are decrypted by every request
+        decrypt_many(envelopes)
+        results = [
+            ('legacy uncached', measure(decrypt_uncached, [legacy] * size, rounds)),
+            ('legacy', measure(decrypt_serial, [legacy] * size, rounds)),
+            ('envelope', measure(decrypt_serial, envelopes, rounds)),
+            ('envelope decrypt_batch', measure(decrypt_batch, envelopes, rounds)),
+            ('envelope cached', measure(decrypt_many, envelopes, rounds))]
+        print(f'{size:>5} documents: ' + ', '.join(
+            f'{name} {wall * 1000:.2f} / {cpu * 1000:.2f}' for name, (wall, cpu) in results))
+    print('plaintext cache: ' + ', '.join(f'{name} {value}' for name, value in get_plaintext_cache().stats().items()))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+"""
+Compare payload size and CPU time of a post collection page served with full content against excerpts.
+
+Posts hold the maximum content allowed by rules.post.content_max_char, no database is required.
+
+Usage: python -m benchmarks.excerpts [page size] [rounds]
+"""
+import copy
+import datetime
+import sys
+import time
+from bson import ObjectId
+from benchmarks.compression import load_corpus
+from blog.core.posts import raw_post_to_v2_dto
+from blog.core.raw import decrypt_posts
+from blog.mediatypes import PostCollectionV2Dto, PostCollectionV2DtoSerializer
+from blog.settings import settings
+from blog.utils.crypto import encrypt_content
+from blog.utils.serializers import to_json
+from blog.utils.text import excerpt
+
+
+def generate_page(size: int, content: bool) -> list:
+    text = load_corpus()[:settings.rules.post.content_max_char]
+    encrypted = encrypt_content(text if content else excerpt(text, settings.rules.post.excerpt_max_char))
+    return [{
+        '_id': ObjectId(),
+        'author': str(ObjectId()),
+        'author_name': 'Benchmark',
+        'title': f'Post {i}',
+        'description': encrypt_content('description'),
+        'content' if content else 'excerpt': encrypted,
+        'tags': ['benchmark', 'excerpts'],
+        'created': datetime.datetime.utcnow()} for i in range(size)]
+
+
+def render(page: list, content: bool) -> str:
+    # mirrors aggregate_posts, excerpts of full content are derived after decryption
+    posts = decrypt_posts(page)
+    for post in posts:
+        post['excerpt'] = excerpt(post['content'] if content else post['excerpt'],
+                                  settings.rules.post.excerpt_max_char)
+    return to_json(PostCollectionV2DtoSerializer, PostCollectionV2Dto(
+        posts=[raw_post_to_v2_dto(post, href=str(post['_id'])) for post in posts]))
+
+
+def measure(page: list, content: bool, rounds: int) -> tuple:
+    # the driver hands out fresh documents for every query
+    pages = [copy.deepcopy(page) for _ in range(rounds)]
+    start = time.process_time()
+    for round_page in pages:
+        payload = render(round_page, content)
+    return len(payload.encode('utf-8')), (time.process_time() - start) / rounds
+
+
+def main(args: list):
+    size = int(args[0]) if args else 50
+    rounds = int(args[1]) if len(args) > 1 else 50
+    print(f'page of {size} posts, {rounds} rounds')
+    content_size, content_time = measure(generate_page(size, True), True, rounds)
+    excerpt_size, excerpt_time = measure(generate_page(size, False), False, rounds)
+    print(f'content:  {content_size} bytes, {content_time * 1000:.2f}ms cpu per page')
+    print(f'excerpts: {excerpt_size} bytes, {excerpt_time * 1000:.2f}ms cpu per page '
+          f'({content_size / excerpt_size:.1f}x smaller, {content_time / excerpt_time:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
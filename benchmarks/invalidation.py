@@ -0,0 +1,101 @@
+"""
+Compare response cache hit ratio under a write heavy mix with resource wide and tag based invalidation.
+
+Reads fetch post pages and post collection pages, popular posts and first pages being read the most. Writes like a
+post, with resource wide invalidation every cached page of the post and post collection resources is evicted, as
+binded resources did, with tag based invalidation only pages including the liked post are evicted.
+
+Requests go through TieredCacheMiddleware as served by the api, responders are replaced by a constant response.
+Requires redis, responses are cached in database 15 of BLOG_REDIS_HOST which is flushed before each run.
+
+Usage: python -m benchmarks.invalidation [posts] [operations] [write ratio]
+"""
+import random
+import sys
+import time
+import falcon
+import inject
+import redis
+from falcon import testing
+from blog.constants import BLOG_REDIS_HOST, BLOG_REDIS_PORT
+from blog.middleware.cache import TieredCacheMiddleware
+from blog.resources.posts import PostResource, PostCollectionResource, PostSearchResource, PostLikeResource
+from blog.utils.cache import POSTS_TAG, post_tag, tag_response, invalidate_response_tags
+
+
+PAGE_SIZE = 10
+SEED = 20
+
+
+class BindedPostLikeResource(PostLikeResource):
+    # likes evicted every cached post and post collection response before responses were tagged
+    binded_resources = [PostResource, PostCollectionResource, PostSearchResource]
+
+
+def pick(count: int) -> int:
+    # skewed towards the first items, as popular posts and first pages are
+    return min(int(random.expovariate(10 / count)), count - 1)
+
+
+def serve(middleware: TieredCacheMiddleware, method: str, resource, params: dict, query: str = '',
+          tags: list = ()) -> bool:
+    """Serve request through the middleware, returns whether the response was cached."""
+    path = resource.url_to('', **params)
+    req = falcon.Request(testing.create_environ(path=path, query_string=query, method=method, host='benchmark'))
+    resp = falcon.Response()
+    middleware.process_resource(req, resp, resource, params)
+    cached = resp.context.get('cached') is not None
+    if method == 'GET' and not cached:
+        resp.body = b'{}'
+        tag_response(resp, tags)
+    elif method != 'GET':
+        invalidate_response_tags(req, tags)
+    middleware.process_response(req, resp, resource, True)
+    return cached
+
+
+def run(middleware: TieredCacheMiddleware, posts: int, operations: int, write_ratio: float, tagged: bool) -> tuple:
+    middleware.client.flushdb()
+    middleware.responses.clear()
+    random.seed(SEED)
+    post_ids = [f'{post_id:024x}' for post_id in range(posts)]
+    pages = posts // PAGE_SIZE
+    post_resource, collection_resource = PostResource(), PostCollectionResource()
+    like_resource = PostLikeResource() if tagged else BindedPostLikeResource()
+    hits = reads = writes = 0
+    write_time = 0
+    for _ in range(operations):
+        if random.random() < write_ratio:
+            post_id = post_ids[pick(posts)]
+            start = time.perf_counter()
+            serve(middleware, 'PUT', like_resource, {'post_id': post_id}, tags=[post_tag(post_id)] if tagged else [])
+            write_time += time.perf_counter() - start
+            writes += 1
+            continue
+        reads += 1
+        if random.random() < 0.5:
+            page = pick(pages)
+            tags = [POSTS_TAG] + [post_tag(post_id) for post_id in post_ids[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]]
+            hits += serve(middleware, 'GET', collection_resource, {}, f'start={page * PAGE_SIZE}&count={PAGE_SIZE}',
+                          tags)
+        else:
+            post_id = post_ids[pick(posts)]
+            hits += serve(middleware, 'GET', post_resource, {'post_id': post_id}, tags=[post_tag(post_id)])
+    middleware.client.flushdb()
+    return hits / max(reads, 1), write_time / max(writes, 1)
+
+
+def main(args: list):
+    posts = int(args[0]) if args else 1000
+    operations = int(args[1]) if len(args) > 1 else 20000
+    write_ratio = float(args[2]) if len(args) > 2 else 0.2
+    middleware = TieredCacheMiddleware(BLOG_REDIS_HOST, BLOG_REDIS_PORT, 15)
+    inject.configure(lambda binder: binder.bind(redis.Redis, middleware.client))
+    print(f'{posts} posts, {operations} operations, {write_ratio:.0%} writes')
+    for name, tagged in (('resource', False), ('tagged', True)):
+        hit_ratio, write_time = run(middleware, posts, operations, write_ratio, tagged)
+        print(f'{name:>8}: hit ratio {hit_ratio:.1%}, {write_time * 1e3:.2f} ms per write')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
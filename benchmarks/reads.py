@@ -0,0 +1,123 @@
+"""
+Compare CPU time spent rendering a page of posts from mongoengine documents against raw mongo documents.
+
+Both paths start from the same encrypted documents as returned by the mongo driver, no database is required.
+Loading posts only to check their author, as resources do before writes, is compared with and without
+decrypting their content up front.
+
+Usage: python -m benchmarks.reads [page size] [rounds]
+"""
+import copy
+import datetime
+import sys
+import time
+from bson import ObjectId
+from blog.core.posts import raw_post_to_v2_dto
+from blog.core.users import get_user
+from blog.core.raw import decrypt_posts
+from blog.db import Post, User
+from blog.mediatypes import PostV2Dto, PostCollectionV2Dto, PostCollectionV2DtoSerializer
+from blog.settings import settings
+from blog.utils.crypto import encrypt_content, decrypt_content
+from blog.utils.identity import IdentityMap, bind_identity_map, release_identity_map
+from blog.utils.serializers import to_json
+from blog.utils.text import excerpt
+
+
+def generate_page(size: int) -> list:
+    author = str(ObjectId())
+    description, content = encrypt_content('description ' * 10), encrypt_content('content ' * 200)
+    return [{
+        '_id': ObjectId(),
+        'author': author,
+        'title': f'Post {i}',
+        'description': description,
+        'content': content,
+        'tags': ['benchmark', 'reads'],
+        'private': False,
+        'featured': False,
+        'created': datetime.datetime.utcnow(),
+        'likes': i,
+        'views': i * 10,
+        'comments': i % 5} for i in range(size)]
+
+
+def post_to_v2_dto(post: Post, href: str = None) -> PostV2Dto:
+    # posts were rendered from mongoengine documents before raw documents were introduced
+    return PostV2Dto(
+        href=href,
+        links=[],
+        author=get_user(post.author).full_name,
+        title=post.title,
+        description=post.decrypted_description,
+        excerpt=excerpt(post.decrypted_content, settings.rules.post.excerpt_max_char),
+        content=post.decrypted_content,
+        comments=post.comments,
+        tags=post.tags,
+        private=post.private,
+        featured=post.featured,
+        created=post.created,
+        edited=post.edited,
+        likes=post.likes,
+        views=post.views)
+
+
+def render_documents(page: list) -> str:
+    posts = [Post._from_son(son) for son in page]
+    return to_json(PostCollectionV2DtoSerializer, PostCollectionV2Dto(
+        posts=[post_to_v2_dto(post, href=str(post.id)) for post in posts]))
+
+
+def render_raw(page: list) -> str:
+    # author names are joined by the post aggregation
+    for post in decrypt_posts(page):
+        post['author_name'] = 'Benchmark'
+    return to_json(PostCollectionV2DtoSerializer, PostCollectionV2Dto(
+        posts=[raw_post_to_v2_dto(post, href=str(post['_id'])) for post in page]))
+
+
+def check_eager(page: list) -> list:
+    # content decrypted as soon as posts were loaded
+    posts = [Post._from_son(son) for son in page]
+    for post in posts:
+        post.description, post.content = decrypt_content(post.description), decrypt_content(post.content)
+    return [post.author for post in posts]
+
+
+def check_lazy(page: list) -> list:
+    return [post.author for post in [Post._from_son(son) for son in page]]
+
+
+def measure(render, page: list, rounds: int) -> float:
+    # the driver hands out fresh documents for every query
+    pages = [copy.deepcopy(page) for _ in range(rounds)]
+    start = time.process_time()
+    for round_page in pages:
+        render(round_page)
+    return (time.process_time() - start) / rounds
+
+
+def main(args: list):
+    size = int(args[0]) if args else 50
+    rounds = int(args[1]) if len(args) > 1 else 100
+    page = generate_page(size)
+    # author lookups are served from the identity map so only rendering is measured
+    identity_map = IdentityMap()
+    identity_map.add(User(id=ObjectId(page[0]['author']), full_name='Benchmark'))
+    bind_identity_map(identity_map)
+    try:
+        documents = measure(render_documents, page, rounds)
+        raw = measure(render_raw, page, rounds)
+        eager = measure(check_eager, page, rounds)
+        lazy = measure(check_lazy, page, rounds)
+    finally:
+        release_identity_map()
+    print(f'page of {size} posts, {rounds} rounds')
+    print(f'documents: {documents * 1000:.2f}ms cpu per page')
+    print(f'raw:       {raw * 1000:.2f}ms cpu per page ({documents / raw:.1f}x)')
+    print(f'author checks, eager decryption: {eager * 1000:.2f}ms cpu per page')
+    print(f'author checks, lazy decryption:  {lazy * 1000:.2f}ms cpu per page ({eager / lazy:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
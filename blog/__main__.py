@@ -1,6 +1,6 @@
 from alley import Migrations
 from blog.blog import api
-from blog.constants import BLOG_HOST, BLOG_PORT, BLOG_WORKERS, BLOG_RUN_MIGRATIONS
+from blog.constants import BLOG_HOST, BLOG_PORT, BLOG_WORKERS, BLOG_THREADS, BLOG_RUN_MIGRATIONS
 from blog.db import db
 import gunicorn.app.base
 import os
@@ -33,5 +33,6 @@ if __name__ == '__main__':
     options = {
         'bind': f'{BLOG_HOST}:{BLOG_PORT}',
         'workers': BLOG_WORKERS,
+        'threads': BLOG_THREADS,
     }
     BlogStandalone(api, options).run()
@@ -3,9 +3,13 @@ import falcon
 import redis
 from blog.constants import BLOG_REDIS_HOST, BLOG_REDIS_PORT
 from blog.errors import ErrorHandler
+from blog.middleware.cache import TieredCacheMiddleware
+from blog.middleware.identity import IdentityMapProcessor
+from blog.middleware.limits import RateLimitProcessor
+from blog.middleware.pagination import CursorPaginationProcessor
 from blog.middleware.users import UserProcessor
 from blog.resources.comments import CommentResource
-from blog.resources.admin import BlogSettingsResource
+from blog.resources.admin import BlogSettingsResource, BlogMetricsResource
 from blog.resources.posts import PostCollectionResource, PostResource, PostLikeResource, \
     PostViewResource, PostCommentResource, PostSearchResource
 from blog.resources.users import UserAuthenticationResource, UserRegistrationResource, UserResource, \
@@ -14,20 +18,25 @@ from blog.resources.service import ServiceDescriptionResource
 from blog.settings import settings
 
 from falcon_multipart.middleware import MultipartMiddleware
-from falcon_pagination_processor import PaginationProcessor
-from falcon_redis_cache.middleware import RedisCacheMiddleware
 
 
-api = falcon.API(middleware=[PaginationProcessor(),
-                             RedisCacheMiddleware(redis_host=BLOG_REDIS_HOST, redis_port=BLOG_REDIS_PORT),
+response_cache = TieredCacheMiddleware(redis_host=BLOG_REDIS_HOST, redis_port=BLOG_REDIS_PORT)
+api = falcon.API(middleware=[IdentityMapProcessor(),
+                             CursorPaginationProcessor(),
+                             response_cache,
                              MultipartMiddleware(),
-                             UserProcessor()])
+                             UserProcessor(),
+                             RateLimitProcessor()])
+
+# stale responses are re-rendered through the api
+response_cache.bind(api)
 
 api.add_error_handler(Exception, ErrorHandler.unexpected)
 api.add_error_handler(falcon.HTTPError, ErrorHandler.http)
 api.add_error_handler(falcon.HTTPStatus, ErrorHandler.http)
 
 api.add_route(BlogSettingsResource.route, BlogSettingsResource())
+api.add_route(BlogMetricsResource.route, BlogMetricsResource())
 api.add_route(CommentResource.route, CommentResource())
 api.add_route(PostResource.route, PostResource())
 api.add_route(PostCollectionResource.route, PostCollectionResource())
@@ -3,6 +3,10 @@ import os
 # constants for r2dto serializer validators
 EMAIL_PATTERN = r'(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)'
 USERNAME_PATTERN = r'([a-zA-Z0-9]{,})$'
+# password cost bounds by algorithm, pbkdf2 iterations and log2 of the scrypt work factor
+PASSWORD_COST_RANGES = {
+    'pbkdf2_sha256': (10000, 10000000),
+    'scrypt': (10, 20)}
 
 BLOG_TEST = os.environ.get('BLOG_TEST', '').lower() == 'true'
 
@@ -12,11 +16,45 @@ BLOG_RUN_MIGRATIONS = os.environ.get('BLOG_RUN_MIGRATIONS', '').lower() == 'true
 # all blog content will be cnrypted before entering the database
 # likewise all blog content must be decoded
 BLOG_CONTENT_KEY = os.environ.get('BLOG_CONTENT_KEY', 'mWmYSBcSzfhGuLCRvqc3A9xK')
+# further content keys by key id as comma separated "id:key" pairs, BLOG_CONTENT_KEY is key 0
+BLOG_CONTENT_KEYS = dict(
+    [(0, BLOG_CONTENT_KEY)] +
+    [(int(key_id), key) for key_id, key in (pair.split(':', 1)
+     for pair in os.environ.get('BLOG_CONTENT_KEYS', '').split(',') if pair)])
+# key new content is encrypted with, rotated content is re-encrypted with blog.jobs.reencrypt
+BLOG_CONTENT_KEY_ID = int(os.environ.get('BLOG_CONTENT_KEY_ID', '0'))
+# key ids are stored in a single byte of every content envelope
+if not all(0 <= key_id <= 255 for key_id in list(BLOG_CONTENT_KEYS) + [BLOG_CONTENT_KEY_ID]):
+    raise ValueError('Content key ids of BLOG_CONTENT_KEYS and BLOG_CONTENT_KEY_ID must be between 0 and 255.')
+# blog content of at least this many bytes is compressed before being encrypted
+BLOG_COMPRESS_THRESHOLD = int(os.environ.get('BLOG_COMPRESS_THRESHOLD', '512'))
+# keys blind index tokens used to search encrypted content, changing it requires re-running migration 0005
+BLOG_SEARCH_KEY = os.environ.get('BLOG_SEARCH_KEY', 'k8QcWv2ZtRn5HxPd7LmYa3Ue')
+# threads used to decrypt large batches of blog content, aes releases the gil
+BLOG_DECRYPT_WORKERS = int(os.environ.get('BLOG_DECRYPT_WORKERS', str(os.cpu_count() or 1)))
+# bytes of decrypted blog content cached in memory by each process, caching is disabled with 0
+BLOG_DECRYPT_CACHE_SIZE = int(os.environ.get('BLOG_DECRYPT_CACHE_SIZE', str(32 * 1024 * 1024)))
 
 # blog api specifications
 BLOG_HOST = os.environ.get('BLOG_HOST', '0.0.0.0')
 BLOG_PORT = int(os.environ.get('BLOG_PORT', '8000'))
 BLOG_WORKERS = int(os.environ.get('BLOG_WORKERS', '1'))
+# threads per worker, allows requests to be served while others wait on password hashing
+BLOG_THREADS = int(os.environ.get('BLOG_THREADS', '4'))
+# bytes of rendered responses cached in memory by each process, in front of redis, caching is disabled with 0
+BLOG_RESPONSE_CACHE_SIZE = int(os.environ.get('BLOG_RESPONSE_CACHE_SIZE', str(16 * 1024 * 1024)))
+# time in seconds responses are cached in memory, bounds staleness should an invalidation broadcast be missed
+BLOG_RESPONSE_CACHE_TTL = int(os.environ.get('BLOG_RESPONSE_CACHE_TTL', '5'))
+# time in seconds a worker may hold the lease to render a missing response, coalescing is disabled with 0
+BLOG_RESPONSE_LEASE_TIME = float(os.environ.get('BLOG_RESPONSE_LEASE_TIME', '5'))
+# time in seconds requests wait for a leased response before serving a stale copy or rendering it themselves
+BLOG_RESPONSE_LEASE_WAIT = float(os.environ.get('BLOG_RESPONSE_LEASE_WAIT', '1'))
+# threads per process re-rendering cached responses past their soft ttl
+BLOG_RESPONSE_REFRESH_WORKERS = int(os.environ.get('BLOG_RESPONSE_REFRESH_WORKERS', '2'))
+# authenticated users cached in memory by each process, session caching is disabled with 0
+BLOG_SESSION_CACHE_SIZE = int(os.environ.get('BLOG_SESSION_CACHE_SIZE', '10000'))
+# cache authenticated users in redis, shared by every worker, rather than in process
+BLOG_SESSION_CACHE_REDIS = os.environ.get('BLOG_SESSION_CACHE_REDIS', '').lower() == 'true'
 
 # blog redis specifications
 BLOG_REDIS_HOST = os.environ.get('BLOG_REDIS_HOST', '127.0.0.1')
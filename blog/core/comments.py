@@ -1,11 +1,14 @@
 import datetime
+from bson import ObjectId
 from mongoengine import DoesNotExist, ValidationError, MultipleObjectsReturned, NotUniqueError
 from blog.constants import BLOG_CONTENT_KEY
-from blog.core.users import get_user
-from blog.db import Comment, CommentLike
+from blog.core.likes import set_like
+from blog.core.raw import read_comments
+from blog.db import Comment, CommentLike, Post
 from blog.errors import CommentNotFoundError
 from blog.mediatypes import CommentDto, CommentFormDto
-from blog.utils.crypto import encrypt_content, decrypt_content
+from blog.utils.crypto import encrypt_content
+from blog.utils.identity import current_identity_map
 
 
 def get_comment(comment_id: str) -> Comment:
@@ -15,14 +18,31 @@ def get_comment(comment_id: str) -> Comment:
     :param comment_id: Identifier of comment to fetch.
     :type comment_id: str
     """
-    try:
-        comment = Comment.objects.get(pk=comment_id)
-        comment.content = decrypt_content(comment.content)
+    identity_map = current_identity_map()
+    comment = identity_map.get(Comment, comment_id)
+    if comment:
         return comment
+    try:
+        # content is decrypted lazily, most callers only check existence or ownership
+        return identity_map.add(Comment.objects.get(pk=comment_id))
     except (DoesNotExist, ValidationError):
         raise CommentNotFoundError()
 
 
+def get_raw_comment(comment_id: str) -> dict:
+    """
+    Fetch existing comment resource as a read only raw mongo document.
+
+    :param comment_id: Identifier of comment to fetch.
+    :type comment_id: str
+    :return: dict
+    """
+    comments = read_comments(Comment.objects(pk=comment_id)) if ObjectId.is_valid(comment_id) else []
+    if not comments:
+        raise CommentNotFoundError()
+    return comments[0]
+
+
 def edit_comment(comment_id: str, comment_form_dto: CommentFormDto):
     """
     Edit existing comment resource.
@@ -34,9 +54,11 @@ def edit_comment(comment_id: str, comment_form_dto: CommentFormDto):
     comment.content = encrypt_content(comment_form_dto.content)
     comment.editted = datetime.datetime.utcnow()
     comment.save()
+    # stored comment holds encrypted content, ensure it is fetched again on next lookup
+    current_identity_map().discard(Comment, comment_id)
 
 
-def like_comment(comment_id: str, user_id: str):
+def like_comment(comment_id: str, user_id: str, liked: bool = None) -> tuple:
     """
     Like or dislike existing comment resource.
 
@@ -44,13 +66,15 @@ def like_comment(comment_id: str, user_id: str):
     :type comment_id: str
     :param user_id: Identifier of user to like or dislike comment.
     :type user_id: str
+    :param liked: Like comment if true, dislike if false, toggle if not provided.
+    :type liked: bool
+    :return: (bool, int) whether comment is liked and number of comment likes
     """
-    try:
-        comment_like = CommentLike.objects.get(comment_id=comment_id, user_id=user_id)
-    except DoesNotExist:
-        CommentLike(comment_id=comment_id, user_id=user_id).save()
-    else:
-        comment_like.delete()
+    result = set_like(CommentLike, Comment, 'comment_id', comment_id, user_id, liked)
+    if not result:
+        raise CommentNotFoundError()
+    current_identity_map().discard(Comment, comment_id)
+    return result
 
 
 def delete_comment(comment_id: str):
@@ -60,25 +84,31 @@ def delete_comment(comment_id: str):
     :param comment_id: Identifier of comment to delete.
     :type comment_id: str
     """
-    get_comment(comment_id).delete()
+    comment = get_comment(comment_id)
+    comment.delete()
+    current_identity_map().discard(Comment, comment_id)
+    Post.objects(pk=comment.post_id).update_one(dec__comments=1)
 
 
-def comment_to_dto(comment: Comment, href: str = None, links: list = None) -> CommentDto:
+def raw_comment_to_dto(comment: dict, authors: dict, href: str = None, links: list = None) -> CommentDto:
     """
-    Convert comment resource to data transfer object.
+    Convert raw comment resource to data transfer object.
 
-    :param comment: Comment resource to convert.
-    :type comment: Comment
-    :param href: Post resource href link.
+    :param comment: Raw comment resource to convert.
+    :type comment: dict
+    :param authors: Usernames of comment authors by identifier.
+    :type authors: dict
+    :param href: Comment resource href link.
     :type href: str
+    :param links: Comment resource links.
+    :type links: list
     :return: CommentDto
     """
-    likes = CommentLike.objects(comment_id=comment.id)
     return CommentDto(
         href=href,
         links=links,
-        author=get_user(comment.author).username,
-        content=comment.content,
-        created=comment.created,
-        edited=comment.edited,
-        likes=len(likes))
+        author=authors.get(comment['author']),
+        content=comment['content'],
+        created=comment.get('created'),
+        edited=comment.get('edited'),
+        likes=comment.get('likes', 0))
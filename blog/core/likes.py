@@ -0,0 +1,69 @@
+import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def count_like(target_document, target_id: str, delta: int):
+    """
+    Update like counter of existing resource.
+
+    :param target_document: Mongo document class of liked resource, must have a likes counter.
+    :type target_document: Document
+    :param target_id: Identifier of liked resource.
+    :type target_id: str
+    :param delta: Number of likes to add, negative to remove.
+    :type delta: int
+    :return: int or None if resource does not exist
+    """
+    target = target_document._get_collection().find_one_and_update(
+        {'_id': ObjectId(target_id)}, {'$inc': {'likes': delta}},
+        projection={'likes': True}, return_document=ReturnDocument.AFTER)
+    return target['likes'] if target else None
+
+
+def set_like(like_document, target_document, target_field: str, target_id: str, user_id: str,
+             liked: bool = None) -> tuple:
+    """
+    Like, dislike, or toggle like of existing resource.
+
+    Note: Relies on the unique (target, user) like index, concurrent requests can neither duplicate
+    likes nor drift the target's like counter.
+
+    :param like_document: Mongo document class storing likes.
+    :type like_document: Document
+    :param target_document: Mongo document class of liked resource, must have a likes counter.
+    :type target_document: Document
+    :param target_field: Like document field referencing liked resource.
+    :type target_field: str
+    :param target_id: Identifier of resource to like or dislike.
+    :type target_id: str
+    :param user_id: Identifier of user to like or dislike resource.
+    :type user_id: str
+    :param liked: Desired like state, current state is toggled if not provided.
+    :type liked: bool
+    :return: (bool, int) or None if resource does not exist
+    """
+    if not ObjectId.is_valid(target_id):
+        return None
+    likes = like_document._get_collection()
+    query = {target_field: target_id, 'user_id': user_id}
+    if liked is None:
+        # the delete result picks the single write that follows, existing likes are removed
+        liked = not likes.find_one_and_delete(query, projection={'_id': True})
+        delta = 1 if liked else -1
+    elif liked:
+        delta = 1
+    else:
+        delta = -likes.delete_one(query).deleted_count
+    # the counter is updated first so likes are never written for resources which do not exist
+    count = count_like(target_document, target_id, delta)
+    if count is None:
+        return None
+    if liked:
+        try:
+            likes.insert_one(dict(query, time=datetime.datetime.utcnow()))
+        except DuplicateKeyError:
+            # like already exists, counted when it was inserted
+            count = count_like(target_document, target_id, -1)
+    return liked, count
@@ -1,94 +1,217 @@
 import datetime
+import itertools
+import re
 import time
-from mongoengine import DoesNotExist, ValidationError, MultipleObjectsReturned, NotUniqueError, \
-    InvalidQueryError, Q
+import inject
+import redis
+from bson import ObjectId
+from mongoengine import DoesNotExist, ValidationError, MultipleObjectsReturned, NotUniqueError
+from blog.core.likes import set_like
+from blog.core.raw import POST_FIELDS, decrypt_posts, read_comments
 from blog.core.users import get_user, get_user_comments
-from blog.db import Post, PostLike, PostView, PostSearchRequest, Comment, User
-from blog.errors import PostNotFoundError, ResourceNotAvailableError
+from blog.db import Post, PostLike, Comment, User
+from blog.errors import PostNotFoundError, SearchQueryTooShortError
 from blog.mediatypes import LinkDto, PostViewDto, PostDto, PostFormDto, CommentFormDto, \
     PostSearchSettingsDto, PostSearchOptions, PostV2Dto
 from blog.settings import settings
-from blog.utils.crypto import encrypt_content, decrypt_content
-
-
-def search_posts(post_search_settings: PostSearchSettingsDto, user_id, start: int = None, count: int = None) -> list:
+from blog.utils.crypto import encrypt_content, blind_index
+from blog.utils.identity import current_identity_map
+from blog.utils.pagination import paginate, paginate_pipeline
+from blog.utils.text import excerpt
+
+
+POST_VIEW_STREAM = 'post-views'
+# only the first view within the view time delay is buffered, the view is marked and streamed in a single round trip
+VIEW_SCRIPT = '''
+if redis.call('set', KEYS[1], 1, 'nx', 'ex', ARGV[1]) then
+    redis.call('xadd', KEYS[2], '*', 'post_id', ARGV[2], 'user_id', ARGV[3], 'ip_address', ARGV[4], 'seen', ARGV[5])
+    return 1
+end
+return 0
+'''
+# candidate posts of encrypted field searches decrypted and verified at a time
+SEARCH_BATCH_SIZE = 100
+
+
+def search_posts(post_search_settings: PostSearchSettingsDto, start: int = None, count: int = None,
+                 cursor: str = None, content: bool = False) -> list:
     """
     Search for an existing post resource.
 
     :param post_search_settings: Post search settings
     :type post_search_settings: PostSearchSettingsDto
-    :param user_id: Identifier of user creating search request.
-    :type user_id: str
     :param start: Used for pagination, specify where to start.
     :type start: int
     :param count: Used for pagination, specify number of posts to find.
     :type count: int
+    :param cursor: Used for pagination, cursor of the last post from the previous page.
+    :type cursor: str
+    :param content: Include full post content, only excerpts are returned otherwise.
+    :type content: bool
     """
-    post_search_requests = PostSearchRequest.objects(user_id=user_id).order_by('-time')
+    # note: search requests are rate limited by the is_search_available hook
 
-    # verify post request hasn't been made within provided parameters
-    if post_search_requests:
-        now = datetime.datetime.utcnow().timestamp()
-        if now - post_search_requests[0].time.timestamp() <= settings.post.search_time_delay:
-            raise ResourceNotAvailableError()
-
-    # log post search request
-    PostSearchRequest(
-        user_id=user_id,
-        query=post_search_settings.query,
-        options=post_search_settings.options).save()
-
-    queries = {}
+    match = {}
 
     if PostSearchOptions.TITLE in post_search_settings.options:
-        queries['title__contains'] = post_search_settings.query
+        match['title'] = {'$regex': re.escape(post_search_settings.query)}
 
     if PostSearchOptions.TAGS in post_search_settings.options:
-        queries['tags__contains'] = post_search_settings.query
+        match['tags'] = {'$regex': re.escape(post_search_settings.query)}
 
-    try:
-        posts = Post.objects(Q(**queries))
-    except InvalidQueryError:
-        posts = Post.objects()
-
-    # TODO: research how to optimize search queries for encrypted content
+    if PostSearchOptions.AUTHOR in post_search_settings.options:
+        author_id = User.objects(username=post_search_settings.query).scalar('id').first()
+        if not author_id:
+            return []
+        # filter posts by author username
+        match['author'] = str(author_id)
+
+    encrypted_options = {PostSearchOptions.CONTENT, PostSearchOptions.DESCRIPTION} & \
+        set(post_search_settings.options)
+    if not encrypted_options:
+        return aggregate_posts(match, start, count, cursor, content)
+
+    # encrypted fields are narrowed down by their blind index, only candidates are decrypted and verified
+    query_tokens = blind_index(post_search_settings.query)
+    if not query_tokens:
+        # every post would be a candidate, each of them decrypted
+        raise SearchQueryTooShortError()
+    if PostSearchOptions.CONTENT in encrypted_options:
+        match['content_tokens'] = {'$all': query_tokens}
+    if PostSearchOptions.DESCRIPTION in encrypted_options:
+        match['description_tokens'] = {'$all': query_tokens}
+
+    # cursor has already been applied to the query, results continue from first match
+    start = 0 if cursor else start or 0
+    end = start + count if count else None
+
+    # tokens only narrow down candidates, matches are verified one batch at a time until the page is filled
+    posts = []
+    # content is only decrypted when it must be verified or returned
+    batches = stream_posts(match, cursor, content or PostSearchOptions.CONTENT in encrypted_options,
+                           max(count or 0, SEARCH_BATCH_SIZE))
+    for batch in batches:
+        if PostSearchOptions.CONTENT in encrypted_options:
+            batch = [post for post in batch if post_search_settings.query in post['content']]
+            if not content:
+                for post in batch:
+                    del post['content']
+        if PostSearchOptions.DESCRIPTION in encrypted_options:
+            batch = [post for post in batch if post_search_settings.query in post['description']]
+        posts.extend(batch)
+        if end and len(posts) >= end:
+            batches.close()
+            break
+
+    return posts[start:end]
+
+
+def get_posts(start=None, count=None, cursor=None, content: bool = False) -> list:
+    """
+    Fetches collection of post resources.
 
-    for post in posts:
-        post.description = decrypt_content(post.description)
-        post.content = decrypt_content(post.content)
+    :param start: Used for pagination, specify where to start.
+    :type start: int
+    :param count: Used for pagination, specify number of posts to find.
+    :type count: int
+    :param cursor: Used for pagination, cursor of the last post from the previous page.
+    :type cursor: str
+    :param content: Include full post content, only excerpts are returned otherwise.
+    :type content: bool
+    :return: [dict, ...]
+    """
+    return aggregate_posts({'private': False}, start, count, cursor, content)
 
-    if PostSearchOptions.CONTENT in post_search_settings.options:
-        posts = [post for post in posts if post_search_settings.query in post.content]
 
-    if PostSearchOptions.DESCRIPTION in post_search_settings.options:
-        posts = [post for post in posts if post_search_settings.query in post.description]
+def aggregate_posts(match: dict, start: int = None, count: int = None, cursor: str = None,
+                    content: bool = True) -> list:
+    """
+    Fetch page of raw post resources along with their author's full name in a single aggregation.
 
-    if PostSearchOptions.AUTHOR in post_search_settings.options:
-        try:
-            author = User.objects.get(username=post_search_settings.query)
-            # filter posts by author username
-            posts = [post for post in posts if post.author == str(author.id)]
-        except DoesNotExist:
-            posts = []
+    Note: Engagement counters are stored on posts, the page is built in one round trip regardless of size.
 
-    return posts[start:start + count] if start and count else posts
+    :param match: Mongo query posts must match.
+    :type match: dict
+    :param start: Used for pagination, specify where to start.
+    :type start: int
+    :param count: Used for pagination, specify number of posts to find.
+    :type count: int
+    :param cursor: Used for pagination, cursor of the last post from the previous page.
+    :type cursor: str
+    :param content: Fetch and decrypt full post content, only the stored excerpt is fetched otherwise.
+    :type content: bool
+    :return: [dict, ...]
+    """
+    posts = decrypt_posts(list(Post._get_collection().aggregate(post_pipeline(match, start, count, cursor, content))))
+    return excerpt_posts(posts, content)
 
 
-def get_posts(start=None, count=None) -> list:
+def stream_posts(match: dict, cursor: str = None, content: bool = True, batch_size: int = SEARCH_BATCH_SIZE):
     """
-    Fetches collection of post resources.
+    Fetch raw post resources along with their author's full name in batches, see aggregate_posts.
+
+    Note: Posts are only fetched and decrypted a batch at a time, close the generator once enough posts are found.
+
+    :param match: Mongo query posts must match.
+    :type match: dict
+    :param cursor: Used for pagination, cursor of the last post from the previous page.
+    :type cursor: str
+    :param content: Fetch and decrypt full post content, only the stored excerpt is fetched otherwise.
+    :type content: bool
+    :param batch_size: Number of posts fetched and decrypted at a time.
+    :type batch_size: int
+    :return: generator of [dict, ...]
+    """
+    aggregate = Post._get_collection().aggregate(post_pipeline(match, cursor=cursor, content=content),
+                                                 batchSize=batch_size)
+    with aggregate:
+        while True:
+            batch = list(itertools.islice(aggregate, batch_size))
+            if not batch:
+                return
+            yield excerpt_posts(decrypt_posts(batch), content)
+
+
+def post_pipeline(match: dict, start: int = None, count: int = None, cursor: str = None,
+                  content: bool = True) -> list:
+    """
+    Construct aggregation stages fetching page of raw post resources along with their author's full name.
 
+    :param match: Mongo query posts must match.
+    :type match: dict
     :param start: Used for pagination, specify where to start.
     :type start: int
     :param count: Used for pagination, specify number of posts to find.
     :type count: int
-    :return: [Post, ...]
+    :param cursor: Used for pagination, cursor of the last post from the previous page.
+    :type cursor: str
+    :param content: Fetch full post content, only the stored excerpt is fetched otherwise.
+    :type content: bool
+    :return: [dict, ...]
     """
-    posts = Post.objects.get_public()[start:start + count] \
-        if start and count else Post.objects.get_public()
+    fields = {field: True for field in POST_FIELDS if field != 'id'}
+    if not content:
+        # posts stored before excerpts were introduced fall back to their content
+        del fields['content']
+        fields['excerpt'] = {'$ifNull': ['$excerpt', '$content']}
+    return paginate_pipeline(match, start, count, cursor) + [
+        {'$project': fields},
+        # authors are referenced by string identifier, converted to join on the user _id index
+        {'$addFields': {'author_id': {
+            '$convert': {'input': '$author', 'to': 'objectId', 'onError': None, 'onNull': None}}}},
+        {'$lookup': {
+            'from': User._get_collection_name(),
+            'localField': 'author_id',
+            'foreignField': '_id',
+            'as': 'author_name'}},
+        {'$addFields': {'author_name': {'$arrayElemAt': ['$author_name.full_name', 0]}}},
+        {'$project': {'author_id': False}}]
+
+
+def excerpt_posts(posts: list, content: bool = True) -> list:
     for post in posts:
-        post.description = decrypt_content(post.description)
-        post.content = decrypt_content(post.content)
+        post['excerpt'] = excerpt(post['content'] if content else post['excerpt'],
+                                  settings.rules.post.excerpt_max_char)
     return posts
 
 
@@ -111,6 +234,9 @@ def create_post(user_id: str, post_form_dto: PostFormDto):
     post.title = post_form_dto.title
     post.description = encrypt_content(post_form_dto.description)
     post.content = encrypt_content(post_form_dto.content)
+    post.excerpt = encrypt_content(excerpt(post_form_dto.content, settings.rules.post.excerpt_max_char))
+    post.description_tokens = blind_index(post_form_dto.description)
+    post.content_tokens = blind_index(post_form_dto.content)
     post.tags = post_form_dto.tags
     post.save()
 
@@ -123,15 +249,31 @@ def get_post(post_id: str) -> Post:
     :type post_id: str
     :return: Post
     """
-    try:
-        post = Post.objects.get(pk=post_id)
-        post.description = decrypt_content(post.description)
-        post.content = decrypt_content(post.content)
+    identity_map = current_identity_map()
+    post = identity_map.get(Post, post_id)
+    if post:
         return post
+    try:
+        # content is decrypted lazily, most callers only check existence or ownership
+        return identity_map.add(Post.objects.get(pk=post_id))
     except (DoesNotExist, ValidationError):
         raise PostNotFoundError()
 
 
+def get_raw_post(post_id: str) -> dict:
+    """
+    Fetch existing post resource as a read only raw mongo document.
+
+    :param post_id: Identifier of post to fetch.
+    :type post_id: str
+    :return: dict
+    """
+    posts = aggregate_posts({'_id': ObjectId(post_id)}) if ObjectId.is_valid(post_id) else []
+    if not posts:
+        raise PostNotFoundError()
+    return posts[0]
+
+
 def edit_post(post_id: str, post_form_dto: PostFormDto):
     """
     Edit existing post resource.
@@ -143,11 +285,17 @@ def edit_post(post_id: str, post_form_dto: PostFormDto):
     post.title = post_form_dto.title or post.title
     post.description = encrypt_content(post_form_dto.description) or post.description
     post.content = encrypt_content(post_form_dto.content) or post.content
+    post.excerpt = encrypt_content(excerpt(post_form_dto.content, settings.rules.post.excerpt_max_char)) or \
+        post.excerpt
+    post.description_tokens = blind_index(post_form_dto.description) or post.description_tokens
+    post.content_tokens = blind_index(post_form_dto.content) or post.content_tokens
     post.tags = list(set(post.tags + post_form_dto.tags))
     post.private = post_form_dto.private or post.private
     post.featured = post_form_dto.featured or post.featured
     post.edited = datetime.datetime.utcnow()
     post.save()
+    # stored post holds encrypted content, ensure it is fetched again on next lookup
+    current_identity_map().discard(Post, post_id)
 
 
 def create_post_comment(post_id: str, user_id: str, comment_form_dto: CommentFormDto):
@@ -167,6 +315,7 @@ def create_post_comment(post_id: str, user_id: str, comment_form_dto: CommentFor
     comment.author = user_id
     comment.content = encrypt_content(comment_form_dto.content)
     comment.save()
+    Post.objects(pk=post_id).update_one(inc__comments=1)
 
 
 def view_post(post_id: str, user_id: str, host: str):
@@ -180,14 +329,17 @@ def view_post(post_id: str, user_id: str, host: str):
     :param host: Host location post was viewed at.
     :type host: str
     """
-    get_post(post_id) # ensure post exists
-    post_view = PostView.objects(post_id=post_id, user_id=user_id, ip_address=host).order_by('-id').first()
-    now = datetime.datetime.utcnow().timestamp()
-    if not post_view or now - post_view.seen.timestamp() >= settings.post.view_time_delay:
-        PostView(post_id=post_id, user_id=user_id, ip_address=host).save()
+    # views are buffered in redis and written to mongo in bulk by blog.jobs.views, which discards views of posts
+    # that do not exist
+    if not ObjectId.is_valid(post_id):
+        raise PostNotFoundError()
+    client = inject.instance(redis.Redis)
+    client.register_script(VIEW_SCRIPT)(
+        keys=[f'{POST_VIEW_STREAM}:{post_id}:{user_id}:{host}', POST_VIEW_STREAM],
+        args=[max(settings.post.view_time_delay, 1), post_id, user_id, host, datetime.datetime.utcnow().timestamp()])
 
 
-def like_post(post_id: str, user_id: str):
+def like_post(post_id: str, user_id: str, liked: bool = None) -> tuple:
     """
     Like or dislike existing post resource.
 
@@ -195,14 +347,15 @@ def like_post(post_id: str, user_id: str):
     :type post_id: str
     :param user_id: Identifier of user to like or dislike post.
     :type user_id: str
+    :param liked: Like post if true, dislike if false, toggle if not provided.
+    :type liked: bool
+    :return: (bool, int) whether post is liked and number of post likes
     """
-    get_post(post_id) # ensure post exists
-    try:
-        post_like = PostLike.objects.get(post_id=post_id, user_id=user_id)
-    except DoesNotExist:
-        PostLike(post_id=post_id, user_id=user_id).save()
-    else:
-        post_like.delete()
+    result = set_like(PostLike, Post, 'post_id', post_id, user_id, liked)
+    if not result:
+        raise PostNotFoundError()
+    current_identity_map().discard(Post, post_id)
+    return result
 
 
 def delete_post(post_id: str):
@@ -213,6 +366,7 @@ def delete_post(post_id: str):
     :type post_id: str
     """
     get_post(post_id).delete()
+    current_identity_map().discard(Post, post_id)
 
 
 def get_post_comments(post_id: str, start: int = None, count: int = None) -> list:
@@ -225,12 +379,9 @@ def get_post_comments(post_id: str, start: int = None, count: int = None) -> lis
     :type start: int
     :param count: Used for pagination, specify number of posts to find.
     :type count: int
-    :return: [Comment, ...]
+    :return: [dict, ...]
     """
-    comments = Comment.objects(post_id=post_id)[start:count]
-    for comment in comments:
-        comment.content = decrypt_content(comment.content)
-    return comments
+    return read_comments(paginate(Comment.objects(post_id=post_id), start, count))
 
 
 def get_user_posts(user_id: str, start: int = None, count: int = None) -> list:
@@ -243,9 +394,9 @@ def get_user_posts(user_id: str, start: int = None, count: int = None) -> list:
     :type start: int
     :param count: Used for pagination, specify number of posts to find.
     :type count: int
-    :return: [Post, ...]
+    :return: [dict, ...]
     """
-    return Post.objects.get(author=user_id)[start:count]
+    return aggregate_posts({'author': user_id}, start, count)
 
 
 def get_user_liked_posts(user_id: str, start: int = None, count: int = None) -> list:
@@ -258,71 +409,68 @@ def get_user_liked_posts(user_id: str, start: int = None, count: int = None) ->
     :type start: int
     :param count: Used for pagination, specify number of posts to find.
     :type count: int
-    :return: [Post, ...]
+    :return: [dict, ...]
     """
-    post_likes = PostLike.objects(user_id=user_id)[start:count]
-    return [Post.objects.get(post_id=pl.post_id) for pl in post_likes]
+    post_ids = list(paginate(PostLike.objects(user_id=user_id), start, count, key='time').scalar('post_id'))
+    posts = {str(post['_id']): post for post in aggregate_posts(
+        {'_id': {'$in': [ObjectId(post_id) for post_id in post_ids if ObjectId.is_valid(post_id)]}})}
+    # preserve order in which posts were liked
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
 
 
-def post_to_dto(post: Post, href: str = None, links: list = None) -> PostDto:
+def raw_post_to_dto(post: dict, href: str = None, links: list = None) -> PostDto:
     """
-    Converts post resource into data transfer object.
+    Converts raw post resource into data transfer object.
 
-    :param post: Post resource to convert.
-    :type post: Post
+    :param post: Raw post resource to convert, as fetched by aggregate_posts.
+    :type post: dict
     :param href: Post resource href link.
     :type href: str
     :param links: Post resource links.
     :type links: list
     :return: PostDto
     """
-    post_id = str(post.id)
-    likes = PostLike.objects(post_id=post_id).count()
-    views = PostView.objects(post_id=post_id).count()
     return PostDto(
         href=href,
         links=links or [],
-        author=get_user(post.author).full_name,
-        title=post.title,
-        description=post.description,
-        content=post.content,
-        tags=post.tags,
-        private=post.private,
-        featured=post.featured,
-        created=post.created,
-        edited=post.edited,
-        likes=likes,
-        views=views)
-
-
-def post_to_v2_dto(post: Post, href: str = None, links: list = None) -> PostDto:
+        author=post.get('author_name'),
+        title=post['title'],
+        description=post['description'],
+        content=post['content'],
+        tags=post.get('tags', []),
+        private=post.get('private', False),
+        featured=post.get('featured', False),
+        created=post.get('created'),
+        edited=post.get('edited'),
+        likes=post.get('likes', 0),
+        views=post.get('views', 0))
+
+
+def raw_post_to_v2_dto(post: dict, href: str = None, links: list = None) -> PostV2Dto:
     """
-    Converts post resource into data transfer object.
+    Converts raw post resource into data transfer object.
 
-    :param post: Post resource to convert.
-    :type post: Post
+    :param post: Raw post resource to convert, as fetched by aggregate_posts.
+    :type post: dict
     :param href: Post resource href link.
     :type href: str
     :param links: Post resource links.
     :type links: list
     :return: PostV2Dto
     """
-    post_id = str(post.id)
-    likes = PostLike.objects(post_id=post_id).count()
-    views = PostView.objects(post_id=post_id).count()
-    comments = Comment.objects(post_id=post_id).count()
     return PostV2Dto(
         href=href,
         links=links or [],
-        author=get_user(post.author).full_name,
-        title=post.title,
-        description=post.description,
-        content=post.content,
-        comments=comments,
-        tags=post.tags,
-        private=post.private,
-        featured=post.featured,
-        created=post.created,
-        edited=post.edited,
-        likes=likes,
-        views=views)
+        author=post.get('author_name'),
+        title=post['title'],
+        description=post['description'],
+        excerpt=post.get('excerpt'),
+        content=post.get('content'),
+        comments=post.get('comments', 0),
+        tags=post.get('tags', []),
+        private=post.get('private', False),
+        featured=post.get('featured', False),
+        created=post.get('created'),
+        edited=post.get('edited'),
+        likes=post.get('likes', 0),
+        views=post.get('views', 0))
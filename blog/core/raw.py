@@ -0,0 +1,51 @@
+from mongoengine import QuerySet
+from blog.utils.crypto import decrypt_many
+
+
+# fields required to render post and comment resources
+POST_FIELDS = ('id', 'author', 'title', 'description', 'content', 'tags', 'private', 'featured', 'created',
+               'edited', 'likes', 'views', 'comments')
+POST_ENCRYPTED_FIELDS = ('description', 'content', 'excerpt')
+COMMENT_FIELDS = ('id', 'post_id', 'author', 'content', 'created', 'edited', 'likes')
+# fields required to render user profile resources
+USER_PROFILE_FIELDS = ('id', 'username', 'email', 'full_name', 'avatar_href', 'last_posted', 'last_activity',
+                       'register_date')
+
+
+def decrypt_posts(posts: list) -> list:
+    """
+    Decrypt encrypted fields of raw posts in a single batch, fields left out of the projection are skipped.
+
+    :param posts: Raw posts to decrypt.
+    :type posts: list
+    :return: [dict, ...]
+    """
+    encrypted = [(post, field) for post in posts for field in POST_ENCRYPTED_FIELDS if post.get(field) is not None]
+    for (post, field), content in zip(encrypted, decrypt_many([post[field] for post, field in encrypted])):
+        post[field] = content
+    return posts
+
+
+def read_posts(queryset: QuerySet) -> list:
+    """
+    Fetch read only posts as raw mongo documents, skipping document construction and validation.
+
+    :param queryset: Post queryset to read.
+    :type queryset: QuerySet
+    :return: [dict, ...]
+    """
+    return decrypt_posts(list(queryset.only(*POST_FIELDS).as_pymongo()))
+
+
+def read_comments(queryset: QuerySet) -> list:
+    """
+    Fetch read only comments as raw mongo documents, skipping document construction and validation.
+
+    :param queryset: Comment queryset to read.
+    :type queryset: QuerySet
+    :return: [dict, ...]
+    """
+    comments = list(queryset.only(*COMMENT_FIELDS).as_pymongo())
+    for comment, content in zip(comments, decrypt_many([comment['content'] for comment in comments])):
+        comment['content'] = content
+    return comments
@@ -1,17 +1,23 @@
 import boto3
-import datetime
 import hashlib
 import io
 import time
-from mongoengine import DoesNotExist, ValidationError, MultipleObjectsReturned, NotUniqueError
+from bson import ObjectId
+from mongoengine import DoesNotExist, MultipleObjectsReturned, NotUniqueError
 from mongoengine.queryset.visitor import Q
 from blog.constants import BLOG_TEST, BLOG_AWS_ACCESS_KEY_ID, BLOG_AWS_SECRET_ACCESS_KEY, BLOG_AWS_S3_BUCKET, \
     BLOG_FAKE_S3_HOST
-from blog.db import User, FailedLogin, Comment, Post
-from blog.errors import UserNotFoundError, UserExistsError, UserForbiddenRequestError
+from blog.core.raw import USER_PROFILE_FIELDS, read_comments
+from blog.db import User, Comment
+from blog.errors import UserNotFoundError, UserExistsError, UserForbiddenRequestError, PasswordServiceBusyError
 from blog.mediatypes import UserProfileDto, UserAuthDto, UserFormDto, UserRoles
 from blog.settings import settings
-from blog.utils.crypto import hash_password, compare_passwords, encrypt_content, decrypt_content
+from blog.utils.identity import current_identity_map
+from blog.utils.limiter import limiter
+from blog.utils.logger import logger
+from blog.utils.pagination import paginate
+from blog.utils.passwords import hash_password, verify_password, needs_rehash
+from blog.utils.sessions import SessionUser, get_session_cache
 
 
 s3_client = boto3.client(
@@ -33,21 +39,46 @@ def authenticate(user_auth_dto: UserAuthDto, client: str) -> User:
     """
     try:
         user = User.objects.get(username=user_auth_dto.username)
-        rfl = FailedLogin.objects(username=user_auth_dto.username, ip_address=client).order_by('-time')[5:]
-        now = datetime.datetime.utcnow().timestamp()
-        failed_logins = [
-            fl for fl in rfl if now - fl.time.timestamp() <= settings.login.failed_login_timeout]
-        if len(failed_logins) >= 5:
+        failed_login_key = f'failed-login:{user_auth_dto.username}:{client}'
+        # every attempt is recorded up front, attempts are only kept while logins fail
+        if not limiter.hit(failed_login_key, settings.login.max_failed_login, settings.login.failed_login_timeout):
             raise UserForbiddenRequestError()
-        if compare_passwords(user.password, user_auth_dto.password, user.salt):
+        if verify_password(user.password, user_auth_dto.password, user.salt):
+            limiter.reset(failed_login_key)
+            if needs_rehash(user.password):
+                rehash_password(user, user_auth_dto.password)
             return user
-        # create new failed login document
-        FailedLogin(username=user_auth_dto.username, ip_address=client).save()
         return None
     except (DoesNotExist):
         raise UserNotFoundError()
 
 
+def rehash_password(user: User, password: str):
+    """
+    Rehash password of authenticated user with the configured algorithm and cost.
+
+    Note: Rehashing is best effort, it is retried on the next login if the password pool is saturated or hashing
+    fails, failures are logged.
+
+    :param user: Authenticated user resource.
+    :type user: User
+    :param password: Plain text password user authenticated with.
+    :type password: str
+    """
+    try:
+        hashed, salt = hash_password(password)
+    except PasswordServiceBusyError:
+        return
+    except Exception:
+        # the verified hash is kept, a misconfigured algorithm or cost must not lock users out
+        logger.exception(f'Failed to rehash password of user {user.id} with {settings.password.algorithm}'
+                         f' at cost {settings.password.cost}.')
+        return
+    # only replace the hash that was verified, concurrent password changes take precedence
+    if User.objects(pk=user.id, password=user.password).update_one(set__password=hashed, set__salt=salt):
+        user.password, user.salt = hashed, salt
+
+
 def get_users(start=None, count=None):
     """
     Fetch collection of user resources.
@@ -58,7 +89,7 @@ def get_users(start=None, count=None):
     :type count: int
     :return: [User, ...]
     """
-    return User.objects[start:count]
+    return paginate(User.objects, start, count, key='register_date')
 
 
 def create_user(user_form_dto: UserFormDto) -> User:
@@ -87,6 +118,46 @@ def create_user(user_form_dto: UserFormDto) -> User:
         raise UserExistsError()
 
 
+def load_users(user_ids) -> list:
+    """
+    Fetch collection of user resources with a single query, users already in the identity map are not fetched.
+
+    :param user_ids: Identifiers of users to fetch.
+    :type user_ids: Iterable[str]
+    :return: [User, ...]
+    """
+    identity_map = current_identity_map()
+    user_ids = {str(user_id) for user_id in user_ids}
+    missing = {user_id for user_id in user_ids
+               if not identity_map.get(User, user_id) and ObjectId.is_valid(user_id)}
+    if missing:
+        for user in User.objects(pk__in=list(missing)):
+            identity_map.add(user)
+    return [identity_map.get(User, user_id) for user_id in user_ids if identity_map.get(User, user_id)]
+
+
+def get_user_names(user_ids, field: str = 'full_name') -> dict:
+    """
+    Fetch names of users with a single query, without constructing user documents.
+
+    :param user_ids: Identifiers of users to fetch names for.
+    :type user_ids: Iterable[str]
+    :param field: User field to use as name.
+    :type field: str
+    :return: {str: str, ...}
+    """
+    identity_map = current_identity_map()
+    user_ids = {str(user_id) for user_id in user_ids}
+    # users loaded earlier in the request are reused
+    names = {user_id: getattr(identity_map.get(User, user_id), field)
+             for user_id in user_ids if identity_map.get(User, user_id)}
+    missing = [user_id for user_id in user_ids if user_id not in names and ObjectId.is_valid(user_id)]
+    if missing:
+        for user in User.objects(pk__in=missing).only(field).as_pymongo():
+            names[str(user['_id'])] = user.get(field)
+    return names
+
+
 def get_user(user_id: str) -> User:
     """
     Fetches existing user resource.
@@ -94,10 +165,58 @@ def get_user(user_id: str) -> User:
     :param user_id: Identifier of user to fetch.
     :type user_id: str
     """
-    try:
-        return User.objects.get(pk=user_id)
-    except (DoesNotExist, ValidationError):
+    users = load_users([user_id])
+    if not users:
         raise UserNotFoundError()
+    return users[0]
+
+
+def get_raw_user(user_id: str) -> dict:
+    """
+    Fetch read only user profile as raw mongo document, skipping document construction and validation.
+
+    :param user_id: Identifier of user to fetch.
+    :type user_id: str
+    :return: dict
+    """
+    user = User.objects(pk=user_id).only(*USER_PROFILE_FIELDS).as_pymongo().first() \
+        if ObjectId.is_valid(user_id) else None
+    if not user:
+        raise UserNotFoundError()
+    return user
+
+
+def get_session_user(user_id: str) -> SessionUser:
+    """
+    Fetches authenticated user of a session, cached for settings.login.session_cache_time.
+
+    Note: Changes to a user's username or role must be followed by invalidate_session.
+
+    :param user_id: Identifier of user to fetch.
+    :type user_id: str
+    :return: SessionUser
+    """
+    cache = get_session_cache()
+    ttl = settings.login.session_cache_time
+    session = cache.get(user_id) if ttl > 0 else None
+    if session is None:
+        user = User.objects(pk=user_id).only('username', 'role').first() if ObjectId.is_valid(user_id) else None
+        if not user:
+            raise UserNotFoundError()
+        session = SessionUser(id=user.id, username=user.username, role=user.role)
+        if ttl > 0:
+            cache.put(user_id, session, ttl)
+    return session
+
+
+def invalidate_session(user_id: str):
+    """
+    Drop cached session of user, see get_session_user.
+
+    :param user_id: Identifier of user.
+    :type user_id: str
+    """
+    get_session_cache().invalidate(str(user_id))
 
 
 def edit_user(user_id: str, user_form_dto: UserFormDto):
@@ -120,6 +239,7 @@ def edit_user(user_id: str, user_form_dto: UserFormDto):
         user.avatar_href = user_form_dto.avatar_href
         user.avatar_binary = user.avatar_binary.delete()
     user.save()
+    invalidate_session(user_id)
 
 
 def store_user_avatar(user_id: str, file: io.BufferedReader, content_type: str):
@@ -154,6 +274,7 @@ def store_user_avatar(user_id: str, file: io.BufferedReader, content_type: str):
             user.avatar_href = None
         user.avatar_binary.put(file, content_type=content_type)
     user.save()
+    invalidate_session(user_id)
 
 
 def delete_user_avatar(user_id: str):
@@ -169,25 +290,7 @@ def delete_user_avatar(user_id: str):
     if user.avatar_binary:
         user.avatar_binary.delete()
     user.save()
-
-
-def get_user_posts(user_id: str, start: int = None, count: int = None):
-    """
-    Find all posts belonging to given user.
-
-    :param user_id: Identifier of author.
-    :type user_id: str
-    :param start: Used for pagination, specify where to start.
-    :type start: int
-    :param count: Used for pagination, specify number of posts to find.
-    :type count: int
-    :return: [Post, ...]
-    """
-    posts = Post.objects(author=user_id)[start:count]
-    for post in posts:
-        post.description = decrypt_content(post.description)
-        post.content = decrypt_content(post.content)
-    return posts
+    invalidate_session(user_id)
 
 
 def get_user_comments(user_id: str, start: int = None, count: int = None):
@@ -200,28 +303,23 @@ def get_user_comments(user_id: str, start: int = None, count: int = None):
     :type start: int
     :param count: Used for pagination, specify number of posts to find.
     :type count: int
-    :return: [Comment, ...]
+    :return: [dict, ...]
     """
-    comments = Comment.objects(author=user_id)[start:count]
-    for comment in comments:
-        comment.content = decrypt_content(comment.content)
-    return comments
+    return read_comments(paginate(Comment.objects(author=user_id), start, count))
 
 
-def user_to_dto(user: User, comments: bool = True) -> UserProfileDto:
+def raw_user_to_dto(user: dict) -> UserProfileDto:
     """
-    Converts user resource to data transfer object.
+    Converts raw user profile to data transfer object.
 
-    :param user: User resource to convert.
-    :type user: User
-    :param comments: Include user comments.
-    :type comments: bool
+    :param user: Raw user profile to convert.
+    :type user: dict
     :return: UserProfileDto
     """
     return UserProfileDto(
-        username=user.username,
-        email=user.email,
-        full_name=user.full_name,
-        last_posted=user.last_posted,
-        last_activity=user.last_activity,
-        register_date=user.register_date)
+        username=user.get('username'),
+        email=user.get('email'),
+        full_name=user.get('full_name'),
+        last_posted=user.get('last_posted'),
+        last_activity=user.get('last_activity'),
+        register_date=user.get('register_date'))
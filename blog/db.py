@@ -1,17 +1,46 @@
 import datetime
 import mongoengine
+from mongoengine.base import BaseField
 from blog.constants import BLOG_DB_NAME, BLOG_DB_URI
+from blog.utils.crypto import decrypt_content
 
 
 client = mongoengine.connect(host=BLOG_DB_URI)
 db = client[BLOG_DB_NAME]
 
 
-class FailedLogin(mongoengine.Document):
+class EncryptedField(BaseField):
+    """Encrypted blog content, stored as binary envelopes or legacy base64 encoded strings."""
 
-    username = mongoengine.StringField()
-    ip_address = mongoengine.StringField()
-    time = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
+    def validate(self, value):
+        if not isinstance(value, (bytes, str)):
+            self.error('Encrypted content must be stored as bytes or str.')
+
+
+class DecryptedField(object):
+
+    def __init__(self, field: str):
+        """
+        Lazily decrypted, read only view of an encrypted document field.
+
+        Content is decrypted on first access and memoized for as long as the encrypted field is unchanged,
+        documents only loaded to check ownership or existence never pay for decryption.
+
+        :param field: Name of encrypted field.
+        :type field: str
+        """
+        self.field = field
+        self.memo = f'_decrypted_{field}'
+
+    def __get__(self, document, owner):
+        if document is None:
+            return self
+        encrypted = getattr(document, self.field)
+        memo = document.__dict__.get(self.memo)
+        if not memo or memo[0] is not encrypted:
+            memo = (encrypted, decrypt_content(encrypted) if encrypted is not None else None)
+            document.__dict__[self.memo] = memo
+        return memo[1]
 
 
 class UserValidation(mongoengine.Document):
@@ -20,6 +49,8 @@ class UserValidation(mongoengine.Document):
     code = mongoengine.StringField()
     requested = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
 
+    meta = {'indexes': ['user_id']}
+
 
 class User(mongoengine.Document):
 
@@ -39,6 +70,11 @@ class User(mongoengine.Document):
     last_activity = mongoengine.DateTimeField()
     register_date = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
 
+    meta = {'indexes': [
+        {'fields': ['username'], 'unique': True},
+        {'fields': ['email'], 'unique': True},
+        ('register_date', 'id')]}
+
 
 class PostLike(mongoengine.Document):
 
@@ -46,6 +82,10 @@ class PostLike(mongoengine.Document):
     user_id = mongoengine.StringField(required=True)
     time = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
 
+    meta = {'indexes': [
+        {'fields': ['post_id', 'user_id'], 'unique': True},
+        ('user_id', 'time', 'id')]}
+
 
 class PostView(mongoengine.Document):
 
@@ -54,13 +94,18 @@ class PostView(mongoengine.Document):
     ip_address = mongoengine.StringField(required=True)
     seen = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
 
+    meta = {'indexes': [('post_id', 'user_id', 'ip_address', '-id')]}
 
-class PostSearchRequest(mongoengine.Document):
 
-    user_id = mongoengine.StringField(required=True)
-    query = mongoengine.StringField(required=True)
-    options = mongoengine.ListField(mongoengine.StringField(), required=True)
-    time = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
+class ReencryptCheckpoint(mongoengine.Document):
+
+    # collection being re-encrypted, see blog.jobs.reencrypt
+    collection = mongoengine.StringField(primary_key=True)
+    key_id = mongoengine.IntField(required=True)
+    after = mongoengine.ObjectIdField()
+    modified = mongoengine.IntField(default=0)
+    completed = mongoengine.BooleanField(default=False)
+    updated = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
 
 
 class PostQuerySet(mongoengine.QuerySet):
@@ -73,15 +118,33 @@ class Post(mongoengine.Document):
 
     author = mongoengine.StringField(required=True)
     title = mongoengine.StringField(required=True)
-    description = mongoengine.StringField()
-    content = mongoengine.StringField(required=True)
+    description = EncryptedField()
+    content = EncryptedField(required=True)
+    # shortened content served by post collections, see blog.utils.text.excerpt
+    excerpt = EncryptedField()
+    decrypted_description = DecryptedField('description')
+    decrypted_content = DecryptedField('content')
     tags = mongoengine.ListField(mongoengine.StringField())
     private = mongoengine.BooleanField(default=False)
     featured = mongoengine.BooleanField(default=False)
     created = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
     edited = mongoengine.DateTimeField()
-
-    meta = {'queryset_class': PostQuerySet}
+    # denormalized engagement counters, maintained with atomic $inc updates
+    likes = mongoengine.IntField(default=0)
+    views = mongoengine.IntField(default=0)
+    comments = mongoengine.IntField(default=0)
+    # blind index tokens of encrypted fields, see blog.utils.crypto.blind_index
+    description_tokens = mongoengine.ListField(mongoengine.StringField())
+    content_tokens = mongoengine.ListField(mongoengine.StringField())
+
+    meta = {
+        'queryset_class': PostQuerySet,
+        'indexes': [
+            ('private', 'created', 'id'),
+            ('author', 'created', 'id'),
+            ('created', 'id'),
+            'description_tokens',
+            'content_tokens']}
 
 
 class CommentLike(mongoengine.Document):
@@ -90,11 +153,20 @@ class CommentLike(mongoengine.Document):
     user_id = mongoengine.StringField(required=True)
     time = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
 
+    meta = {'indexes': [{'fields': ['comment_id', 'user_id'], 'unique': True}]}
+
 
 class Comment(mongoengine.Document):
 
     post_id = mongoengine.StringField(required=True)
     author = mongoengine.StringField(required=True)
-    content = mongoengine.StringField(required=True)
+    content = EncryptedField(required=True)
+    decrypted_content = DecryptedField('content')
     created = mongoengine.DateTimeField(default=datetime.datetime.utcnow)
     edited = mongoengine.DateTimeField()
+    # denormalized engagement counter, maintained with atomic $inc updates
+    likes = mongoengine.IntField(default=0)
+
+    meta = {'indexes': [
+        ('post_id', 'created', 'id'),
+        ('author', 'created', 'id')]}
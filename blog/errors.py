@@ -2,7 +2,7 @@ import traceback
 
 from blog.utils.logger import critical
 from falcon import HTTPNotFound, HTTPConflict, HTTPUnauthorized, HTTPForbidden, \
-    HTTPBadRequest, HTTPInternalServerError
+    HTTPBadRequest, HTTPInternalServerError, HTTPServiceUnavailable
 
 
 class ErrorHandler:
@@ -52,6 +52,15 @@ class UserNotFoundError(HTTPNotFound):
     def __init__(self):
         super().__init__(description='Requested user was not found or was not available.')
 
+
+class PasswordServiceBusyError(HTTPServiceUnavailable):
+
+    def __init__(self):
+        super().__init__(
+            description='Too many logins or registrations are being processed. Try again at a later time.',
+            retry_after=1)
+
+
 class UserExistsError(HTTPConflict):
 
     def __init__(self):
@@ -74,3 +83,15 @@ class CommentNotFoundError(HTTPNotFound):
 
     def __init__(self):
         super().__init__(description='Requested comment was not found or was not available.')
+
+
+class InvalidCursorError(HTTPBadRequest):
+
+    def __init__(self):
+        super().__init__(description='Provided pagination cursor is invalid.')
+
+
+class SearchQueryTooShortError(HTTPBadRequest):
+
+    def __init__(self):
+        super().__init__(description='Searching post content or description requires a word of at least 3 characters.')
@@ -0,0 +1,16 @@
+from blog.errors import ResourceNotAvailableError
+from blog.settings import settings
+from blog.utils.limiter import limiter
+
+
+def rate_limit(req, resp, resource, params, name: str, limit: int, window: int):
+    """Limit requests made by the requesting user, or host for anonymous requests, within a window."""
+    user = req.context.get('user')
+    requestee = str(user.id) if user else req.access_route[0]
+    if not limiter.hit(f'{name}:{requestee}', limit, window):
+        raise ResourceNotAvailableError()
+
+
+def is_search_available(req, resp, resource, params):
+    """Ensure post searches are made no more than once per search delay."""
+    rate_limit(req, resp, resource, params, 'post-search', 1, settings.post.search_time_delay)
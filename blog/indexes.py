@@ -0,0 +1,137 @@
+"""
+Synchronize declared mongo document indexes with the database.
+
+Usage: python -m blog.indexes [status|sync]
+"""
+import sys
+from pymongo import ASCENDING
+from blog.db import UserValidation, User, PostLike, PostView, Post, CommentLike, Comment
+
+
+DOCUMENTS = [UserValidation, User, PostLike, PostView, Post, CommentLike, Comment]
+
+# documents only consulted within a window defined by blog settings, expired by mongo once outside of it
+TTL_INDEXES = [
+    (UserValidation, 'requested', lambda settings: settings.user.email_verification_timeout)]
+
+
+def index_key(fields: list) -> tuple:
+    """
+    Normalize index fields into a comparable key.
+
+    :param fields: Index fields as (field, direction) pairs.
+    :type fields: list
+    :return: tuple
+    """
+    return tuple((field, int(direction)) for field, direction in fields)
+
+
+def get_collection(document):
+    """
+    Fetch raw collection for a mongo document.
+
+    Note: Document._get_collection would build missing indexes in the foreground, defeating the purpose of a sync.
+
+    :param document: Mongo document class to fetch collection for.
+    :type document: Document
+    :return: Collection
+    """
+    return document._get_db()[document._get_collection_name()]
+
+
+def diff_indexes(document) -> dict:
+    """
+    Compare declared indexes for a mongo document against the indexes found in the database.
+
+    :param document: Mongo document class to compare.
+    :type document: Document
+    :return: {'missing': [dict, ...], 'extra': [str, ...]}
+    """
+    declared = {index_key(spec['fields']): spec for spec in document._meta['index_specs']}
+    # ttl indexes are managed separately by sync_ttl_indexes
+    declared.update({((field, ASCENDING),): None for ttl_document, field, _ in TTL_INDEXES
+                     if ttl_document is document})
+    actual = {index_key(info['key']): name
+              for name, info in get_collection(document).index_information().items() if name != '_id_'}
+    return {
+        'missing': [spec for key, spec in declared.items() if key not in actual and spec],
+        'extra': [name for key, name in actual.items() if key not in declared]}
+
+
+def sync_indexes(document) -> list:
+    """
+    Build missing indexes for a mongo document in the background, without blocking reads or writes.
+
+    Note: Extra indexes are reported but never dropped, remove them with a migration.
+
+    :param document: Mongo document class to synchronize.
+    :type document: Document
+    :return: [str, ...]
+    """
+    collection = get_collection(document)
+    created = []
+    for spec in diff_indexes(document)['missing']:
+        options = {key: value for key, value in spec.items() if key != 'fields'}
+        options.setdefault('background', True)
+        created.append(collection.create_index(spec['fields'], **options))
+    return created
+
+
+def ttl_windows(settings) -> list:
+    """
+    Fetch expiry windows for ttl indexes from blog settings.
+
+    :param settings: Blog settings to read windows from.
+    :type settings: Settings
+    :return: [int, ...]
+    """
+    return [window(settings) for _, _, window in TTL_INDEXES]
+
+
+def sync_ttl_indexes(settings):
+    """
+    Create or update ttl indexes to expire documents once outside of their configured windows.
+
+    :param settings: Blog settings to read windows from.
+    :type settings: Settings
+    """
+    for document, field, window in TTL_INDEXES:
+        collection = get_collection(document)
+        expire_after = window(settings)
+        name = f'{field}_{ASCENDING}'
+        index = collection.index_information().get(name)
+        if index and 'expireAfterSeconds' not in index:
+            # regular indexes cannot be converted in place
+            collection.drop_index(name)
+            index = None
+        if not index:
+            collection.create_index([(field, ASCENDING)], expireAfterSeconds=expire_after, background=True)
+        elif index['expireAfterSeconds'] != expire_after:
+            collection.database.command(
+                'collMod', collection.name,
+                index={'keyPattern': {field: ASCENDING}, 'expireAfterSeconds': expire_after})
+
+
+def main(args: list):
+    command = args[0] if args else 'status'
+    if command not in ('status', 'sync'):
+        print(__doc__.strip())
+        sys.exit(1)
+    if command == 'sync':
+        # ttl indexes follow blog settings, the settings resource synchronizes them whenever they change
+        from blog.settings import settings
+        sync_ttl_indexes(settings)
+    for document in DOCUMENTS:
+        collection = document._get_collection_name()
+        if command == 'sync':
+            for name in sync_indexes(document):
+                print(f'{collection}: created index "{name}"')
+        diff = diff_indexes(document)
+        for spec in diff['missing']:
+            print(f'{collection}: missing index {spec["fields"]}')
+        for name in diff['extra']:
+            print(f'{collection}: undeclared index "{name}"')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,114 @@
+"""
+Re-encrypt post and comment content with the active content key, including legacy encrypted strings.
+
+Documents are streamed by _id and written back at no more than the given number of operations per second,
+progress is checkpointed so the job may be interrupted and resumed at any time.
+
+Usage: python -m blog.jobs.reencrypt [batch size] [operations per second]
+"""
+import datetime
+import sys
+import time
+from pymongo import UpdateOne
+from blog.db import Post, Comment, ReencryptCheckpoint
+from blog.utils.crypto import get_cipher, rotate_batch
+
+
+# encrypted fields by document
+ENCRYPTED_FIELDS = {
+    Post: ('description', 'content', 'excerpt'),
+    Comment: ('content',)}
+BATCH_SIZE = 500
+# write ceiling, keeps the job from competing with requests for the database
+MAX_OPS = 200
+
+
+def reencrypt_batch(document, fields: tuple, batch_size: int, after=None) -> tuple:
+    """
+    Re-encrypt a batch of documents holding content encrypted with retired keys or legacy strings.
+
+    Note: Documents are only updated if their content did not change in the meantime, concurrently edited
+    documents are already encrypted with the active key.
+
+    :param document: Mongo document class to re-encrypt.
+    :type document: Document
+    :param fields: Encrypted fields of document.
+    :type fields: tuple
+    :param batch_size: Maximum number of documents to read.
+    :type batch_size: int
+    :param after: Identifier of last document processed by a previous batch.
+    :type after: ObjectId
+    :return: (int, ObjectId) number of documents re-encrypted and identifier of last document processed
+    """
+    # every document is read, key ids are only known once headers are inspected
+    documents = list(document._get_collection().find({'_id': {'$gt': after}} if after else {},
+                                                     {field: True for field in fields})
+                     .sort('_id').limit(batch_size))
+    if not documents:
+        return 0, None
+    cipher = get_cipher()
+    stale = [(doc, field) for doc in documents for field in fields
+             if doc.get(field) is not None and not cipher.is_current(doc[field])]
+    updates = {}
+    for (doc, field), content in zip(stale, rotate_batch([doc[field] for doc, field in stale])):
+        match, values = updates.setdefault(doc['_id'], ({'_id': doc['_id']}, {}))
+        match[field] = doc[field]
+        values[field] = content
+    if not updates:
+        return 0, documents[-1]['_id']
+    result = document._get_collection().bulk_write(
+        [UpdateOne(match, {'$set': values}) for match, values in updates.values()], ordered=False)
+    return result.modified_count, documents[-1]['_id']
+
+
+def get_checkpoint(document) -> ReencryptCheckpoint:
+    """
+    Fetch re-encryption progress of document collection for the active key, starting over if the key changed.
+
+    :param document: Mongo document class being re-encrypted.
+    :type document: Document
+    :return: ReencryptCheckpoint
+    """
+    collection = document._get_collection_name()
+    key_id = get_cipher().key_id
+    checkpoint = ReencryptCheckpoint.objects(collection=collection).first()
+    if not checkpoint or checkpoint.key_id != key_id:
+        checkpoint = ReencryptCheckpoint(collection=collection, key_id=key_id)
+    return checkpoint
+
+
+def reencrypt(batch_size: int = BATCH_SIZE, max_ops: int = MAX_OPS):
+    """
+    Re-encrypt all content with the active key, safe to interrupt and re-run.
+
+    :param batch_size: Number of documents to read per batch, smaller batches shorten the writes
+                       requests may wait on.
+    :type batch_size: int
+    :param max_ops: Maximum number of documents processed per second.
+    :type max_ops: int
+    """
+    for document, fields in ENCRYPTED_FIELDS.items():
+        checkpoint = get_checkpoint(document)
+        collection = checkpoint.collection
+        if checkpoint.completed:
+            print(f'{collection}: already re-encrypted with key {checkpoint.key_id}')
+            continue
+        while True:
+            started = time.monotonic()
+            modified, after = reencrypt_batch(document, fields, batch_size, checkpoint.after)
+            if not after:
+                checkpoint.completed = True
+            else:
+                checkpoint.after = after
+                checkpoint.modified += modified
+            checkpoint.updated = datetime.datetime.utcnow()
+            checkpoint.save()
+            print(f'{collection}: re-encrypted {checkpoint.modified} documents with key {checkpoint.key_id}')
+            if checkpoint.completed:
+                break
+            # throttle to the operations ceiling, each batch accounts for every document it read
+            time.sleep(max(0, started + batch_size / max_ops - time.monotonic()))
+
+
+if __name__ == '__main__':
+    reencrypt(*[int(arg) for arg in sys.argv[1:3]])
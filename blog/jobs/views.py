@@ -0,0 +1,103 @@
+"""
+Flush post views buffered in redis to mongodb.
+
+Usage: python -m blog.jobs.views
+"""
+import collections
+import datetime
+import socket
+import time
+import inject
+import redis
+from bson import ObjectId
+from pymongo import UpdateOne
+from redis.exceptions import ResponseError
+from blog.constants import BLOG_REDIS_HOST, BLOG_REDIS_PORT
+from blog.core.posts import POST_VIEW_STREAM
+from blog.db import Post, PostView
+from blog.settings import settings
+from blog.utils.cache import post_tag, invalidate_tags
+
+
+POST_VIEW_GROUP = 'post-view-flusher'
+
+
+def read_post_views(client: redis.Redis, consumer: str, batch_size: int) -> list:
+    """
+    Read batch of buffered post views, views delivered but never acknowledged are retried first.
+
+    :param client: Redis client to read from.
+    :type client: redis.Redis
+    :param consumer: Name of stream consumer.
+    :type consumer: str
+    :param batch_size: Maximum number of views to read.
+    :type batch_size: int
+    :return: [(bytes, dict), ...]
+    """
+    for stream_id in ('0', '>'):
+        response = client.xreadgroup(POST_VIEW_GROUP, consumer, {POST_VIEW_STREAM: stream_id}, count=batch_size)
+        entries = response[0][1] if response else []
+        if entries:
+            return entries
+    return []
+
+
+def flush_post_views(batch_size: int = None, consumer: str = None) -> int:
+    """
+    Flush batch of buffered post views to mongodb using a single insert and bulk counter update.
+
+    Note: Views are acknowledged once written, a flusher failing in between will retry the batch on restart.
+
+    :param batch_size: Maximum number of views to flush.
+    :type batch_size: int
+    :param consumer: Name of stream consumer, defaults to host name so restarts resume pending views.
+    :type consumer: str
+    :return: int
+    """
+    client = inject.instance(redis.Redis)
+    try:
+        client.xgroup_create(POST_VIEW_STREAM, POST_VIEW_GROUP, id='0', mkstream=True)
+    except ResponseError:
+        # consumer group already exists
+        pass
+    entries = read_post_views(client, consumer or socket.gethostname(),
+                              batch_size or settings.post.view_flush_batch_size)
+    if not entries:
+        return 0
+    views = [{key.decode('utf-8'): value.decode('utf-8') for key, value in fields.items()}
+             for _, fields in entries if fields]
+    post_ids = {view['post_id'] for view in views}
+    # views are accepted without touching mongo, discard views for posts which do not exist
+    post_ids = {str(post['_id']) for post in Post._get_collection().find(
+        {'_id': {'$in': [ObjectId(post_id) for post_id in post_ids]}}, {'_id': 1})}
+    views = [view for view in views if view['post_id'] in post_ids]
+    if views:
+        PostView._get_collection().insert_many([{
+            'post_id': view['post_id'],
+            'user_id': view['user_id'],
+            'ip_address': view['ip_address'],
+            'seen': datetime.datetime.utcfromtimestamp(float(view['seen']))} for view in views], ordered=False)
+        view_counts = collections.Counter(view['post_id'] for view in views)
+        Post._get_collection().bulk_write([
+            UpdateOne({'_id': ObjectId(post_id)}, {'$inc': {'views': count}})
+            for post_id, count in view_counts.items()], ordered=False)
+        # evict cached responses including the viewed posts to reflect their new view counts
+        invalidate_tags([post_tag(post_id) for post_id in view_counts], client)
+    entry_ids = [entry_id for entry_id, _ in entries]
+    client.xack(POST_VIEW_STREAM, POST_VIEW_GROUP, *entry_ids)
+    client.xdel(POST_VIEW_STREAM, *entry_ids)
+    return len(entries)
+
+
+def main():
+    inject.configure(lambda binder: binder.bind(
+        redis.Redis, redis.StrictRedis(host=BLOG_REDIS_HOST, port=BLOG_REDIS_PORT)))
+    while True:
+        # drain any backlog before waiting out the flush interval
+        while flush_post_views() >= settings.post.view_flush_batch_size:
+            pass
+        time.sleep(settings.post.view_flush_interval)
+
+
+if __name__ == '__main__':
+    main()
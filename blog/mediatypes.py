@@ -160,6 +160,23 @@ class PostViewDtoSerializer(Serializer):
         model = PostViewDto
 
 
+class LikeDto(object):
+
+    def __init__(self, **kwargs):
+        self.liked = kwargs.get('liked', False)
+        self.likes = kwargs.get('likes', 0)
+
+
+class LikeDtoSerializer(Serializer):
+
+    liked = fields.BooleanField(required=True)
+    likes = fields.IntegerField(required=True)
+
+    class Meta(object):
+
+        model = LikeDto
+
+
 class PostSearchSettingsDto(object):
 
     def __init__(self, **kwargs):
@@ -258,6 +275,7 @@ class PostV2Dto(object):
         self.author = kwargs.get('author', '')
         self.title = kwargs.get('title', '')
         self.description = kwargs.get('description', '')
+        self.excerpt = kwargs.get('excerpt', '')
         self.content = kwargs.get('content', '')
         self.tags = kwargs.get('tags', [])
         self.private = kwargs.get('private', False)
@@ -288,6 +306,7 @@ class PostV2DtoSerializer(Serializer):
             max=settings.rules.post.title_max_char
         )
     ])
+    excerpt = fields.StringField()
     content = fields.StringField(validators=[NotEmptyValidator()])
     tags = fields.ListField(fields.StringField(validators=[NotEmptyValidator(),
                                                            CharLenValidator(
@@ -313,11 +332,13 @@ class PostCollectionV2Dto(object):
 
     def __init__(self, **kwargs):
         self.posts = kwargs.get('posts', [])
+        self.next_cursor = kwargs.get('next_cursor', None)
 
 
 class PostCollectionV2DtoSerializer(Serializer):
 
     posts = fields.ListField(fields.ObjectField(PostV2DtoSerializer))
+    next_cursor = fields.StringField(name='nextCursor')
 
     class Model(object):
 
@@ -506,3 +527,99 @@ class UserAuthDtoSerializer(Serializer):
     class Meta(object):
 
         model = UserAuthDto
+
+
+class SessionCacheMetricsDto(object):
+
+    def __init__(self, **kwargs):
+        self.hits = kwargs.get('hits', 0)
+        self.misses = kwargs.get('misses', 0)
+        self.evictions = kwargs.get('evictions', 0)
+        self.invalidations = kwargs.get('invalidations', 0)
+        self.entries = kwargs.get('entries', 0)
+        self.max_entries = kwargs.get('max_entries', 0)
+
+
+class SessionCacheMetricsDtoSerializer(Serializer):
+
+    hits = fields.IntegerField(required=True)
+    misses = fields.IntegerField(required=True)
+    evictions = fields.IntegerField(required=True)
+    invalidations = fields.IntegerField(required=True)
+    entries = fields.IntegerField(required=True)
+    max_entries = fields.IntegerField(name='maxEntries', required=True)
+
+    class Meta(object):
+
+        model = SessionCacheMetricsDto
+
+
+class PlaintextCacheMetricsDto(object):
+
+    def __init__(self, **kwargs):
+        self.hits = kwargs.get('hits', 0)
+        self.misses = kwargs.get('misses', 0)
+        self.evictions = kwargs.get('evictions', 0)
+        self.entries = kwargs.get('entries', 0)
+        self.size = kwargs.get('size', 0)
+        self.max_size = kwargs.get('max_size', 0)
+
+
+class PlaintextCacheMetricsDtoSerializer(Serializer):
+
+    hits = fields.IntegerField(required=True)
+    misses = fields.IntegerField(required=True)
+    evictions = fields.IntegerField(required=True)
+    entries = fields.IntegerField(required=True)
+    size = fields.IntegerField(required=True)
+    max_size = fields.IntegerField(name='maxSize', required=True)
+
+    class Meta(object):
+
+        model = PlaintextCacheMetricsDto
+
+
+class ResponseCacheMetricsDto(object):
+
+    def __init__(self, **kwargs):
+        self.hits = kwargs.get('hits', 0)
+        self.misses = kwargs.get('misses', 0)
+        self.evictions = kwargs.get('evictions', 0)
+        self.invalidations = kwargs.get('invalidations', 0)
+        self.entries = kwargs.get('entries', 0)
+        self.size = kwargs.get('size', 0)
+        self.max_size = kwargs.get('max_size', 0)
+
+
+class ResponseCacheMetricsDtoSerializer(Serializer):
+
+    hits = fields.IntegerField(required=True)
+    misses = fields.IntegerField(required=True)
+    evictions = fields.IntegerField(required=True)
+    invalidations = fields.IntegerField(required=True)
+    entries = fields.IntegerField(required=True)
+    size = fields.IntegerField(required=True)
+    max_size = fields.IntegerField(name='maxSize', required=True)
+
+    class Meta(object):
+
+        model = ResponseCacheMetricsDto
+
+
+class BlogMetricsDto(object):
+
+    def __init__(self, **kwargs):
+        self.sessions = kwargs.get('sessions')
+        self.plaintext = kwargs.get('plaintext')
+        self.responses = kwargs.get('responses')
+
+
+class BlogMetricsDtoSerializer(Serializer):
+
+    sessions = fields.ObjectField(SessionCacheMetricsDtoSerializer, required=True)
+    plaintext = fields.ObjectField(PlaintextCacheMetricsDtoSerializer, required=True)
+    responses = fields.ObjectField(ResponseCacheMetricsDtoSerializer, required=True)
+
+    class Meta(object):
+
+        model = BlogMetricsDto
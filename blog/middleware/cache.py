@@ -0,0 +1,204 @@
+import io
+from falcon_redis_cache.middleware import RedisCacheMiddleware, HttpMethods
+from falcon_redis_cache.resource import CacheCompaitableResource
+from falcon_redis_cache.utils import cache_key
+from blog.constants import BLOG_RESPONSE_LEASE_TIME
+from blog.utils.cache import RESPONSE_REFRESH_ENVIRON, get_response_cache, get_single_flight, \
+    get_refresh_executor, resource_cache_key, resource_cache_prefixes, index_response, invalidate_tags, \
+    retire_responses, acquire_lease, await_response, release_lease, fresh_key
+
+
+class TieredCacheMiddleware(RedisCacheMiddleware):
+
+    def __init__(self, redis_host, redis_port, redis_db=0):
+        """
+        Redis response cache fronted by an in process response cache, see blog.utils.cache.ResponseCache.
+
+        Hot responses are served without a redis round trip, responses found in redis are only copied in process
+        rather than written back. Responses are indexed by the tags of the entities they include so writes only evict
+        the responses they change, see blog.utils.cache.invalidate_tags.
+
+        Missing responses are rendered once, concurrent requests of the same process wait for the rendering thread
+        and requests of other workers wait on its redis lease, serving the invalidated response if it takes too long.
+
+        Responses of resources with a soft ttl are served past it while a single worker re-renders them in the
+        background, by replaying the request through the api bound with bind.
+        """
+        super(TieredCacheMiddleware, self).__init__(redis_host, redis_port, redis_db)
+        self.responses = get_response_cache()
+        self.flights = get_single_flight()
+        self.app = None
+
+    def bind(self, app):
+        """
+        Bind api stale responses are re-rendered with.
+
+        :param app: WSGI application the middleware is installed on.
+        :type app: falcon.API
+        """
+        self.app = app
+
+    @staticmethod
+    def is_cached(resource) -> bool:
+        return isinstance(resource, CacheCompaitableResource) and resource.use_cache
+
+    @staticmethod
+    def is_rendered(resource) -> bool:
+        # resources are given as instances, binded resources as classes
+        return getattr(resource, 'use_cache', False) and hasattr(resource, 'on_get')
+
+    @staticmethod
+    def ttls(resource) -> tuple:
+        return getattr(resource, 'cache_soft_ttl', 0), getattr(resource, 'cache_hard_ttl', 0)
+
+    def lookup(self, key: str, soft_ttl: int = 0) -> tuple:
+        """
+        Fetch cached response from the in process cache, then redis.
+
+        :param key: Cache key of response.
+        :type key: str
+        :param soft_ttl: Soft ttl of resource, responses are only cached in process while fresh.
+        :type soft_ttl: int
+        :return: tuple of response or None if not cached, and whether the response is fresh
+        """
+        if self.responses.enabled:
+            cached = self.responses.get(key)
+            if cached is not None:
+                return cached, True
+        if soft_ttl:
+            cached, fresh = self.client.mget(key, fresh_key(key))
+            fresh = fresh is not None
+        else:
+            cached, fresh = self.client.get(key), True
+        if cached is not None and fresh and self.responses.enabled:
+            self.responses.put(key, cached, soft_ttl)
+        return cached, fresh
+
+    def coalesce(self, req, key: str, soft_ttl: int = 0):
+        """
+        Wait for a missing response rendered by a concurrent request, or lead its rendering.
+
+        :param req: Request missing response.
+        :type req: falcon.Request
+        :param key: Cache key of response.
+        :type key: str
+        :param soft_ttl: Soft ttl of resource.
+        :type soft_ttl: int
+        :return: bytes or None if the request must render the response
+        """
+        leader, flight = self.flights.join(key)
+        if not leader:
+            flight.landed.wait(BLOG_RESPONSE_LEASE_TIME)
+            # render the response ourselves should the leading thread fail
+            return flight.response or self.lookup(key, soft_ttl)[0]
+        req.context['flight'] = key
+        cached, token = await_response(self.client, key, lambda leased: self.lookup(leased, soft_ttl)[0])
+        req.context['lease'] = token
+        return cached
+
+    def revalidate(self, req, key: str):
+        """
+        Re-render stale response in the background, unless another request already is.
+
+        :param req: Request served the stale response.
+        :type req: falcon.Request
+        :param key: Cache key of response.
+        :type key: str
+        """
+        if not self.app:
+            return
+        token = acquire_lease(self.client, key)
+        if not token:
+            return
+        env = dict(req.env)
+        env['wsgi.input'] = io.BytesIO()
+        env[RESPONSE_REFRESH_ENVIRON] = True
+        get_refresh_executor().submit(self.refresh, env, key, token)
+
+    def refresh(self, env: dict, key: str, token: str):
+        try:
+            # errors are handled by the api, failed renders leave the stale response until its hard ttl
+            body = self.app(env, lambda status, headers, exc_info=None: None)
+            for _ in body:
+                pass
+            if hasattr(body, 'close'):
+                body.close()
+        finally:
+            release_lease(self.client, key, token)
+
+    def land(self, req, response):
+        """Release lease and waiting threads of a rendered response."""
+        key = req.context.get('flight')
+        if not key:
+            return
+        if req.context.get('lease'):
+            release_lease(self.client, key, req.context.get('lease'))
+        self.flights.land(key, response)
+
+    def process_resource(self, req, resp, resource, params):
+        """Provide in process or redis cache with every request."""
+        if not self.is_cached(resource):
+            return
+        self.responses.listen()
+        req.context.setdefault('params', params)
+        if req.method != HttpMethods.GET:
+            # only GET responses are served from cache, other methods invalidate them once processed
+            return
+        if req.env.get(RESPONSE_REFRESH_ENVIRON):
+            # re-render stale response, the refreshing request holds its lease
+            return
+        key = cache_key(req, resource)
+        soft_ttl, _ = self.ttls(resource)
+        cached, fresh = self.lookup(key, soft_ttl)
+        if cached is not None and not fresh:
+            self.revalidate(req, key)
+        elif cached is None and BLOG_RESPONSE_LEASE_TIME > 0:
+            cached = self.coalesce(req, key, soft_ttl)
+        resp.context.setdefault('cached', cached)
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        """Sets or deletes cache for provided resources, invalidations are broadcast to every worker."""
+        try:
+            if req_succeeded and self.is_cached(resource):
+                self.store(req, resp, resource)
+        finally:
+            self.land(req, resp.body if req_succeeded else None)
+
+    def store(self, req, resp, resource):
+        key = cache_key(req, resource)
+        soft_ttl, hard_ttl = self.ttls(resource)
+        if req.method == HttpMethods.GET:
+            if soft_ttl:
+                # clients may likewise serve responses while they revalidate them
+                resp.cache_control = ['private' if resource.unique_cache else 'public', 'max-age=0',
+                                      f'stale-while-revalidate={soft_ttl}']
+            cached = resp.context.get('cached')
+            if cached:
+                # served from cache, fresh responses are already held by both caches
+                if not resp.body:
+                    resp.body = cached
+                return
+            if resp.body is None:
+                return
+            index_response(self.client, key, resp.body, resp.context.get('cache_tags', ()), soft_ttl, hard_ttl)
+            if self.responses.enabled:
+                self.responses.put(key, resp.body, soft_ttl)
+        else:
+            keys, prefixes = [], []
+            if self.is_rendered(resource):
+                keys.append(key)
+            params = req.context.get('params')
+            for resc in resource.binded_resources:
+                # routes without cached responses have nothing to evict
+                if not self.is_rendered(resc):
+                    continue
+                binded_key = resource_cache_key(req, resc, **params)
+                keys.append(binded_key)
+                prefixes.extend(resource_cache_prefixes(resc, binded_key))
+            for prefix in prefixes:
+                keys.extend(scanned.decode('utf-8') for scanned in self.client.scan_iter(f'{prefix}*'))
+            # invalidated responses are kept as stale copies while they are rendered anew
+            if retire_responses(self.client, keys):
+                self.responses.invalidate(keys, prefixes)
+            # evict only responses including the entities changed by the request
+            invalidate_tags(req.context.get('cache_invalidate', ()), self.client)
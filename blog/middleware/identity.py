@@ -0,0 +1,15 @@
+from blog.utils.identity import IdentityMap, bind_identity_map, release_identity_map
+
+
+class IdentityMapProcessor(object):
+
+    def process_request(self, req, resp):
+        """Provide a fresh identity map with every request."""
+        identity_map = IdentityMap()
+        req.context.setdefault('identity_map', identity_map)
+        # core lookups are not request aware, bind identity map to the worker thread
+        bind_identity_map(identity_map)
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        """Release identity map once the request has been processed."""
+        release_identity_map()
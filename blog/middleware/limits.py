@@ -0,0 +1,13 @@
+from blog.hooks.limits import rate_limit
+from blog.settings import settings
+
+
+class RateLimitProcessor(object):
+
+    def process_resource(self, req, resp, resource, params):
+        """Apply rate limit policies from blog settings to matching routes."""
+        route = getattr(resource, 'route', None)
+        for policy in settings.limits:
+            if policy.route == route and policy.method == req.method:
+                rate_limit(req, resp, resource, params, f'{policy.method}:{policy.route}',
+                           policy.limit, policy.window)
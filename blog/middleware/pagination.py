@@ -0,0 +1,9 @@
+from falcon_pagination_processor import PaginationProcessor
+
+
+class CursorPaginationProcessor(PaginationProcessor):
+
+    def process_request(self, req, resp):
+        """Process pagination query arguments, including opaque keyset cursors."""
+        super().process_request(req, resp)
+        req.context.get('pagination').setdefault('cursor', req.params.get('cursor'))
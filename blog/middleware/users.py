@@ -2,7 +2,7 @@ import datetime
 import jwt
 from blog.constants import BLOG_JWT_SECRET_KEY
 from blog.errors import UserNotFoundError, UnauthorizedRequestError
-from blog.core.users import get_user
+from blog.core.users import get_session_user
 from blog.settings import settings
 from blog.utils.logger import debug, warning
 
@@ -28,8 +28,8 @@ class UserProcessor(object):
             else:
                 user_id = payload.get('user')
                 try:
-                    # add our user to the request context
-                    user = get_user(user_id)
+                    # add our user to the request context, cached to spare a query per request
+                    user = get_session_user(user_id)
                     req.context.setdefault('user', user)
                 except UserNotFoundError:
                     warning(req, f'Token payload found with invalid user identifier "{user_id}".')
@@ -2,8 +2,14 @@ import falcon
 from falcon_redis_cache.hooks import CacheProvider
 from blog.hooks.responders import auto_respond, request_body, response_body
 from blog.hooks.users import is_admin
+from blog.indexes import ttl_windows, sync_ttl_indexes
+from blog.mediatypes import BlogMetricsDto, BlogMetricsDtoSerializer, SessionCacheMetricsDto, \
+    PlaintextCacheMetricsDto, ResponseCacheMetricsDto
 from blog.settings import settings, save_settings, SettingsSerializer
 from blog.resources.base import BaseResource
+from blog.utils.cache import get_response_cache
+from blog.utils.crypto import get_plaintext_cache
+from blog.utils.sessions import get_session_cache
 
 
 class BlogSettingsResource(BaseResource):
@@ -23,4 +29,24 @@ class BlogSettingsResource(BaseResource):
     @falcon.before(is_admin)
     def on_put(self, req, resp):
         """Update and save blog settings."""
+        windows = ttl_windows(settings)
         save_settings(req.payload)
+        # expire stale documents using the updated windows
+        if ttl_windows(settings) != windows:
+            sync_ttl_indexes(settings)
+
+
+class BlogMetricsResource(BaseResource):
+
+    route = '/v1/blog/admin/metrics'
+    # counters of the serving worker, never cached
+    use_cache = False
+
+    @falcon.before(auto_respond)
+    @falcon.before(is_admin)
+    @falcon.after(response_body, BlogMetricsDtoSerializer)
+    def on_get(self, req, resp):
+        """Fetch cache metrics of the worker serving the request."""
+        resp.body = BlogMetricsDto(sessions=SessionCacheMetricsDto(**get_session_cache().stats()),
+                                   plaintext=PlaintextCacheMetricsDto(**get_plaintext_cache().stats()),
+                                   responses=ResponseCacheMetricsDto(**get_response_cache().stats()))
@@ -4,6 +4,9 @@ from falcon_redis_cache.resource import CacheCompaitableResource
 class BaseResource(CacheCompaitableResource):
 
     route = ''
+    # cached responses past their soft ttl are served while re-rendered in the background, see TieredCacheMiddleware
+    cache_soft_ttl = 0
+    cache_hard_ttl = 0
 
     @classmethod
     def url_to(cls, host, **kwargs) -> str:
@@ -1,16 +1,16 @@
 import falcon
 from falcon_redis_cache.hooks import CacheProvider
-from falcon_redis_cache.utils import clear_resource_cache
-from blog.core.comments import get_comment, edit_comment, delete_comment, comment_to_dto, \
-    like_comment
-from blog.db import Comment, User
+from blog.core.comments import get_comment, get_raw_comment, edit_comment, delete_comment, \
+    raw_comment_to_dto, like_comment
+from blog.core.users import get_user_names
+from blog.db import User
 from blog.errors import UnauthorizedRequestError
 from blog.hooks.responders import auto_respond, request_body, response_body
 from blog.hooks.users import is_logged_in
 from blog.mediatypes import UserRoles, CommentDtoSerializer, CommentFormDtoSerializer, \
-    LinkDto, HttpMethods
-from blog.resources import posts
+    LinkDto, HttpMethods, LikeDto, LikeDtoSerializer
 from blog.resources.base import BaseResource
+from blog.utils.cache import post_tag, comment_tag, tag_response, invalidate_response_tags
 
 
 class BLOG_COMMENT_RESOURCE_HREF_REL(object):
@@ -19,21 +19,21 @@ class BLOG_COMMENT_RESOURCE_HREF_REL(object):
     COMMENT_LIKE = 'comment-like'
 
 
-def get_comment_links(req: falcon.Request, comment: Comment) -> list:
+def get_comment_links(req: falcon.Request, comment_id: str) -> list:
     """
     Construct comment resource links.
 
     :param req: Request object to pull host from.
     :type req: falcon.Request
-    :param comment: Comment document to construct links for.
-    :type comment: Comment
+    :param comment_id: Identifier of comment to construct links for.
+    :type comment_id: str
     """
     return [LinkDto(rel=BLOG_COMMENT_RESOURCE_HREF_REL.SELF,
-                    href=CommentResource.url_to(req.netloc, comment_id=comment.id),
+                    href=CommentResource.url_to(req.netloc, comment_id=comment_id),
                     accepted_methods=[HttpMethods.GET, HttpMethods.PUT, HttpMethods.DELETE]),
             LinkDto(rel=BLOG_COMMENT_RESOURCE_HREF_REL.COMMENT_LIKE,
-                    href=CommentLikeResource.url_to(req.netloc, comment_id=comment.id),
-                    accepted_methods=[HttpMethods.PUT])]
+                    href=CommentLikeResource.url_to(req.netloc, comment_id=comment_id),
+                    accepted_methods=[HttpMethods.PUT, HttpMethods.DELETE])]
 
 
 def user_has_comment_access(user: User, comment_id: str) -> bool:
@@ -54,11 +54,22 @@ class CommentLikeResource(BaseResource):
     route = '/v1/blog/comment/{comment_id}/like'
 
     @falcon.before(is_logged_in)
+    @falcon.after(response_body, LikeDtoSerializer)
     def on_put(self, req, resp, comment_id):
-        """Like an existing comment resource."""
-        resp.status = falcon.HTTP_204
+        """Like an existing comment resource, toggles like unless liked is specified."""
+        user = req.context.get('user')
+        liked, likes = like_comment(comment_id, str(user.id), req.get_param_as_bool('liked'))
+        invalidate_response_tags(req, [comment_tag(comment_id)])
+        resp.body = LikeDto(liked=liked, likes=likes)
+
+    @falcon.before(is_logged_in)
+    @falcon.after(response_body, LikeDtoSerializer)
+    def on_delete(self, req, resp, comment_id):
+        """Dislike an existing comment resource."""
         user = req.context.get('user')
-        like_comment(comment_id, str(user.id))
+        liked, likes = like_comment(comment_id, str(user.id), False)
+        invalidate_response_tags(req, [comment_tag(comment_id)])
+        resp.body = LikeDto(liked=liked, likes=likes)
 
 
 class CommentResource(BaseResource):
@@ -71,8 +82,10 @@ class CommentResource(BaseResource):
     @falcon.after(response_body, CommentDtoSerializer)
     def on_get(self, req, resp, comment_id):
         """Fetch single comment resource."""
-        comment = get_comment(comment_id)
-        comment_dto = comment_to_dto(comment, href=req.uri, links=get_comment_links(req, comment))
+        comment = get_raw_comment(comment_id)
+        comment_dto = raw_comment_to_dto(comment, get_user_names([comment['author']], 'username'), href=req.uri,
+                                         links=get_comment_links(req, comment_id))
+        tag_response(resp, [comment_tag(comment_id)])
         resp.body = comment_dto
 
     @falcon.before(auto_respond)
@@ -84,9 +97,7 @@ class CommentResource(BaseResource):
         if not user_has_comment_access(user, comment_id):
             raise UnauthorizedRequestError()
         edit_comment(comment_id, req.payload)
-        comment = get_comment(comment_id)
-        # clear postst resource cache to reflect changes to comment
-        clear_resource_cache(posts.PostResource, req, post_id=comment.post_id)
+        invalidate_response_tags(req, [comment_tag(comment_id)])
 
     @falcon.before(auto_respond)
     @falcon.before(is_logged_in)
@@ -95,8 +106,8 @@ class CommentResource(BaseResource):
         user = req.context.get('user')
         if not user_has_comment_access(user, comment_id):
             raise UnauthorizedRequestError()
+        comment = get_comment(comment_id)
         delete_comment(comment_id)
-        # clear post collection/search resource cache to reflect new comment count
-        clear_resource_cache(posts.PostCollectionResource, req)
-        clear_resource_cache(posts.PostSearchResource, req)
+        # evict responses of the post to reflect its new comment count
+        invalidate_response_tags(req, [comment_tag(comment_id), post_tag(comment.post_id)])
 
@@ -2,20 +2,25 @@ import base64
 import falcon
 import redis
 from falcon_redis_cache.hooks import CacheProvider
-from blog.core.posts import get_posts, get_post, create_post, edit_post, delete_post, \
-    post_to_dto, like_post, view_post, get_post_comments, create_post_comment, search_posts, \
-    post_to_v2_dto
-from blog.core.comments import comment_to_dto
-from blog.db import Post, User
+from blog.core.posts import get_posts, get_post, get_raw_post, create_post, edit_post, delete_post, \
+    raw_post_to_dto, like_post, view_post, get_post_comments, create_post_comment, search_posts, \
+    raw_post_to_v2_dto
+from blog.core.comments import raw_comment_to_dto
+from blog.core.users import get_user_names
+from blog.db import User
 from blog.errors import UnauthorizedRequestError
+from blog.hooks.limits import is_search_available
 from blog.hooks.responders import auto_respond, request_body, response_body
 from blog.hooks.users import is_logged_in
 from blog.mediatypes import PostV2DtoSerializer, PostCollectionV2DtoSerializer, \
     PostFormDtoSerializer, PostCollectionV2Dto, UserRoles, LinkDto, \
     CommentFormDtoSerializer, PostSearchSettingsDtoSerializer, HttpMethods, \
-    PostDtoSerializer
+    PostDtoSerializer, LikeDto, LikeDtoSerializer
 from blog.resources import comments as comments
 from blog.resources.base import BaseResource
+from blog.utils.cache import POSTS_TAG, post_tag, comment_tag, user_tag, tag_response, \
+    invalidate_response_tags
+from blog.utils.pagination import next_cursor
 from blog.utils.serializers import from_json
 
 
@@ -27,27 +32,27 @@ class BLOG_POST_RESOURCE_HREF_REL(object):
     POST_COMMENT = 'post-comment'
 
 
-def get_post_links(req: falcon.Request, post: Post) -> list:
+def get_post_links(req: falcon.Request, post_id: str) -> list:
     """
     Construct post resource links.
 
     :param req: Request object to pull host from.
     :type req: falcon.Request
-    :param post: Post document to construct links for.
-    :type post: Post
+    :param post_id: Identifier of post to construct links for.
+    :type post_id: str
     """
     return [
         LinkDto(rel=BLOG_POST_RESOURCE_HREF_REL.SELF,
-                href=PostResource.url_to(req.netloc, post_id=post.id),
+                href=PostResource.url_to(req.netloc, post_id=post_id),
                 accepted_methods=[HttpMethods.GET, HttpMethods.PUT, HttpMethods.DELETE]),
         LinkDto(rel=BLOG_POST_RESOURCE_HREF_REL.POST_COMMENT,
-                href=PostCommentResource.url_to(req.netloc, post_id=post.id),
+                href=PostCommentResource.url_to(req.netloc, post_id=post_id),
                 accepted_methods=[HttpMethods.POST]),
         LinkDto(rel=BLOG_POST_RESOURCE_HREF_REL.POST_LIKE,
-                href=PostLikeResource.url_to(req.netloc, post_id=post.id),
-                accepted_methods=[HttpMethods.PUT]),
+                href=PostLikeResource.url_to(req.netloc, post_id=post_id),
+                accepted_methods=[HttpMethods.PUT, HttpMethods.DELETE]),
         LinkDto(rel=BLOG_POST_RESOURCE_HREF_REL.POST_VIEW,
-                href=PostViewResource.url_to(req.netloc, post_id=post.id),
+                href=PostViewResource.url_to(req.netloc, post_id=post_id),
                 accepted_methods=[HttpMethods.PUT])]
 
 
@@ -75,6 +80,7 @@ class PostCommentResource(BaseResource):
         """Create comment for existing post resource"""
         user = req.context.get('user')
         create_post_comment(post_id, str(user.id), req.payload)
+        invalidate_response_tags(req, [post_tag(post_id), user_tag(user.id)])
 
 
 class PostViewResource(BaseResource):
@@ -93,32 +99,48 @@ class PostLikeResource(BaseResource):
 
     route = '/v1/post/{post_id}/like'
 
-    @falcon.before(auto_respond)
     @falcon.before(is_logged_in)
+    @falcon.after(response_body, LikeDtoSerializer)
     def on_put(self, req, resp, post_id):
-        """Like an existing post resource"""
+        """Like an existing post resource, toggles like unless liked is specified"""
+        user = req.context.get('user')
+        liked, likes = like_post(post_id, str(user.id), req.get_param_as_bool('liked'))
+        invalidate_response_tags(req, [post_tag(post_id), user_tag(user.id)])
+        resp.body = LikeDto(liked=liked, likes=likes)
+
+    @falcon.before(is_logged_in)
+    @falcon.after(response_body, LikeDtoSerializer)
+    def on_delete(self, req, resp, post_id):
+        """Dislike an existing post resource"""
         user = req.context.get('user')
-        like_post(post_id, str(user.id))
+        liked, likes = like_post(post_id, str(user.id), False)
+        invalidate_response_tags(req, [post_tag(post_id), user_tag(user.id)])
+        resp.body = LikeDto(liked=liked, likes=likes)
 
 
 class PostResource(BaseResource):
 
     route = '/v1/post/{post_id}/'
+    cache_soft_ttl = 30
+    cache_hard_ttl = 600
 
     @CacheProvider.from_cache
     @falcon.before(auto_respond)
     @falcon.after(response_body, PostDtoSerializer)
     def on_get(self, req, resp, post_id):
         """Fetch single post resource."""
-        post = get_post(post_id)
-        post_dto = post_to_dto(post, href=req.uri, links=get_post_links(req, post))
+        post = get_raw_post(post_id)
         post_comments = get_post_comments(post_id)
-
-        post_dto.comments = [comment_to_dto(comment,
-                                            href=comments.CommentResource.url_to(req.netloc,
-                                            comment_id=str(comment.id),
-                                            links=comments.get_comment_links(req, comment))) for comment in post_comments]
-
+        post_dto = raw_post_to_dto(post, href=req.uri, links=get_post_links(req, post_id))
+        # fetch comment authors with a single query
+        authors = get_user_names((comment['author'] for comment in post_comments), 'username')
+        post_dto.comments = [raw_comment_to_dto(comment, authors,
+                                                href=comments.CommentResource.url_to(req.netloc,
+                                                                                     comment_id=comment['_id']),
+                                                links=comments.get_comment_links(req, comment['_id']))
+                             for comment in post_comments]
+
+        tag_response(resp, [post_tag(post_id)] + [comment_tag(comment['_id']) for comment in post_comments])
         resp.body = post_dto
 
     @falcon.before(auto_respond)
@@ -135,6 +157,7 @@ class PostResource(BaseResource):
             if not post.featured:
                 raise UnauthorizedRequestError()
         edit_post(post_id, req.payload)
+        invalidate_response_tags(req, [post_tag(post_id)])
 
     @falcon.before(auto_respond)
     @falcon.before(is_logged_in)
@@ -143,13 +166,18 @@ class PostResource(BaseResource):
         user = req.context.get('user')
         if not user_has_post_access(user, post_id):
             raise UnauthorizedRequestError(user)
+        post_comments = get_post_comments(post_id)
         delete_post(post_id)
+        invalidate_response_tags(req, [post_tag(post_id)] +
+                                 [comment_tag(comment['_id']) for comment in post_comments])
 
 
 class PostCollectionResource(BaseResource):
 
     route = '/v1/posts/'
     cache_with_query = True
+    cache_soft_ttl = 30
+    cache_hard_ttl = 600
 
     @CacheProvider.from_cache
     @falcon.before(auto_respond)
@@ -159,12 +187,19 @@ class PostCollectionResource(BaseResource):
         Fetch grid view for all post resources.
 
         Note: This endpoint supports pagination, pagination arguments must be provided via query args.
+        Pages may be requested by offset (start, count) or by the cursor provided with the previous page.
+        Posts are returned with an excerpt of their content, full content is included with ?content=true.
         """
         pagination = req.context.get('pagination')
+        posts = get_posts(start=pagination.get('start'),
+                          count=pagination.get('count'),
+                          cursor=pagination.get('cursor'),
+                          content=bool(req.get_param_as_bool('content')))
         post_collection_dto = PostCollectionV2Dto(posts=[
-            post_to_v2_dto(post, href=PostResource.url_to(req.netloc, post_id=post.id), links=get_post_links(req, post))
-            for post in get_posts(start=pagination.get('start'),
-                                  count=pagination.get('count'))])
+            raw_post_to_v2_dto(post, href=PostResource.url_to(req.netloc, post_id=post['_id']),
+                               links=get_post_links(req, post['_id']))
+            for post in posts], next_cursor=next_cursor(posts, pagination.get('count')))
+        tag_response(resp, [POSTS_TAG] + [post_tag(post['_id']) for post in posts])
         resp.body = post_collection_dto
 
     @falcon.before(auto_respond)
@@ -174,6 +209,8 @@ class PostCollectionResource(BaseResource):
         """Create a new post resource."""
         user = req.context.get('user')
         create_post(user.id, req.payload)
+        # new posts may belong on any page of any post listing
+        invalidate_response_tags(req, [POSTS_TAG, user_tag(user.id)])
         # link to grid view
         resp.set_header('Location', req.uri)
 
@@ -187,19 +224,15 @@ class PostSearchResource(BaseResource):
     @falcon.before(auto_respond)
     @falcon.before(request_body, PostSearchSettingsDtoSerializer)
     @falcon.before(is_logged_in)
+    @falcon.before(is_search_available)
     @falcon.after(response_body, PostCollectionV2DtoSerializer)
     def on_post(self, req, resp):
-        """Search for an existing post resource."""
+        """Search for an existing post resource, full content is included with ?content=true."""
         pagination = req.context.get('pagination')
-        user = req.context.get('user')
+        posts = search_posts(req.payload, pagination.get('start'), pagination.get('count'),
+                             pagination.get('cursor'), bool(req.get_param_as_bool('content')))
         post_collection_dto = PostCollectionV2Dto(posts=[
-            post_to_v2_dto(post, href=PostResource.url_to(req.netloc, post_id=post.id), links=get_post_links(req, post))
-            for post in search_posts(req.payload, str(user.id), pagination.get('start'), pagination.get('count'))])
+            raw_post_to_v2_dto(post, href=PostResource.url_to(req.netloc, post_id=post['_id']),
+                               links=get_post_links(req, post['_id']))
+            for post in posts], next_cursor=next_cursor(posts, pagination.get('count')))
         resp.body = post_collection_dto
-
-
-# override resource binded cache with later defined resources
-PostCommentResource.binded_resources = [PostResource]
-PostViewResource.binded_resources = [PostResource]
-PostLikeResource.binded_resources = [PostResource]
-PostResource.binded_resources = [PostCollectionResource, PostSearchResource]
@@ -3,7 +3,7 @@ from falcon_redis_cache.hooks import CacheProvider
 from blog.hooks.responders import auto_respond, response_body
 from blog.mediatypes import LinkDto, ServiceDescriptionDto, ServiceDescriptionDtoSerializer, UserRoles, \
     HttpMethods
-from blog.resources.admin import BlogSettingsResource
+from blog.resources.admin import BlogSettingsResource, BlogMetricsResource
 from blog.resources.base import BaseResource
 from blog.resources.posts import PostCollectionResource, PostSearchResource
 from blog.resources.users import UserAuthenticationResource, UserRegistrationResource, UserResource
@@ -12,6 +12,7 @@ from blog.settings import settings
 
 class BLOG_HREF_REL(object):
 
+    ADMIN_BLOG_METRICS = 'admin-blog-metrics'
     ADMIN_BLOG_SETTINGS = 'admin-blog-settings'
     POST_COLLECTION = 'post-collection'
     POST_SEARCH = 'post-search'
@@ -53,4 +54,8 @@ class ServiceDescriptionResource(BaseResource):
                 LinkDto(rel=BLOG_HREF_REL.ADMIN_BLOG_SETTINGS,
                         href=BlogSettingsResource.url_to(req.netloc),
                         accepted_methods=[HttpMethods.GET, HttpMethods.PUT]))
+            service_description.links.append(
+                LinkDto(rel=BLOG_HREF_REL.ADMIN_BLOG_METRICS,
+                        href=BlogMetricsResource.url_to(req.netloc),
+                        accepted_methods=[HttpMethods.GET]))
         resp.body = service_description
@@ -1,4 +1,6 @@
 import datetime
+import functools
+import hashlib
 import io
 import jwt
 import magic
@@ -6,10 +8,10 @@ import os
 import falcon
 from falcon_redis_cache.hooks import CacheProvider
 from blog.constants import BLOG_JWT_SECRET_KEY
-from blog.core.comments import comment_to_dto
-from blog.core.posts import get_user_liked_posts, post_to_dto
+from blog.core.comments import raw_comment_to_dto
+from blog.core.posts import get_user_posts, get_user_liked_posts, raw_post_to_dto
 from blog.core.users import authenticate, get_user, create_user, edit_user, \
-    user_to_dto, get_user_comments, get_user_posts, store_user_avatar, delete_user_avatar
+    get_raw_user, raw_user_to_dto, get_user_comments, store_user_avatar, delete_user_avatar
 from blog.db import User
 from blog.errors import ResourceNotAvailableError, UserAvatarUploadError
 from blog.hooks.responders import auto_respond, request_body, response_body
@@ -21,9 +23,15 @@ from blog.resources.base import BaseResource
 from blog.resources.comments import CommentResource
 from blog.resources.posts import PostResource
 from blog.settings import settings
+from blog.utils.cache import post_tag, comment_tag, user_tag, tag_response
+from blog.utils.media import is_not_modified, send_media
 from blog.utils.serializers import to_json
 
 
+DEFAULT_AVATAR_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                   'static/default-avatar.png'))
+
+
 class BLOG_USER_RESOURCE_HREF_REL(object):
 
     SELF = 'self'
@@ -46,6 +54,19 @@ def get_auth_jwt(user: User, host: str) -> str:
         algorithm='HS256').decode('utf-8')
 
 
+@functools.lru_cache(maxsize=None)
+def get_default_avatar() -> tuple:
+    """
+    Load default avatar into memory, served to every user without an avatar.
+
+    :return: (bytes, str, datetime.datetime) avatar, entity tag and time of last modification
+    """
+    with open(DEFAULT_AVATAR_PATH, 'rb') as avatar:
+        data = avatar.read()
+    return (data, f'"{hashlib.md5(data).hexdigest()}"',
+            datetime.datetime.utcfromtimestamp(os.path.getmtime(DEFAULT_AVATAR_PATH)))
+
+
 class UserAuthenticationResource(BaseResource):
 
     route = '/v1/user/authenticate/'
@@ -56,7 +77,6 @@ class UserAuthenticationResource(BaseResource):
     def on_post(self, req, resp):
         """Fetch serialized session token."""
         host = req.access_route[0]
-        raise RuntimeError(req.payload)
         user = authenticate(req.payload, host)
         resp.body = to_json(TokenDtoSerializer, TokenDto(token=get_auth_jwt(user, host))) if user else 'false'
 
@@ -93,21 +113,28 @@ class UserAvatarResource(BaseResource):
         if not settings.user.allow_avatar_capability:
             raise ResourceNotAvailableError()
         user = get_user(user_id)
+        max_age = settings.user.avatar_cache_time
         if user.avatar_href:
+            # s3 avatar hrefs embed the object key, itself a digest of the avatar
+            etag = f'"{hashlib.md5(user.avatar_href.encode()).hexdigest()}"'
+            resp.etag = etag
+            resp.cache_control = ['public', f'max-age={max_age}']
+            if is_not_modified(req, etag):
+                resp.status = falcon.HTTP_304
+                return
             # redirect to source
             raise falcon.HTTPMovedPermanently(user.avatar_href)
         elif user.avatar_binary:
-            # serve binary
-            resp.content_type = user.avatar_binary.content_type
-            avatar_stream = user.avatar_binary.gridout.read()
-            resp.stream = io.BytesIO(avatar_stream)
-            resp.stream_len = len(avatar_stream)
+            # stream binary from gridfs chunk by chunk
+            gridout = user.avatar_binary.gridout
+            # gridfs digests are not stored by every driver, files are immutable so their id will do
+            etag = f'"{getattr(gridout, "md5", None) or gridout._id}"'
+            send_media(req, resp, gridout, gridout.length, gridout.content_type, etag, gridout.upload_date,
+                       max_age)
         else:
             # serve default avatar image
-            resp.content_type = 'image/png'
-            avatar_path = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static/default-avatar.png'))
-            resp.stream = open(avatar_path, 'rb')
-            resp.stream_len = os.path.getsize(avatar_path)
+            avatar, etag, last_modified = get_default_avatar()
+            send_media(req, resp, io.BytesIO(avatar), len(avatar), 'image/png', etag, last_modified, max_age)
 
 
 class UserAvatarMediaResource(BaseResource):
@@ -155,20 +182,27 @@ class UserResource(BaseResource):
     @falcon.after(response_body, UserProfileDtoSerializer)
     def on_get(self, req, resp):
         """Fetch user information for current session."""
-        user = req.context.get('user')
-        user_id = str(user.id)
-        user_dto = user_to_dto(user)
+        user_id = str(req.context.get('user').id)
+        user = get_raw_user(user_id)
+        user_dto = raw_user_to_dto(user)
+        posts = get_user_posts(user_id)
+        comments = get_user_comments(user_id)
+        liked_posts = get_user_liked_posts(user_id)
         user_dto.posts = [
-            post_to_dto(post, href=PostResource.url_to(req.netloc, post_id=post.id))
-            for post in get_user_posts(user_id)]
+            raw_post_to_dto(post, href=PostResource.url_to(req.netloc, post_id=post['_id']))
+            for post in posts]
         user_dto.comments = [
-            comment_to_dto(comment, href=CommentResource.url_to(req.netloc, comment_id=comment.id))
-            for comment in get_user_comments(user_id)]
+            raw_comment_to_dto(comment, {user_id: user.get('username')},
+                               href=CommentResource.url_to(req.netloc, comment_id=comment['_id']))
+            for comment in comments]
         user_dto.liked_posts = [
-            post_to_dto(post, href=PostResource.url_to(req.netloc, post_id=post.id))
-            for post in get_user_liked_posts(user_id)]
+            raw_post_to_dto(post, href=PostResource.url_to(req.netloc, post_id=post['_id']))
+            for post in liked_posts]
+        tag_response(resp, [user_tag(user_id)] +
+                     [post_tag(post['_id']) for post in posts + liked_posts] +
+                     [comment_tag(comment['_id']) for comment in comments])
         # no need to construct url, pull from request
-        user.href = req.uri
+        user_dto.href = req.uri
         user_dto.links = [
             LinkDto(rel=BLOG_USER_RESOURCE_HREF_REL.SELF,
                     href=UserResource.url_to(req.netloc),
@@ -181,7 +215,7 @@ class UserResource(BaseResource):
                     accepted_methods=[HttpMethods.DELETE])]
         # if user avatar capabilities present, provide avatar image
         if settings.user.allow_avatar_capability:
-            user_dto.avatar_href = user.avatar_href or UserAvatarResource.url_to(req.netloc, user_id=user.id)
+            user_dto.avatar_href = user.get('avatar_href') or UserAvatarResource.url_to(req.netloc, user_id=user_id)
         resp.body = user_dto
 
     @falcon.before(auto_respond)
@@ -1,7 +1,8 @@
 import json
 import yaml
-from r2dto import fields, Serializer
-from blog.utils.serializers import from_json, to_json
+from r2dto import fields, Serializer, ValidationError
+from blog.constants import PASSWORD_COST_RANGES
+from blog.utils.serializers import from_json, to_json, ChoiceValidator, RangeValidator
 
 
 __all__ = ['Settings', 'SettingsSerializer', 'settings', 'save_settings']
@@ -12,35 +13,71 @@ class LoginSettings(object):
         self.max_failed_login = 0
         self.failed_login_timeout = 0
         self.max_session_time = 0
+        self.session_cache_time = 0
 
 
 class PostSettings(object):
     def __init__(self):
         self.view_time_delay = 0
+        self.view_flush_interval = 0
+        self.view_flush_batch_size = 0
         self.search_time_delay = 0
 
 
 class PostSettingsSerializer(Serializer):
     view_time_delay = fields.IntegerField(required=True)
+    view_flush_interval = fields.IntegerField(required=True)
+    view_flush_batch_size = fields.IntegerField(required=True)
     search_time_delay = fields.IntegerField(required=True)
 
     class Meta(object):
         model = PostSettings
 
 
+class PasswordSettings(object):
+    def __init__(self):
+        self.algorithm = ''
+        self.cost = 0
+        self.workers = 0
+        self.max_pending = 0
+
+
+class PasswordSettingsSerializer(Serializer):
+    algorithm = fields.StringField(required=True, validators=[ChoiceValidator(sorted(PASSWORD_COST_RANGES))])
+    cost = fields.IntegerField(required=True)
+    workers = fields.IntegerField(required=True, validators=[RangeValidator(min=1)])
+    max_pending = fields.IntegerField(required=True, validators=[RangeValidator(min=0)])
+
+    class Meta(object):
+        model = PasswordSettings
+
+    def validate(self):
+        super().validate()
+        # cost bounds depend on the algorithm, an unbounded scrypt cost cannot be hashed at all
+        password = self.object
+        low, high = PASSWORD_COST_RANGES[password.algorithm]
+        if not low <= password.cost <= high:
+            raise ValidationError(f'Field "cost" of algorithm {password.algorithm} must be greater than or equal'
+                                  f' to {low} and less than or equal to {high}.')
+
+
 class UserSettings(object):
     def __init__(self):
         self.allow_avatar_capability = False
         self.allow_manual_registration = False
         self.require_email_verification = False
+        self.email_verification_timeout = 0
         self.upload_avatar_s3 = False
+        self.avatar_cache_time = 0
 
 
 class UserSettingsSerializer(Serializer):
     allow_avatar_capability = fields.BooleanField(required=True)
     allow_manual_registration = fields.BooleanField(required=True)
     require_email_verification = fields.BooleanField(required=True)
+    email_verification_timeout = fields.IntegerField(required=True)
     upload_avatar_s3 = fields.BooleanField(required=True)
+    avatar_cache_time = fields.IntegerField(required=True)
 
     class Meta(object):
         model = UserSettings
@@ -50,11 +87,30 @@ class LoginSettingsSerializer(Serializer):
     max_failed_login = fields.IntegerField(required=True)
     failed_login_timeout = fields.IntegerField(required=True)
     max_session_time = fields.IntegerField(required=True)
+    session_cache_time = fields.IntegerField(required=True)
 
     class Meta(object):
         model = LoginSettings
 
 
+class RateLimitPolicy(object):
+    def __init__(self):
+        self.route = ''
+        self.method = ''
+        self.limit = 0
+        self.window = 0
+
+
+class RateLimitPolicySerializer(Serializer):
+    route = fields.StringField(required=True)
+    method = fields.StringField(required=True)
+    limit = fields.IntegerField(required=True)
+    window = fields.IntegerField(required=True)
+
+    class Meta(object):
+        model = RateLimitPolicy
+
+
 class UserRules(object):
     def __init__(self):
         self.avatar_size = 0
@@ -85,6 +141,7 @@ class PostRules(object):
         self.title_max_char = 0
         self.content_min_char = 0
         self.content_max_char = 0
+        self.excerpt_max_char = 0
         self.tag_min_char = 0
         self.tag_max_char = 0
         self.tag_max_count = 0
@@ -95,6 +152,7 @@ class PostRulesSerializer(Serializer):
     title_max_char = fields.IntegerField(required=True)
     content_min_char = fields.IntegerField(required=True)
     content_max_char = fields.IntegerField(required=True)
+    excerpt_max_char = fields.IntegerField(required=True, validators=[RangeValidator(min=1)])
     tag_min_char = fields.IntegerField(required=True)
     tag_max_char = fields.IntegerField(required=True)
     tag_max_count = fields.IntegerField(required=True)
@@ -137,15 +195,19 @@ class Settings(object):
     def __init__(self):
         self.login = LoginSettings()
         self.post = PostSettings()
+        self.password = PasswordSettings()
         self.user = UserSettings()
         self.rules = Rules()
+        self.limits = []
 
 
 class SettingsSerializer(Serializer):
     login = fields.ObjectField(LoginSettingsSerializer, required=True)
     post = fields.ObjectField(PostSettingsSerializer, required=True)
+    password = fields.ObjectField(PasswordSettingsSerializer, required=True)
     user = fields.ObjectField(UserSettingsSerializer, required=True)
     rules = fields.ObjectField(RulesSerializer, required=True)
+    limits = fields.ListField(fields.ObjectField(RateLimitPolicySerializer), required=True)
 
     class Meta(object):
         model = Settings
@@ -175,16 +237,27 @@ def save_settings(settings_dto: Settings, write_to_config: bool = True):
     settings.login.max_failed_login = settings_dto.login.max_failed_login
     settings.login.failed_login_timeout = settings_dto.login.failed_login_timeout
     settings.login.max_session_time = settings_dto.login.max_session_time
+    settings.login.session_cache_time = settings_dto.login.session_cache_time
 
     # post settings
     settings.post.view_time_delay = settings_dto.post.view_time_delay
+    settings.post.view_flush_interval = settings_dto.post.view_flush_interval
+    settings.post.view_flush_batch_size = settings_dto.post.view_flush_batch_size
     settings.post.search_time_delay = settings_dto.post.search_time_delay
 
+    # password settings, pool size is only applied on restart
+    settings.password.algorithm = settings_dto.password.algorithm
+    settings.password.cost = settings_dto.password.cost
+    settings.password.workers = settings_dto.password.workers
+    settings.password.max_pending = settings_dto.password.max_pending
+
     # user settings
     settings.user.allow_avatar_capability = settings_dto.user.allow_avatar_capability
     settings.user.allow_manual_registration = settings_dto.user.allow_manual_registration
     settings.user.require_email_verification = settings_dto.user.require_email_verification
+    settings.user.email_verification_timeout = settings_dto.user.email_verification_timeout
     settings.user.upload_avatar_s3 = settings_dto.user.upload_avatar_s3
+    settings.user.avatar_cache_time = settings_dto.user.avatar_cache_time
 
     # user rules
     settings.rules.user.avatar_size = settings_dto.rules.user.avatar_size
@@ -198,6 +271,7 @@ def save_settings(settings_dto: Settings, write_to_config: bool = True):
     settings.rules.post.title_max_char = settings_dto.rules.post.title_max_char
     settings.rules.post.content_min_char = settings_dto.rules.post.content_min_char
     settings.rules.post.content_max_char = settings_dto.rules.post.content_max_char
+    settings.rules.post.excerpt_max_char = settings_dto.rules.post.excerpt_max_char
     settings.rules.post.tag_min_char = settings_dto.rules.post.tag_min_char
     settings.rules.post.tag_max_char = settings_dto.rules.post.tag_max_char
     settings.rules.post.tag_max_count = settings_dto.rules.post.tag_max_count
@@ -206,6 +280,9 @@ def save_settings(settings_dto: Settings, write_to_config: bool = True):
     settings.rules.comment.content_min_char = settings_dto.rules.comment.content_min_char
     settings.rules.comment.content_max_char = settings_dto.rules.comment.content_max_char
 
+    # rate limit policies
+    settings.limits = settings_dto.limits
+
     if write_to_config:
         with open('blog/settings.yml', 'w') as data:
             s = SettingsSerializer(object=settings)
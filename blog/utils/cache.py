@@ -0,0 +1,517 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+from uuid import uuid4
+import inject
+import redis
+from falcon_redis_cache.utils import cache_key
+from blog.constants import BLOG_RESPONSE_CACHE_SIZE, BLOG_RESPONSE_CACHE_TTL, BLOG_RESPONSE_LEASE_TIME, \
+    BLOG_RESPONSE_LEASE_WAIT, BLOG_RESPONSE_REFRESH_WORKERS
+
+
+RESPONSE_CACHE_CHANNEL = 'response-cache:invalidate'
+RESPONSE_TAG_PREFIX = 'cache-tag'
+RESPONSE_LEASE_PREFIX = 'cache-lease'
+RESPONSE_STALE_PREFIX = 'cache-stale'
+RESPONSE_FRESH_PREFIX = 'cache-fresh'
+# wsgi environ key marking requests re-rendering a response past its soft ttl
+RESPONSE_REFRESH_ENVIRON = 'blog.cache.refresh'
+# time in seconds invalidated responses are kept to be served while their replacement is rendered
+RESPONSE_STALE_TIME = 60
+# time in seconds between checks for a leased response
+RESPONSE_LEASE_POLL_INTERVAL = 0.025
+
+# invalidated responses are renamed rather than deleted, kept as stale copies
+RETIRE_SCRIPT = '''
+local retired = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('exists', key) == 1 then
+        local stale = ARGV[1] .. ':' .. key
+        redis.call('rename', key, stale)
+        redis.call('expire', stale, ARGV[2])
+        retired = retired + 1
+    end
+end
+return retired
+'''
+# leases are only released by their holder, an expired lease may have been acquired by another worker
+RELEASE_SCRIPT = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+'''
+# tag sets outlive every response they index, responses cached until invalidated keep their tag sets until then
+INDEX_SCRIPT = '''
+local hard_ttl = tonumber(ARGV[3])
+if hard_ttl > 0 then
+    redis.call('set', KEYS[1], ARGV[1], 'ex', hard_ttl)
+else
+    redis.call('set', KEYS[1], ARGV[1])
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('set', KEYS[2], 1, 'ex', ARGV[2])
+end
+for i = 3, #KEYS do
+    local ttl = redis.call('ttl', KEYS[i])
+    redis.call('sadd', KEYS[i], KEYS[1])
+    if hard_ttl == 0 then
+        redis.call('persist', KEYS[i])
+    elseif ttl == -2 or (ttl >= 0 and ttl < hard_ttl) then
+        redis.call('expire', KEYS[i], hard_ttl)
+    end
+end
+'''
+# tag of every response listing posts, invalidated when posts are created
+POSTS_TAG = 'posts'
+
+
+class ResponseCache(object):
+
+    def __init__(self, max_size: int, ttl: int, channel: str = RESPONSE_CACHE_CHANNEL):
+        """
+        In process LRU cache of rendered responses, consulted before the redis response cache.
+
+        Entries are keyed like their redis counterparts and expire after a short ttl. Invalidations are broadcast
+        over redis pub/sub so every worker evicts its own copy, the ttl bounds staleness of invalidations lost while
+        a worker is disconnected from redis.
+
+        :param max_size: Maximum number of bytes held by cached responses, caching is disabled if not positive.
+        :type max_size: int
+        :param ttl: Time in seconds responses are cached for.
+        :type ttl: int
+        :param channel: Redis channel invalidations are broadcast on.
+        :type channel: str
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.listener = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    @property
+    def client(self) -> redis.Redis:
+        # resolved lazily, the redis client is bound once the api has been configured
+        return inject.instance(redis.Redis)
+
+    @staticmethod
+    def sizeof(key: str, body: bytes) -> int:
+        return len(key) + len(body)
+
+    def _drop(self, key: str):
+        _, body = self.entries.pop(key)
+        self.size -= self.sizeof(key, body)
+
+    def get(self, key: str):
+        """
+        Fetch cached response, marking it as most recently used.
+
+        :param key: Cache key of response.
+        :type key: str
+        :return: bytes or None if not cached or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, body, ttl: int = None):
+        """
+        Cache response, evicting least recently used responses until the cache fits its size.
+
+        :param key: Cache key of response.
+        :type key: str
+        :param body: Rendered response.
+        :type body: bytes
+        :param ttl: Time in seconds response is cached for, at most the ttl of the cache.
+        :type ttl: int
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        size = self.sizeof(key, body)
+        if size > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic() + min(ttl or self.ttl, self.ttl), body)
+            self.size += size
+            while self.size > self.max_size:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def evict(self, keys: list, prefixes: list = ()):
+        """
+        Evict cached responses of this process.
+
+        :param keys: Cache keys of responses to evict.
+        :type keys: list
+        :param prefixes: Cache key prefixes of responses to evict, for resources cached with their query string.
+        :type prefixes: list
+        """
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self._drop(key)
+            if prefixes:
+                for key in [key for key in self.entries if key.startswith(tuple(prefixes))]:
+                    self._drop(key)
+            self.invalidations += 1
+
+    def invalidate(self, keys: list, prefixes: list = ()):
+        """
+        Evict cached responses of every worker.
+
+        :param keys: Cache keys of responses to evict.
+        :type keys: list
+        :param prefixes: Cache key prefixes of responses to evict, for resources cached with their query string.
+        :type prefixes: list
+        """
+        if not self.enabled:
+            return
+        self.evict(keys, prefixes)
+        self.client.publish(self.channel, json.dumps({'keys': list(keys), 'prefixes': list(prefixes)}))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def listen(self):
+        """Subscribe to invalidations of other workers, once per process."""
+        # workers are forked from the master process, threads of the master are not carried over
+        if not self.enabled or self.listener == os.getpid():
+            return
+        with self.lock:
+            if self.listener == os.getpid():
+                return
+            self.listener = os.getpid()
+        threading.Thread(target=self._listen, name='response-cache-listener', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    invalidation = json.loads(message['data'])
+                    self.evict(invalidation['keys'], invalidation['prefixes'])
+            except redis.ConnectionError:
+                # invalidations may have been missed while disconnected
+                self.clear()
+                time.sleep(1)
+
+    def stats(self) -> dict:
+        """
+        Fetch cache usage counters, counters are kept for the lifetime of the process.
+
+        :return: dict
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size}
+
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    """
+    Fetch in process response cache shared by the process.
+
+    :return: ResponseCache
+    """
+    return ResponseCache(BLOG_RESPONSE_CACHE_SIZE, BLOG_RESPONSE_CACHE_TTL)
+
+
+class Flight(object):
+
+    def __init__(self):
+        self.landed = threading.Event()
+        self.response = None
+
+
+class SingleFlight(object):
+
+    def __init__(self):
+        """
+        Coalesces concurrent renders of the same response by threads of a process.
+
+        The first thread to miss a response leads the flight and renders it, other threads wait for the flight to
+        land and are served its response.
+        """
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def join(self, key: str) -> tuple:
+        """
+        Join flight rendering a response, starting it if none is in flight.
+
+        :param key: Cache key of response.
+        :type key: str
+        :return: tuple of whether the caller leads the flight and the flight
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight:
+                return False, flight
+            flight = self.flights[key] = Flight()
+            return True, flight
+
+    def land(self, key: str, response=None):
+        """
+        Land flight led by the caller, releasing waiting threads.
+
+        :param key: Cache key of response.
+        :type key: str
+        :param response: Rendered response, None if rendering failed.
+        :type response: bytes
+        """
+        with self.lock:
+            flight = self.flights.pop(key, None)
+        if flight:
+            flight.response = response
+            flight.landed.set()
+
+
+@functools.lru_cache(maxsize=None)
+def get_single_flight() -> SingleFlight:
+    """
+    Fetch single flight of response renders shared by the process.
+
+    :return: SingleFlight
+    """
+    return SingleFlight()
+
+
+def lease_key(key: str) -> str:
+    return f'{RESPONSE_LEASE_PREFIX}:{key}'
+
+
+def stale_key(key: str) -> str:
+    return f'{RESPONSE_STALE_PREFIX}:{key}'
+
+
+def fresh_key(key: str) -> str:
+    return f'{RESPONSE_FRESH_PREFIX}:{key}'
+
+
+@functools.lru_cache(maxsize=None)
+def get_refresh_executor() -> ThreadPoolExecutor:
+    """
+    Fetch thread pool cached responses past their soft ttl are re-rendered on.
+
+    :return: ThreadPoolExecutor
+    """
+    return ThreadPoolExecutor(max_workers=BLOG_RESPONSE_REFRESH_WORKERS)
+
+
+def acquire_lease(client: redis.Redis, key: str):
+    """
+    Acquire lease to render a response across workers, leases expire after BLOG_RESPONSE_LEASE_TIME.
+
+    :param client: Redis client.
+    :type client: redis.Redis
+    :param key: Cache key of response.
+    :type key: str
+    :return: str lease token or None if leased by another request
+    """
+    token = uuid4().hex
+    if client.set(lease_key(key), token, nx=True, px=int(BLOG_RESPONSE_LEASE_TIME * 1000)):
+        return token
+    return None
+
+
+def release_lease(client: redis.Redis, key: str, token: str):
+    """
+    Release lease to render a response.
+
+    :param client: Redis client.
+    :type client: redis.Redis
+    :param key: Cache key of response.
+    :type key: str
+    :param token: Lease token returned by acquire_lease.
+    :type token: str
+    """
+    client.register_script(RELEASE_SCRIPT)(keys=[lease_key(key)], args=[token])
+
+
+def await_response(client: redis.Redis, key: str, lookup) -> tuple:
+    """
+    Wait for a response being rendered by another worker, for up to BLOG_RESPONSE_LEASE_WAIT.
+
+    :param client: Redis client.
+    :type client: redis.Redis
+    :param key: Cache key of response.
+    :type key: str
+    :param lookup: Callable looking up the cached response by key.
+    :type lookup: Callable
+    :return: tuple of response, or its stale copy, and lease token if the lease was acquired instead
+    """
+    deadline = time.monotonic() + BLOG_RESPONSE_LEASE_WAIT
+    while True:
+        token = acquire_lease(client, key)
+        if token:
+            return None, token
+        if time.monotonic() >= deadline:
+            # serve the invalidated response rather than join the herd, None if it was not kept
+            return client.get(stale_key(key)), None
+        time.sleep(RESPONSE_LEASE_POLL_INTERVAL)
+        cached = lookup(key)
+        if cached is not None:
+            return cached, None
+
+
+def retire_responses(client: redis.Redis, keys) -> int:
+    """
+    Invalidate cached responses, keeping stale copies for RESPONSE_STALE_TIME.
+
+    :param client: Redis client.
+    :type client: redis.Redis
+    :param keys: Cache keys of responses.
+    :type keys: Iterable
+    :return: int number of responses retired, responses which were not cached are skipped
+    """
+    keys = list(keys)
+    if not keys:
+        return 0
+    return client.register_script(RETIRE_SCRIPT)(keys=keys, args=[RESPONSE_STALE_PREFIX, RESPONSE_STALE_TIME])
+
+
+def resource_cache_key(req, resource, **params) -> str:
+    """
+    Construct response cache key of a resource, as falcon_redis_cache does for binded resources.
+
+    :param req: Request to pull scheme, host and authorization from.
+    :type req: falcon.Request
+    :param resource: Resource class.
+    :type resource: type
+    :return: str
+    """
+    # interpolate for safe formatting, binded resources are assumed to have routes with similar params
+    route = Template(resource.route.replace('{', '${')).safe_substitute(**params)
+    return cache_key(req, resource, f'{req.scheme}://{req.netloc}{route}')
+
+
+def resource_cache_prefixes(resource, key: str) -> list:
+    # resources using query strings are cached under every query, matched as falcon_redis_cache does
+    return [key[:-1]] if resource.cache_with_query else []
+
+
+def post_tag(post_id) -> str:
+    return f'post:{post_id}'
+
+
+def comment_tag(comment_id) -> str:
+    return f'comment:{comment_id}'
+
+
+def user_tag(user_id) -> str:
+    return f'user:{user_id}'
+
+
+def tag_key(tag: str) -> str:
+    return f'{RESPONSE_TAG_PREFIX}:{tag}'
+
+
+def tag_response(resp, tags):
+    """
+    Tag cached response with the entities it contains, see invalidate_tags.
+
+    :param resp: Response being rendered.
+    :type resp: falcon.Response
+    :param tags: Tags of entities included in response.
+    :type tags: Iterable[str]
+    """
+    resp.context.setdefault('cache_tags', set()).update(tags)
+
+
+def invalidate_response_tags(req, tags):
+    """
+    Evict cached responses tagged with the entities changed by a request once it succeeds.
+
+    :param req: Request changing entities.
+    :type req: falcon.Request
+    :param tags: Tags of changed entities.
+    :type tags: Iterable[str]
+    """
+    req.context.setdefault('cache_invalidate', set()).update(tags)
+
+
+def index_response(client: redis.Redis, key: str, body, tags, soft_ttl: int = 0, hard_ttl: int = 0):
+    """
+    Cache response in redis along with its entries in the tag index, in a single transaction.
+
+    Tag sets expire with the last response they index, so tags of entities which are never changed are not kept.
+
+    Responses past their soft ttl are served stale while they are re-rendered, responses past their hard ttl
+    are no longer served.
+
+    :param client: Redis client.
+    :type client: redis.Redis
+    :param key: Cache key of response.
+    :type key: str
+    :param body: Rendered response.
+    :type body: bytes
+    :param tags: Tags of entities included in response.
+    :type tags: Iterable[str]
+    :param soft_ttl: Time in seconds response is fresh for, fresh until invalidated if 0.
+    :type soft_ttl: int
+    :param hard_ttl: Time in seconds response is cached for, cached until invalidated if 0.
+    :type hard_ttl: int
+    """
+    tag_keys = [tag_key(tag) for tag in tags]
+    client.register_script(INDEX_SCRIPT)(keys=[key, fresh_key(key)] + tag_keys, args=[body, soft_ttl, hard_ttl])
+
+
+def invalidate_tags(tags, client: redis.Redis = None) -> int:
+    """
+    Evict cached responses tagged with any of the given tags, from redis and every worker.
+
+    :param tags: Tags of changed entities.
+    :type tags: Iterable[str]
+    :param client: Redis client, defaults to the bound client.
+    :type client: redis.Redis
+    :return: int number of responses evicted
+    """
+    tag_keys = [tag_key(tag) for tag in tags]
+    if not tag_keys:
+        return 0
+    client = client or inject.instance(redis.Redis)
+    # read and drop the index atomically, responses cached afterwards are indexed anew
+    pipe = client.pipeline()
+    for key in tag_keys:
+        pipe.smembers(key)
+    pipe.delete(*tag_keys)
+    keys = {key.decode('utf-8') for members in pipe.execute()[:-1] for key in members}
+    # responses cached in process are copies of redis responses, nothing to broadcast if none were cached
+    retired = retire_responses(client, keys)
+    if retired:
+        get_response_cache().invalidate(list(keys))
+    return retired
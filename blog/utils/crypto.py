@@ -1,9 +1,34 @@
 import base64
+import functools
 import hashlib
-from uuid import uuid4
+import hmac
+import os
+import re
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from Crypto import Random
 from Crypto.Cipher import AES
-from blog.constants import BLOG_CONTENT_KEY
+from blog.constants import BLOG_CONTENT_KEYS, BLOG_CONTENT_KEY_ID, BLOG_DECRYPT_WORKERS, BLOG_SEARCH_KEY, \
+    BLOG_COMPRESS_THRESHOLD, BLOG_DECRYPT_CACHE_SIZE
+
+
+# batches smaller than this are decrypted serially, threads cost more than they save
+DECRYPT_PARALLEL_THRESHOLD = 64
+# binary envelope headers by version, see EnvelopeCipher
+ENVELOPE_VERSION = 2
+ENVELOPE_HEADER_SIZES = {1: 2, 2: 3}
+ENVELOPE_NONCE_SIZE = 12
+# key legacy strings and version 1 envelopes were encrypted with
+LEGACY_KEY_ID = 0
+# envelope flags
+ENVELOPE_FLAG_ZLIB = 0x01
+ENVELOPE_FLAGS = ENVELOPE_FLAG_ZLIB
+# length of word fragments indexed for search, shorter fragments cannot be searched by index
+BLIND_INDEX_GRAM_SIZE = 3
 
 
 class AESCipher(object):
@@ -25,7 +50,7 @@ class AESCipher(object):
         :type raw: str
         :return: str
         """
-        raw = self._pad(raw)
+        raw = self._pad(raw.encode('utf-8'))
         iv = Random.new().read(AES.block_size)
         cipher = AES.new(self.key, AES.MODE_CBC, iv)
         return base64.b64encode(iv + cipher.encrypt(raw)).decode('utf-8')
@@ -43,58 +68,346 @@ class AESCipher(object):
         cipher = AES.new(self.key, AES.MODE_CBC, iv)
         return self._unpad(cipher.decrypt(enc[AES.block_size:])).decode('utf-8')
 
-    def _pad(self, s):
-        return s + (self.bs - len(s) % self.bs) * chr(self.bs - len(s) % self.bs)
+    def _pad(self, s: bytes) -> bytes:
+        return s + (self.bs - len(s) % self.bs) * bytes([self.bs - len(s) % self.bs])
 
     @staticmethod
     def _unpad(s):
         return s[:-ord(s[len(s)-1:])]
 
 
-def hash_password(password: str) -> tuple:
+class EnvelopeCipher(object):
+
+    def __init__(self, keys: dict, key_id: int):
+        """
+        AES-GCM encryption utility producing versioned binary envelopes, stored as BSON binary data.
+
+        Envelopes are laid out as version (1 byte), flags (1 byte), key id (1 byte), nonce (12 bytes) followed
+        by the ciphertext and authentication tag, the header is authenticated alongside the content. Content
+        may be compressed before being encrypted, flagged by ENVELOPE_FLAG_ZLIB. Content is decrypted with the
+        key it was encrypted with, allowing keys to be rotated while content is re-encrypted. Version 1
+        envelopes, without a key id, and legacy base64 encoded AES-CBC strings are still decrypted.
+
+        :param keys: Encryption keys by key id, each hashed into a 32 byte phrase.
+        :type keys: dict
+        :param key_id: Identifier of key new content is encrypted with.
+        :type key_id: int
+        """
+        self.aeads = {kid: AESGCM(hashlib.sha256(key.encode()).digest()) for kid, key in keys.items()}
+        if key_id not in self.aeads:
+            raise ValueError(f'Content key {key_id} is not part of the key ring.')
+        self.key_id = key_id
+        self.legacy = AESCipher(keys[LEGACY_KEY_ID])
+
+    def encrypt(self, raw: str, compress_threshold: int = None) -> bytes:
+        """
+        Encrypt raw content into binary envelope with the active key.
+
+        :param raw: Content to encrypt.
+        :type raw: str
+        :param compress_threshold: Compress content of at least this many bytes, never compressed if not provided.
+        :type compress_threshold: int
+        :return: bytes
+        """
+        data, flags = raw.encode('utf-8'), 0
+        if compress_threshold is not None and len(data) >= compress_threshold:
+            compressed = zlib.compress(data)
+            # incompressible content is stored as is
+            if len(compressed) < len(data):
+                data, flags = compressed, flags | ENVELOPE_FLAG_ZLIB
+        header = bytes([ENVELOPE_VERSION, flags, self.key_id])
+        nonce = os.urandom(ENVELOPE_NONCE_SIZE)
+        return header + nonce + self.aeads[self.key_id].encrypt(nonce, data, header)
+
+    def decrypt(self, enc) -> str:
+        """
+        Decrypt binary envelope or legacy encrypted string.
+
+        :param enc: Encrypted content to decrypt.
+        :type enc: bytes
+        :return: str
+        """
+        if isinstance(enc, str):
+            return self.legacy.decrypt(enc)
+        header_size = ENVELOPE_HEADER_SIZES.get(enc[0])
+        if not header_size or enc[1] & ~ENVELOPE_FLAGS:
+            raise ValueError(f'Unsupported content envelope version {enc[0]} with flags {enc[1]}.')
+        header = bytes(enc[:header_size])
+        aead = self.aeads.get(self.key_id_of(enc))
+        if not aead:
+            raise ValueError(f'Content key {self.key_id_of(enc)} is not part of the key ring.')
+        nonce = enc[header_size:header_size + ENVELOPE_NONCE_SIZE]
+        data = aead.decrypt(nonce, bytes(enc[header_size + ENVELOPE_NONCE_SIZE:]), header)
+        if header[1] & ENVELOPE_FLAG_ZLIB:
+            data = zlib.decompress(data)
+        return data.decode('utf-8')
+
+    @staticmethod
+    def key_id_of(enc) -> int:
+        """
+        Identify key content was encrypted with.
+
+        :param enc: Encrypted content.
+        :type enc: bytes
+        :return: int
+        """
+        return LEGACY_KEY_ID if isinstance(enc, str) or enc[0] == 1 else enc[2]
+
+    def is_current(self, enc) -> bool:
+        """
+        Verify content is a binary envelope encrypted with the active key.
+
+        :param enc: Encrypted content.
+        :type enc: bytes
+        :return: bool
+        """
+        return not isinstance(enc, str) and enc[0] == ENVELOPE_VERSION and self.key_id_of(enc) == self.key_id
+
+
+class PlaintextCache(object):
+
+    def __init__(self, max_size: int):
+        """
+        In process LRU cache of decrypted blog content, bounded by the memory held by its entries.
+
+        Entries are keyed by a digest of their ciphertext, edited content is encrypted anew and is therefore
+        never served stale. Plaintext is only ever held in process memory.
+
+        :param max_size: Maximum number of bytes held by cached entries, caching is disabled if not positive.
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def key(content) -> bytes:
+        """
+        Digest ciphertext into cache key.
+
+        :param content: Encrypted content.
+        :type content: bytes
+        :return: bytes
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    @staticmethod
+    def sizeof(key: bytes, plaintext: str) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(plaintext)
+
+    def get(self, key: bytes):
+        """
+        Fetch cached plaintext, marking it as most recently used.
+
+        :param key: Cache key of encrypted content.
+        :type key: bytes
+        :return: str or None if not cached
+        """
+        with self.lock:
+            plaintext = self.entries.get(key)
+            if plaintext is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return plaintext
+
+    def put(self, key: bytes, plaintext: str):
+        """
+        Cache plaintext, evicting least recently used entries until the cache fits its size.
+
+        :param key: Cache key of encrypted content.
+        :type key: bytes
+        :param plaintext: Decrypted content.
+        :type plaintext: str
+        """
+        size = self.sizeof(key, plaintext)
+        # entries larger than the cache would evict everything only to be evicted themselves
+        if size > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = plaintext
+            self.size += size
+            while self.size > self.max_size:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= self.sizeof(evicted_key, evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """
+        Fetch cache usage counters, counters are kept for the lifetime of the process.
+
+        :return: dict
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size}
+
+
+@functools.lru_cache(maxsize=None)
+def get_cipher() -> EnvelopeCipher:
     """
-    Hashes password with a randomly generated salt value.
+    Fetch content cipher for the configured key ring, keys are derived once per process.
 
-    :param password: Plain text password to hash.
-    :type password: str
-    :return: (hashed_password, salt)
+    :return: EnvelopeCipher
     """
-    salt = str(uuid4())
-    hashed_password = hashlib.sha256(password.encode('utf-8') + salt.encode('utf-8')).hexdigest()
-    return (hashed_password, salt)
+    return EnvelopeCipher(BLOG_CONTENT_KEYS, BLOG_CONTENT_KEY_ID)
 
 
-def compare_passwords(hashed: str, password: str, salt: str) -> bool:
+@functools.lru_cache(maxsize=None)
+def get_decrypt_executor() -> ThreadPoolExecutor:
     """
-    Compares hashed password for authentication.
+    Fetch thread pool used to decrypt large batches of blog content.
 
-    :param hashed: Hashed password to compare.
-    :type hashed: str
-    :param password: Plain text password to hash.
-    :type password: str
-    :param salt: Password salt.
-    :type salt: str
+    :return: ThreadPoolExecutor
     """
-    return hashed == hashlib.sha256(password.encode('utf-8') + salt.encode('utf-8')).hexdigest()
+    return ThreadPoolExecutor(max_workers=BLOG_DECRYPT_WORKERS)
 
 
-def encrypt_content(content: str) -> str:
+@functools.lru_cache(maxsize=None)
+def get_plaintext_cache() -> PlaintextCache:
     """
-    Encrypt blog post and comment content.
+    Fetch cache of decrypted blog content shared by the process.
+
+    :return: PlaintextCache
+    """
+    return PlaintextCache(BLOG_DECRYPT_CACHE_SIZE)
+
+
+def encrypt_content(content: str, compress: bool = True) -> bytes:
+    """
+    Encrypt blog post and comment content, content above the compression threshold is compressed first.
 
     :param content: Blog content to encrypt.
     :type content: str
-    :return: str
+    :param compress: Compress content above the compression threshold.
+    :type compress: bool
+    :return: bytes
     """
-    return AESCipher(BLOG_CONTENT_KEY).encrypt(content)
+    return get_cipher().encrypt(content, BLOG_COMPRESS_THRESHOLD if compress else None)
 
 
-def decrypt_content(content: str) -> str:
+def decrypt_content(content) -> str:
     """
-    Decrypt blog post and comment content.
+    Decrypt blog post and comment content, either binary envelopes or legacy encrypted strings.
 
     :param content: Blog content to decrypt.
-    :type content: str
+    :type content: bytes
     :return: str
     """
-    return AESCipher(BLOG_CONTENT_KEY).decrypt(content)
+    cache = get_plaintext_cache()
+    if not cache.enabled:
+        return get_cipher().decrypt(content)
+    key = cache.key(content)
+    plaintext = cache.get(key)
+    if plaintext is None:
+        plaintext = get_cipher().decrypt(content)
+        cache.put(key, plaintext)
+    return plaintext
+
+
+def decrypt_many(contents: list) -> list:
+    """
+    Decrypt batch of blog post and comment content, content cached by a previous request is not decrypted again.
+
+    :param contents: Blog content to decrypt.
+    :type contents: list
+    :return: [str, ...]
+    """
+    cache = get_plaintext_cache()
+    if not cache.enabled:
+        return decrypt_batch(contents)
+    keys = [cache.key(content) for content in contents]
+    plaintexts = [cache.get(key) for key in keys]
+    # only content missing from the cache is decrypted
+    missing = [index for index, plaintext in enumerate(plaintexts) if plaintext is None]
+    for index, plaintext in zip(missing, decrypt_batch([contents[index] for index in missing])):
+        plaintexts[index] = plaintext
+        cache.put(keys[index], plaintext)
+    return plaintexts
+
+
+def decrypt_batch(contents: list) -> list:
+    """
+    Decrypt batch of blog content without caching, large batches are split across a thread pool.
+
+    :param contents: Blog content to decrypt.
+    :type contents: list
+    :return: [str, ...]
+    """
+    return map_batch(get_cipher().decrypt, contents)
+
+
+def rotate_batch(contents: list) -> list:
+    """
+    Re-encrypt batch of blog content with the active key without caching, large batches are split across a
+    thread pool.
+
+    :param contents: Blog content to re-encrypt.
+    :type contents: list
+    :return: [bytes, ...]
+    """
+    cipher = get_cipher()
+    return map_batch(lambda content: encrypt_content(cipher.decrypt(content)), contents)
+
+
+def map_batch(function, contents: list) -> list:
+    """
+    Apply function to batch of blog content, large batches are split across a thread pool.
+
+    :param function: Function to apply to every item of batch.
+    :type function: function
+    :param contents: Blog content to process.
+    :type contents: list
+    :return: list
+    """
+    if len(contents) < DECRYPT_PARALLEL_THRESHOLD or BLOG_DECRYPT_WORKERS < 2:
+        return [function(content) for content in contents]
+    # one chunk per worker, submitting every document separately would cost more than processing it
+    size = -(-len(contents) // BLOG_DECRYPT_WORKERS)
+    chunks = get_decrypt_executor().map(
+        lambda chunk: [function(content) for content in chunk],
+        [contents[i:i + size] for i in range(0, len(contents), size)])
+    return [content for chunk in chunks for content in chunk]
+
+
+def blind_index(text: str) -> list:
+    """
+    Construct keyed tokens for every trigram of every word in text, allowing encrypted content to be
+    searched without storing or revealing its plain text.
+
+    Note: Any substring of text produces a subset of its tokens, tokens narrow down candidates for a
+    substring match but the match itself must still be verified against decrypted content.
+
+    :param text: Plain text to tokenize.
+    :type text: str
+    :return: [str, ...]
+    """
+    size = BLIND_INDEX_GRAM_SIZE
+    words = re.findall(r'\w+', (text or '').lower())
+    grams = {word[i:i + size] for word in words for i in range(len(word) - size + 1)}
+    key = BLOG_SEARCH_KEY.encode('utf-8')
+    # truncated to 64 bits, collisions only add candidates which are discarded on verification
+    return sorted(hmac.new(key, gram.encode('utf-8'), hashlib.sha256).hexdigest()[:16] for gram in grams)
@@ -0,0 +1,77 @@
+import threading
+
+
+_local = threading.local()
+
+
+class IdentityMap(object):
+
+    def __init__(self):
+        """
+        Request scoped unit of work cache for mongo documents.
+
+        Documents are stored by class and identifier, ensuring repeated lookups within a single
+        request resolve to the same in memory instance rather than another database round trip.
+        """
+        self._documents = {}
+
+    def get(self, document_class, document_id):
+        """
+        Fetch document from identity map.
+
+        :param document_class: Mongo document class to lookup.
+        :type document_class: Document
+        :param document_id: Identifier of document to lookup.
+        :type document_id: str
+        :return: Document
+        """
+        return self._documents.get((document_class, str(document_id)))
+
+    def add(self, document):
+        """
+        Register document with identity map.
+
+        :param document: Mongo document to register.
+        :type document: Document
+        :return: Document
+        """
+        key = (document.__class__, str(document.id))
+        self._documents[key] = document
+        return document
+
+    def discard(self, document_class, document_id):
+        """
+        Remove document from identity map, used when a document has been modified or deleted.
+
+        :param document_class: Mongo document class to remove.
+        :type document_class: Document
+        :param document_id: Identifier of document to remove.
+        :type document_id: str
+        """
+        self._documents.pop((document_class, str(document_id)), None)
+
+
+def bind_identity_map(identity_map: IdentityMap):
+    """
+    Bind identity map to the current thread for the lifetime of a request.
+
+    :param identity_map: Identity map to bind.
+    :type identity_map: IdentityMap
+    """
+    _local.identity_map = identity_map
+
+
+def release_identity_map():
+    """Release identity map bound to the current thread."""
+    _local.identity_map = None
+
+
+def current_identity_map() -> IdentityMap:
+    """
+    Fetch identity map bound to the current thread.
+
+    Note: Outside of a request a new, disposable identity map is provided so callers never share state.
+
+    :return: IdentityMap
+    """
+    return getattr(_local, 'identity_map', None) or IdentityMap()
@@ -0,0 +1,70 @@
+import time
+from uuid import uuid4
+import inject
+import redis
+
+
+# hits outside of the window are trimmed and hits within limit recorded in a single round trip, rejected hits are
+# never recorded so they do not count towards the limit
+HIT_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('zremrangebyscore', KEYS[1], 0, now - window)
+if redis.call('zcard', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('zadd', KEYS[1], now, ARGV[4])
+redis.call('expire', KEYS[1], window)
+return 1
+'''
+
+
+class RateLimiter(object):
+
+    def __init__(self, prefix: str = 'rate-limit'):
+        """
+        Sliding window rate limiter backed by redis sorted sets.
+
+        Every hit is stored as a sorted set member scored by time, hits outside of the window are
+        trimmed by the same script so each check costs a single redis round trip.
+
+        :param prefix: Prefix for redis keys.
+        :type prefix: str
+        """
+        self.prefix = prefix
+
+    @property
+    def client(self) -> redis.Redis:
+        # resolved lazily, the redis client is bound once the api has been configured
+        return inject.instance(redis.Redis)
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:{key}'
+
+    def hit(self, key: str, limit: int, window: int) -> bool:
+        """
+        Record hit if within limit for the given window.
+
+        :param key: Identifier of rate limited resource and requestee.
+        :type key: str
+        :param limit: Maximum number of hits within window.
+        :type limit: int
+        :param window: Window in seconds.
+        :type window: int
+        :return: bool
+        """
+        now = time.time()
+        return bool(self.client.register_script(HIT_SCRIPT)(
+            keys=[self._key(key)], args=[now, window, limit, f'{now}:{uuid4().hex}']))
+
+    def reset(self, key: str):
+        """
+        Drop every hit within the window.
+
+        :param key: Identifier of rate limited resource and requestee.
+        :type key: str
+        """
+        self.client.delete(self._key(key))
+
+
+limiter = RateLimiter()
@@ -0,0 +1,106 @@
+import falcon
+
+
+class RangedStream(object):
+
+    def __init__(self, stream, length: int):
+        """
+        File like view of the next bytes of a stream, used to serve byte ranges without buffering them.
+
+        :param stream: Stream positioned at the start of the range.
+        :type stream: file
+        :param length: Number of bytes in range.
+        :type length: int
+        """
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+def is_not_modified(req: falcon.Request, etag: str, last_modified=None) -> bool:
+    """
+    Evaluate conditional request headers against current representation of a resource.
+
+    :param req: Request object to pull conditional headers from.
+    :type req: falcon.Request
+    :param etag: Quoted entity tag of current representation.
+    :type etag: str
+    :param last_modified: Time current representation was last modified.
+    :type last_modified: datetime.datetime
+    :return: bool
+    """
+    if_none_match = req.get_header('If-None-Match')
+    if if_none_match:
+        # weak comparison, as required for If-None-Match
+        tags = [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = req.get_header_as_datetime('If-Modified-Since')
+    # http dates are only precise to the second
+    return bool(if_modified_since and last_modified and last_modified.replace(microsecond=0) <= if_modified_since)
+
+
+def send_media(req: falcon.Request, resp: falcon.Response, stream, length: int, content_type: str, etag: str,
+               last_modified=None, max_age: int = 0):
+    """
+    Stream media to client, supporting conditional and byte range requests.
+
+    Note: The stream is read by the server in blocks as the response is written, media is never buffered
+    as a whole.
+
+    :param req: Request object to pull conditional and range headers from.
+    :type req: falcon.Request
+    :param resp: Response object to stream media with.
+    :type resp: falcon.Response
+    :param stream: Seekable file like object holding media.
+    :type stream: file
+    :param length: Media size in bytes.
+    :type length: int
+    :param content_type: Media type.
+    :type content_type: str
+    :param etag: Quoted entity tag of media.
+    :type etag: str
+    :param last_modified: Time media was last modified.
+    :type last_modified: datetime.datetime
+    :param max_age: Time in seconds clients may cache media without revalidating.
+    :type max_age: int
+    """
+    resp.etag = etag
+    if last_modified:
+        resp.last_modified = last_modified
+    resp.cache_control = ['public', f'max-age={max_age}']
+    resp.accept_ranges = 'bytes'
+    if is_not_modified(req, etag, last_modified):
+        resp.status = falcon.HTTP_304
+        stream.close()
+        return
+    resp.content_type = content_type
+    if_range = req.get_header('If-Range')
+    # ranges of an outdated representation are ignored in favour of the full media
+    byte_range = req.range if not if_range or if_range == etag else None
+    if not byte_range:
+        resp.stream = stream
+        resp.stream_len = length
+        return
+    first, last = byte_range
+    if first < 0:
+        # suffix range, ie: the last 500 bytes
+        first, last = max(length + first, 0), length - 1
+    elif last < 0 or last >= length:
+        last = length - 1
+    if first >= length:
+        stream.close()
+        raise falcon.HTTPRangeNotSatisfiable(length)
+    stream.seek(first)
+    resp.status = falcon.HTTP_206
+    resp.content_range = (first, last, length)
+    resp.stream = RangedStream(stream, last - first + 1)
+    resp.stream_len = last - first + 1
@@ -0,0 +1,123 @@
+import base64
+import binascii
+import datetime
+from bson import ObjectId, SON
+from mongoengine import Q, QuerySet
+from pymongo import ASCENDING
+from blog.errors import InvalidCursorError
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MILLISECOND = datetime.timedelta(milliseconds=1)
+
+
+def encode_cursor(value: datetime.datetime, document_id) -> str:
+    """
+    Encode opaque pagination cursor from a document sort key and identifier.
+
+    :param value: Sort key of last document in page, mongo stores datetimes to the millisecond.
+    :type value: datetime.datetime
+    :param document_id: Identifier of last document in page.
+    :type document_id: ObjectId
+    :return: str
+    """
+    # documents without a sort key are sorted first, encoded with an empty sort key
+    milliseconds = '' if value is None else (value - EPOCH) // MILLISECOND
+    token = f'{milliseconds}:{document_id}'
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode opaque pagination cursor into a document sort key and identifier.
+
+    :param cursor: Cursor to decode.
+    :type cursor: str
+    :return: (datetime.datetime, ObjectId), sort key is None for documents without one
+    """
+    try:
+        milliseconds, document_id = base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8').split(':')
+        if not milliseconds:
+            return None, ObjectId(document_id)
+        return EPOCH + int(milliseconds) * MILLISECOND, ObjectId(document_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursorError()
+
+
+def paginate(queryset: QuerySet, start: int = None, count: int = None, cursor: str = None,
+             key: str = 'created') -> QuerySet:
+    """
+    Paginate queryset by sort key, cursors are preferred over offsets as every page costs a single index seek.
+
+    :param queryset: Queryset to paginate.
+    :type queryset: QuerySet
+    :param start: Used for offset pagination, specify where to start.
+    :type start: int
+    :param count: Used for pagination, specify number of documents to find.
+    :type count: int
+    :param cursor: Used for keyset pagination, cursor of the last document from the previous page.
+    :type cursor: str
+    :param key: Document field to sort and paginate by.
+    :type key: str
+    :return: QuerySet
+    """
+    queryset = queryset.order_by(key, 'id')
+    if cursor:
+        value, document_id = decode_cursor(cursor)
+        # documents without a sort key precede every other document
+        following = Q(**{f'{key}__ne': None}) if value is None else Q(**{f'{key}__gt': value})
+        queryset = queryset.filter(following | Q(**{key: value, 'id__gt': document_id}))
+    elif start:
+        queryset = queryset.skip(start)
+    if count:
+        queryset = queryset.limit(count)
+    return queryset
+
+
+def paginate_pipeline(match: dict, start: int = None, count: int = None, cursor: str = None,
+                      key: str = 'created') -> list:
+    """
+    Construct aggregation stages paginating raw mongo documents by sort key, see paginate.
+
+    :param match: Mongo query documents must match.
+    :type match: dict
+    :param start: Used for offset pagination, specify where to start.
+    :type start: int
+    :param count: Used for pagination, specify number of documents to find.
+    :type count: int
+    :param cursor: Used for keyset pagination, cursor of the last document from the previous page.
+    :type cursor: str
+    :param key: Document field to sort and paginate by.
+    :type key: str
+    :return: [dict, ...]
+    """
+    if cursor:
+        value, document_id = decode_cursor(cursor)
+        following = {key: {'$ne': None}} if value is None else {key: {'$gt': value}}
+        match = {'$and': [match, {'$or': [following, {key: value, '_id': {'$gt': document_id}}]}]}
+    pipeline = [{'$match': match}, {'$sort': SON([(key, ASCENDING), ('_id', ASCENDING)])}]
+    if start and not cursor:
+        pipeline.append({'$skip': start})
+    if count:
+        pipeline.append({'$limit': count})
+    return pipeline
+
+
+def next_cursor(documents: list, count: int = None, key: str = 'created') -> str:
+    """
+    Construct cursor for the page following the provided documents.
+
+    :param documents: Documents or raw mongo documents in current page.
+    :type documents: list
+    :param count: Requested page size, no cursor is provided for partial pages.
+    :type count: int
+    :param key: Document field documents were paginated by.
+    :type key: str
+    :return: str
+    """
+    if not count or len(documents) < count:
+        return None
+    last = documents[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last[key], last['_id'])
+    return encode_cursor(getattr(last, key), last.id)
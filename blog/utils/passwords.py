@@ -0,0 +1,143 @@
+import functools
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+from blog.errors import PasswordServiceBusyError
+from blog.settings import settings
+
+
+# scrypt block size and parallelization, the configured cost is the log2 of its work factor
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELIZATION = 1
+
+
+class PasswordAlgorithms(object):
+
+    # salted sha256 digests stored before passwords were hashed with a key derivation function,
+    # verified so existing users are rehashed on login but never produced
+    LEGACY = 'sha256'
+    PBKDF2_SHA256 = 'pbkdf2_sha256'
+    SCRYPT = 'scrypt'
+
+
+@functools.lru_cache(maxsize=None)
+def get_password_executor() -> ThreadPoolExecutor:
+    """
+    Fetch thread pool passwords are hashed on, key derivation functions release the gil.
+
+    :return: ThreadPoolExecutor
+    """
+    return ThreadPoolExecutor(max_workers=settings.password.workers)
+
+
+@functools.lru_cache(maxsize=None)
+def get_password_slots() -> threading.BoundedSemaphore:
+    """
+    Fetch semaphore bounding passwords being hashed or waiting to be hashed by the process.
+
+    :return: BoundedSemaphore
+    """
+    return threading.BoundedSemaphore(settings.password.workers + settings.password.max_pending)
+
+
+def derive_key(password: str, salt: str, algorithm: str, cost: int) -> str:
+    """
+    Derive password hash with given algorithm and cost.
+
+    :param password: Plain text password to hash.
+    :type password: str
+    :param salt: Password salt.
+    :type salt: str
+    :param algorithm: Key derivation function, see PasswordAlgorithms.
+    :type algorithm: str
+    :param cost: Iterations for pbkdf2, log2 of the work factor for scrypt.
+    :type cost: int
+    :return: str
+    """
+    password, salt = password.encode('utf-8'), salt.encode('utf-8')
+    if algorithm == PasswordAlgorithms.PBKDF2_SHA256:
+        return hashlib.pbkdf2_hmac('sha256', password, salt, cost).hex()
+    if algorithm == PasswordAlgorithms.SCRYPT:
+        n = 2 ** cost
+        return hashlib.scrypt(password, salt=salt, n=n, r=SCRYPT_BLOCK_SIZE, p=SCRYPT_PARALLELIZATION,
+                              maxmem=256 * SCRYPT_BLOCK_SIZE * n).hex()
+    if algorithm == PasswordAlgorithms.LEGACY:
+        return hashlib.sha256(password + salt).hexdigest()
+    raise ValueError(f'Unsupported password algorithm {algorithm}.')
+
+
+def run_hasher(*args) -> str:
+    """
+    Derive password hash on the password thread pool, requests are turned away rather than queued once
+    the pool is saturated so bursts of logins cannot hold up the worker.
+
+    :return: str
+    """
+    slots = get_password_slots()
+    if not slots.acquire(blocking=False):
+        raise PasswordServiceBusyError()
+    try:
+        return get_password_executor().submit(derive_key, *args).result()
+    finally:
+        slots.release()
+
+
+def parse_hash(hashed: str) -> tuple:
+    """
+    Split stored password hash into its parameters.
+
+    :param hashed: Stored password hash.
+    :type hashed: str
+    :return: (algorithm, cost, digest)
+    """
+    if '$' not in hashed:
+        return PasswordAlgorithms.LEGACY, 0, hashed
+    algorithm, cost, digest = hashed.split('$', 2)
+    return algorithm, int(cost), digest
+
+
+def hash_password(password: str) -> tuple:
+    """
+    Hashes password with a randomly generated salt value, using the configured algorithm and cost.
+
+    :param password: Plain text password to hash.
+    :type password: str
+    :return: (hashed_password, salt)
+    """
+    salt = str(uuid4())
+    algorithm, cost = settings.password.algorithm, settings.password.cost
+    return f'{algorithm}${cost}${run_hasher(password, salt, algorithm, cost)}', salt
+
+
+def verify_password(hashed: str, password: str, salt: str) -> bool:
+    """
+    Compares hashed password for authentication.
+
+    :param hashed: Stored password hash.
+    :type hashed: str
+    :param password: Plain text password to hash.
+    :type password: str
+    :param salt: Password salt.
+    :type salt: str
+    :return: bool
+    """
+    algorithm, cost, digest = parse_hash(hashed)
+    if algorithm == PasswordAlgorithms.LEGACY:
+        candidate = derive_key(password, salt, algorithm, cost)
+    else:
+        candidate = run_hasher(password, salt, algorithm, cost)
+    return hmac.compare_digest(candidate, digest)
+
+
+def needs_rehash(hashed: str) -> bool:
+    """
+    Verify whether password was hashed with parameters other than those configured.
+
+    :param hashed: Stored password hash.
+    :type hashed: str
+    :return: bool
+    """
+    algorithm, cost, _ = parse_hash(hashed)
+    return (algorithm, cost) != (settings.password.algorithm, settings.password.cost)
@@ -95,3 +95,40 @@ class LengthValidator(object):
 class CharLenValidator(LengthValidator):
 
     pass
+
+
+class RangeValidator(object):
+
+    def __init__(self, min: int = None, max: int = None):
+        """
+        Number range validator for r2dto serializer fields.
+
+        :param min: Minimum value for field, unbounded if None.
+        :type min: int
+        :param max: Maximum value for field, unbounded if None.
+        :type max: int
+        """
+        self.min = min
+        self.max = max
+
+    def validate(self, field, data):
+        if self.min is not None and data < self.min:
+            raise ValidationError(f'Field "{field.name}" must be greater than or equal to {self.min}.')
+        if self.max is not None and data > self.max:
+            raise ValidationError(f'Field "{field.name}" must be less than or equal to {self.max}.')
+
+
+class ChoiceValidator(object):
+
+    def __init__(self, choices):
+        """
+        Choice validator for r2dto serializer fields.
+
+        :param choices: Values allowed for field.
+        :type choices: Iterable
+        """
+        self.choices = choices
+
+    def validate(self, field, data):
+        if data not in self.choices:
+            raise ValidationError(f'Field "{field.name}" must be one of {", ".join(map(str, self.choices))}.')
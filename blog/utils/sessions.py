@@ -0,0 +1,159 @@
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+import inject
+import redis
+from bson import ObjectId
+from blog.constants import BLOG_SESSION_CACHE_SIZE, BLOG_SESSION_CACHE_REDIS
+
+
+class SessionUser(object):
+
+    def __init__(self, **kwargs):
+        """
+        Authenticated user of a request, holding only the user fields requests are authorized with.
+
+        Full user resources must be fetched with blog.core.users.get_user.
+        """
+        self.id = kwargs.get('id')
+        self.username = kwargs.get('username')
+        self.role = kwargs.get('role')
+
+
+class SessionCache(object):
+
+    def __init__(self, max_entries: int, use_redis: bool = False, prefix: str = 'session'):
+        """
+        Short lived cache of authenticated users by user identifier.
+
+        Sessions are held in process by default, or in redis to be shared by every worker. Invalidating a session
+        held in process only reaches the invalidating process, other workers serve it until it expires.
+
+        :param max_entries: Maximum number of sessions held in process, least recently used are evicted first.
+        :type max_entries: int
+        :param use_redis: Store sessions in redis rather than in process.
+        :type use_redis: bool
+        :param prefix: Prefix for redis keys.
+        :type prefix: str
+        """
+        self.max_entries = max_entries
+        self.use_redis = use_redis
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def client(self) -> redis.Redis:
+        # resolved lazily, the redis client is bound once the api has been configured
+        return inject.instance(redis.Redis)
+
+    def _key(self, user_id: str) -> str:
+        return f'{self.prefix}:{user_id}'
+
+    def _count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, user_id: str):
+        """
+        Fetch cached session of user.
+
+        :param user_id: Identifier of user.
+        :type user_id: str
+        :return: SessionUser or None if not cached or expired
+        """
+        if self.use_redis:
+            cached = self.client.get(self._key(user_id))
+            self._count(cached is not None)
+            if cached is None:
+                return None
+            session = json.loads(cached)
+            return SessionUser(id=ObjectId(session['id']), username=session['username'], role=session['role'])
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[0] <= time.monotonic():
+                del self.entries[user_id]
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, session: SessionUser, ttl: int):
+        """
+        Cache session of user.
+
+        :param user_id: Identifier of user.
+        :type user_id: str
+        :param session: Session to cache.
+        :type session: SessionUser
+        :param ttl: Time in seconds session is cached for.
+        :type ttl: int
+        """
+        if self.use_redis:
+            self.client.set(self._key(user_id), json.dumps({
+                'id': str(session.id),
+                'username': session.username,
+                'role': session.role}), ex=ttl)
+            return
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + ttl, session)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        """
+        Drop cached session of user, the next request of the user reloads it.
+
+        :param user_id: Identifier of user.
+        :type user_id: str
+        """
+        with self.lock:
+            self.entries.pop(user_id, None)
+            self.invalidations += 1
+        if self.use_redis:
+            self.client.delete(self._key(user_id))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Fetch cache usage counters, counters are kept for the lifetime of the process.
+
+        :return: dict
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries}
+
+
+@functools.lru_cache(maxsize=None)
+def get_session_cache() -> SessionCache:
+    """
+    Fetch cache of authenticated users shared by the process.
+
+    :return: SessionCache
+    """
+    return SessionCache(BLOG_SESSION_CACHE_SIZE, BLOG_SESSION_CACHE_REDIS)
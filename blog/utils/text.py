@@ -0,0 +1,27 @@
+import re
+
+
+ELLIPSIS = '…'
+
+
+def excerpt(text: str, max_char: int) -> str:
+    """
+    Shorten text to at most max_char characters, cutting at a word boundary where possible.
+
+    Note: Excerpts are never longer than max_char, shortening an excerpt again leaves it unchanged.
+
+    :param text: Text to shorten.
+    :type text: str
+    :param max_char: Maximum number of characters of excerpt.
+    :type max_char: int
+    :return: str
+    """
+    if max_char < 1:
+        return ''
+    if len(text) <= max_char:
+        return text
+    cut = text[:max_char - len(ELLIPSIS)]
+    # drop trailing partial word, unless it is the only word
+    if not text[len(cut)].isspace() and re.search(r'\s', cut):
+        cut = re.sub(r'\S+$', '', cut)
+    return cut.rstrip() + ELLIPSIS
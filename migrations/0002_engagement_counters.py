@@ -0,0 +1,65 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+POST_COLLECTION = 'post'
+POST_LIKE_COLLECTION = 'post_like'
+POST_VIEW_COLLECTION = 'post_view'
+COMMENT_COLLECTION = 'comment'
+COMMENT_LIKE_COLLECTION = 'comment_like'
+BATCH_SIZE = 1000
+
+
+def count_by(db, collection: str, field: str) -> dict:
+    """
+    Count documents within a collection grouped by the provided field.
+
+    :param db: Database to aggregate against.
+    :type db: Database
+    :param collection: Name of collection to aggregate.
+    :type collection: str
+    :param field: Name of field to group documents by.
+    :type field: str
+    :return: dict
+    """
+    pipeline = [{'$group': {'_id': f'${field}', 'count': {'$sum': 1}}}]
+    return {str(doc['_id']): doc['count'] for doc in db[collection].aggregate(pipeline)}
+
+
+def write_counters(db, collection: str, counters: dict):
+    """
+    Overwrite engagement counters for every document in a collection.
+
+    :param db: Database to write to.
+    :type db: Database
+    :param collection: Name of collection to update.
+    :type collection: str
+    :param counters: Mapping of counter field to per document counts.
+    :type counters: dict
+    """
+    operations = []
+    for doc in db[collection].find({}, {'_id': 1}):
+        doc_id = str(doc['_id'])
+        operations.append(UpdateOne(
+            {'_id': ObjectId(doc_id)},
+            {'$set': {field: counts.get(doc_id, 0) for field, counts in counters.items()}}))
+        if len(operations) >= BATCH_SIZE:
+            db[collection].bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        db[collection].bulk_write(operations, ordered=False)
+
+
+def up(db):
+    # recomputes counters from scratch, safe to re-run to repair drifted counters
+    write_counters(db, POST_COLLECTION, {
+        'likes': count_by(db, POST_LIKE_COLLECTION, 'post_id'),
+        'views': count_by(db, POST_VIEW_COLLECTION, 'post_id'),
+        'comments': count_by(db, COMMENT_COLLECTION, 'post_id')})
+    write_counters(db, COMMENT_COLLECTION, {
+        'likes': count_by(db, COMMENT_LIKE_COLLECTION, 'comment_id')})
+
+
+def down(db):
+    db[POST_COLLECTION].update_many({}, {'$unset': {'likes': '', 'views': '', 'comments': ''}})
+    db[COMMENT_COLLECTION].update_many({}, {'$unset': {'likes': ''}})
@@ -0,0 +1,75 @@
+from pymongo import ASCENDING, DESCENDING
+
+
+INDEXES = {
+    'failed_login': [
+        ([('username', ASCENDING), ('ip_address', ASCENDING), ('time', DESCENDING)], {})],
+    'user_validation': [
+        ([('user_id', ASCENDING)], {})],
+    'user': [
+        ([('username', ASCENDING)], {'unique': True}),
+        ([('email', ASCENDING)], {'unique': True}),
+        ([('register_date', ASCENDING), ('_id', ASCENDING)], {})],
+    'post_like': [
+        ([('post_id', ASCENDING), ('user_id', ASCENDING)], {'unique': True}),
+        ([('user_id', ASCENDING), ('time', ASCENDING), ('_id', ASCENDING)], {})],
+    'post_view': [
+        ([('post_id', ASCENDING), ('user_id', ASCENDING), ('ip_address', ASCENDING), ('_id', DESCENDING)], {})],
+    'post_search_request': [
+        ([('user_id', ASCENDING), ('time', DESCENDING)], {})],
+    'post': [
+        ([('private', ASCENDING), ('created', ASCENDING), ('_id', ASCENDING)], {}),
+        ([('author', ASCENDING), ('created', ASCENDING), ('_id', ASCENDING)], {}),
+        ([('created', ASCENDING), ('_id', ASCENDING)], {})],
+    'comment_like': [
+        ([('comment_id', ASCENDING), ('user_id', ASCENDING)], {'unique': True})],
+    'comment': [
+        ([('post_id', ASCENDING), ('created', ASCENDING), ('_id', ASCENDING)], {}),
+        ([('author', ASCENDING), ('created', ASCENDING), ('_id', ASCENDING)], {})],
+}
+
+# likes were toggled without a unique constraint, duplicates must be removed before one can be built
+DEDUPLICATE = {
+    'post_like': ['post_id', 'user_id'],
+    'comment_like': ['comment_id', 'user_id'],
+}
+
+
+def deduplicate(db, collection: str, fields: list):
+    """
+    Remove all but the first document for every duplicated combination of fields.
+
+    :param db: Database to deduplicate.
+    :type db: Database
+    :param collection: Name of collection to deduplicate.
+    :type collection: str
+    :param fields: Fields which must be unique together.
+    :type fields: list
+    """
+    pipeline = [
+        {'$group': {
+            '_id': {field: f'${field}' for field in fields},
+            'ids': {'$push': '$_id'},
+            'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}]
+    for group in db[collection].aggregate(pipeline, allowDiskUse=True):
+        db[collection].delete_many({'_id': {'$in': sorted(group['ids'])[1:]}})
+
+
+def up(db):
+    for collection, fields in DEDUPLICATE.items():
+        deduplicate(db, collection, fields)
+    # note: unique user indexes will fail to build if duplicate usernames or emails exist, these must be
+    # resolved by hand as there is no safe way to merge user accounts
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            db[collection].create_index(keys, background=True, **options)
+
+
+def down(db):
+    for collection, indexes in INDEXES.items():
+        existing = db[collection].index_information()
+        for keys, _ in indexes:
+            name = '_'.join(f'{field}_{direction}' for field, direction in keys)
+            if name in existing:
+                db[collection].drop_index(name)
@@ -0,0 +1,15 @@
+from blog.indexes import TTL_INDEXES, sync_ttl_indexes
+from blog.settings import settings
+
+
+def up(db):
+    # expiry windows are defined by blog settings, the settings resource keeps them in sync from here on
+    sync_ttl_indexes(settings)
+
+
+def down(db):
+    for document, field, _ in TTL_INDEXES:
+        collection = db[document._get_collection_name()]
+        name = f'{field}_1'
+        if name in collection.index_information():
+            collection.drop_index(name)
@@ -0,0 +1,48 @@
+from pymongo import ASCENDING, UpdateOne
+from blog.utils.crypto import blind_index, decrypt_many
+
+
+POST_COLLECTION = 'post'
+TOKEN_FIELDS = {'description': 'description_tokens', 'content': 'content_tokens'}
+BATCH_SIZE = 500
+
+
+def write_tokens(db, posts: list):
+    """
+    Store blind index tokens for a batch of posts.
+
+    :param db: Database to write to.
+    :type db: Database
+    :param posts: Post documents with encrypted description and content.
+    :type posts: list
+    """
+    operations = []
+    for field, token_field in TOKEN_FIELDS.items():
+        encrypted = [post for post in posts if post.get(field)]
+        for post, text in zip(encrypted, decrypt_many([post[field] for post in encrypted])):
+            operations.append(UpdateOne({'_id': post['_id']}, {'$set': {token_field: blind_index(text)}}))
+    if operations:
+        db[POST_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def up(db):
+    # posts are tokenized in batches, only posts missing tokens are processed so the migration may be resumed
+    posts = db[POST_COLLECTION].find(
+        {'content_tokens': {'$exists': False}}, {field: True for field in TOKEN_FIELDS}).batch_size(BATCH_SIZE)
+    batch = []
+    for post in posts:
+        batch.append(post)
+        if len(batch) >= BATCH_SIZE:
+            write_tokens(db, batch)
+            batch = []
+    write_tokens(db, batch)
+    for token_field in TOKEN_FIELDS.values():
+        db[POST_COLLECTION].create_index([(token_field, ASCENDING)], background=True)
+
+
+def down(db):
+    existing = db[POST_COLLECTION].index_information()
+    for token_field in TOKEN_FIELDS.values():
+        if f'{token_field}_1' in existing:
+            db[POST_COLLECTION].drop_index(f'{token_field}_1')
+    db[POST_COLLECTION].update_many({}, {'$unset': {token_field: '' for token_field in TOKEN_FIELDS.values()}})
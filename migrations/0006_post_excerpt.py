@@ -0,0 +1,42 @@
+from pymongo import UpdateOne
+from blog.settings import settings
+from blog.utils.crypto import decrypt_many, encrypt_content
+from blog.utils.text import excerpt
+
+
+POST_COLLECTION = 'post'
+BATCH_SIZE = 500
+
+
+def write_excerpts(db, posts: list):
+    """
+    Store encrypted excerpts for a batch of posts.
+
+    :param db: Database to write to.
+    :type db: Database
+    :param posts: Post documents with encrypted content.
+    :type posts: list
+    """
+    operations = [
+        UpdateOne({'_id': post['_id']}, {'$set': {
+            'excerpt': encrypt_content(excerpt(content, settings.rules.post.excerpt_max_char))}})
+        for post, content in zip(posts, decrypt_many([post['content'] for post in posts]))]
+    if operations:
+        db[POST_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def up(db):
+    # posts are processed in batches, only posts missing excerpts are processed so the migration may be resumed
+    posts = db[POST_COLLECTION].find(
+        {'excerpt': {'$exists': False}, 'content': {'$exists': True}}, {'content': True}).batch_size(BATCH_SIZE)
+    batch = []
+    for post in posts:
+        batch.append(post)
+        if len(batch) >= BATCH_SIZE:
+            write_excerpts(db, batch)
+            batch = []
+    write_excerpts(db, batch)
+
+
+def down(db):
+    db[POST_COLLECTION].update_many({}, {'$unset': {'excerpt': ''}})
@@ -0,0 +1,12 @@
+# failed logins and search requests are rate limited in redis, see blog.utils.limiter
+COLLECTIONS = ['failed_login', 'post_search_request']
+
+
+def up(db):
+    for collection in COLLECTIONS:
+        db.drop_collection(collection)
+
+
+def down(db):
+    # records only mattered within their rate limit windows, nothing is left to restore
+    pass
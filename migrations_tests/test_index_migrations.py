@@ -0,0 +1,67 @@
+import copy
+import os
+from alley import Migrations
+from unittest import TestCase
+from blog.db import db
+from blog.indexes import sync_ttl_indexes
+from blog.settings import settings, save_settings
+from tests.utils import drop_database, random_string
+
+
+MIGRATION_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POST_COLLECTION = 'post'
+POST_LIKE_COLLECTION = 'post_like'
+USER_VALIDATION_COLLECTION = 'user_validation'
+FAILED_LOGIN_COLLECTION = 'failed_login'
+POST_SEARCH_REQUEST_COLLECTION = 'post_search_request'
+
+
+class IndexMigrationTests(TestCase):
+
+    def setUp(self):
+        drop_database(False)
+        self.migrations = Migrations(MIGRATION_PATH, db)
+
+    def test_migration_0003(self):
+        migration_key = '0003'
+        post_id, user_id = random_string(24), random_string(24)
+        # duplicate likes could previously be created by concurrent requests
+        for _ in range(3):
+            db[POST_LIKE_COLLECTION].insert_one({'post_id': post_id, 'user_id': user_id})
+        db[POST_COLLECTION].insert_one({'author': random_string(24), 'title': random_string(10)})
+        self.migrations.up(migration_key)
+        self.assertEqual(db[POST_LIKE_COLLECTION].count_documents({}), 1)
+        post_like_indexes = db[POST_LIKE_COLLECTION].index_information()
+        self.assertTrue(post_like_indexes['post_id_1_user_id_1'].get('unique'))
+        self.assertIn('private_1_created_1__id_1', db[POST_COLLECTION].index_information())
+        self.migrations.down(migration_key)
+        self.assertNotIn('post_id_1_user_id_1', db[POST_LIKE_COLLECTION].index_information())
+        self.assertNotIn('private_1_created_1__id_1', db[POST_COLLECTION].index_information())
+
+    def test_migration_0004(self):
+        migration_key = '0004'
+        self.migrations.up(migration_key)
+        validation_index = db[USER_VALIDATION_COLLECTION].index_information().get('requested_1')
+        self.assertEqual(validation_index.get('expireAfterSeconds'), settings.user.email_verification_timeout)
+        # verify ttl indexes follow blog settings
+        updated_settings = copy.deepcopy(settings)
+        updated_settings.user.email_verification_timeout += 60
+        save_settings(updated_settings, False)
+        sync_ttl_indexes(settings)
+        validation_index = db[USER_VALIDATION_COLLECTION].index_information().get('requested_1')
+        self.assertEqual(validation_index.get('expireAfterSeconds'), updated_settings.user.email_verification_timeout)
+        updated_settings.user.email_verification_timeout -= 60
+        save_settings(updated_settings, False)
+        sync_ttl_indexes(settings)
+        self.migrations.down(migration_key)
+        self.assertNotIn('requested_1', db[USER_VALIDATION_COLLECTION].index_information())
+
+    def test_migration_0007(self):
+        migration_key = '0007'
+        # rate limits were previously recorded in mongo
+        db[FAILED_LOGIN_COLLECTION].insert_one({'username': random_string(10)})
+        db[POST_SEARCH_REQUEST_COLLECTION].insert_one({'user_id': random_string(24)})
+        self.migrations.up(migration_key)
+        collections = db.list_collection_names()
+        self.assertNotIn(FAILED_LOGIN_COLLECTION, collections)
+        self.assertNotIn(POST_SEARCH_REQUEST_COLLECTION, collections)
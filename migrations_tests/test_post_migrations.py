@@ -0,0 +1,107 @@
+import os
+from alley import Migrations
+from unittest import TestCase
+from blog.db import db
+from blog.settings import settings
+from blog.utils.crypto import blind_index, encrypt_content, decrypt_content
+from blog.utils.text import excerpt
+from tests.utils import drop_database, random_string
+
+
+MIGRATION_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POST_COLLECTION = 'post'
+POST_LIKE_COLLECTION = 'post_like'
+POST_VIEW_COLLECTION = 'post_view'
+COMMENT_COLLECTION = 'comment'
+COMMENT_LIKE_COLLECTION = 'comment_like'
+
+
+def generate_v0_posts(count: int = 5) -> list:
+    """
+    Generate post mongo documents without engagement counters.
+
+    :param count: Number of post documents to generate.
+    :type count: int
+    :return: [ObjectId, ...]
+    """
+    result = db[POST_COLLECTION].insert_many([{
+        'author': random_string(24),
+        'title': random_string(10),
+        'content': random_string(124)} for _ in range(count)])
+    return result.inserted_ids
+
+
+class PostMigrationTests(TestCase):
+
+    POST_DOC_COUNT = 5
+
+    def setUp(self):
+        drop_database(False)
+        self.migrations = Migrations(MIGRATION_PATH, db)
+
+    def test_migration_0002(self):
+        migration_key = '0002'
+        post_ids = generate_v0_posts(self.POST_DOC_COUNT)
+        # engage with posts by index, ie: the nth post has n likes, views and comments
+        for index, post_id in enumerate(str(post_id) for post_id in post_ids):
+            for _ in range(index):
+                db[POST_LIKE_COLLECTION].insert_one({'post_id': post_id, 'user_id': random_string(24)})
+                db[POST_VIEW_COLLECTION].insert_one({'post_id': post_id, 'user_id': random_string(24)})
+                comment = db[COMMENT_COLLECTION].insert_one({
+                    'post_id': post_id,
+                    'author': random_string(24),
+                    'content': random_string(10)})
+                db[COMMENT_LIKE_COLLECTION].insert_one({
+                    'comment_id': str(comment.inserted_id),
+                    'user_id': random_string(24)})
+        for post in db[POST_COLLECTION].find():
+            self.assertNotIn('likes', post)
+        self.migrations.up(migration_key)
+        for index, post_id in enumerate(post_ids):
+            post = db[POST_COLLECTION].find_one({'_id': post_id})
+            self.assertEqual(post['likes'], index)
+            self.assertEqual(post['views'], index)
+            self.assertEqual(post['comments'], index)
+        for comment in db[COMMENT_COLLECTION].find():
+            self.assertEqual(comment['likes'], 1)
+        self.migrations.down(migration_key)
+        for post in db[POST_COLLECTION].find():
+            self.assertNotIn('likes', post)
+            self.assertNotIn('views', post)
+            self.assertNotIn('comments', post)
+        for comment in db[COMMENT_COLLECTION].find():
+            self.assertNotIn('likes', comment)
+
+    def test_migration_0005(self):
+        migration_key = '0005'
+        contents = [random_string(124) for _ in range(self.POST_DOC_COUNT)]
+        db[POST_COLLECTION].insert_many([{
+            'author': random_string(24),
+            'title': random_string(10),
+            'description': encrypt_content(content[:20]),
+            'content': encrypt_content(content)} for content in contents])
+        self.migrations.up(migration_key)
+        for post in db[POST_COLLECTION].find():
+            content = next(content for content in contents if blind_index(content) == post['content_tokens'])
+            self.assertEqual(post['description_tokens'], blind_index(content[:20]))
+        self.assertIn('content_tokens_1', db[POST_COLLECTION].index_information())
+        self.migrations.down(migration_key)
+        self.assertNotIn('content_tokens_1', db[POST_COLLECTION].index_information())
+        for post in db[POST_COLLECTION].find():
+            self.assertNotIn('content_tokens', post)
+            self.assertNotIn('description_tokens', post)
+
+    def test_migration_0006(self):
+        migration_key = '0006'
+        contents = [' '.join(random_string(10) for _ in range(100)) for _ in range(self.POST_DOC_COUNT)]
+        db[POST_COLLECTION].insert_many([{
+            'author': random_string(24),
+            'title': random_string(10),
+            'content': encrypt_content(content)} for content in contents])
+        self.migrations.up(migration_key)
+        excerpts = {excerpt(content, settings.rules.post.excerpt_max_char) for content in contents}
+        for post in db[POST_COLLECTION].find():
+            self.assertIn(decrypt_content(post['excerpt']), excerpts)
+        self.migrations.down(migration_key)
+        for post in db[POST_COLLECTION].find():
+            self.assertNotIn('excerpt', post)
@@ -0,0 +1,230 @@
+import json
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+import falcon
+from falcon import testing
+from falcon_redis_cache.hooks import CacheProvider
+from redis import StrictRedis
+from blog.blog import api
+from blog.constants import BLOG_REDIS_HOST, BLOG_REDIS_PORT
+from blog.middleware.cache import TieredCacheMiddleware
+from blog.resources.base import BaseResource
+from blog.utils.cache import RESPONSE_REFRESH_ENVIRON, ResponseCache, get_response_cache, resource_cache_key, \
+    lease_key, stale_key, fresh_key, acquire_lease, release_lease
+
+
+class ResponseCacheTests(TestCase):
+
+    def test_byte_bounded_eviction(self):
+        """Verify least recently used responses are evicted once the cache exceeds its size"""
+        cache = ResponseCache(max_size=30, ttl=60)
+        cache.put('a', b'1' * 9)
+        cache.put('b', b'2' * 9)
+        cache.put('c', b'3' * 9)
+        self.assertEqual(cache.size, 30)
+        # mark a as recently used, b is evicted first
+        self.assertEqual(cache.get('a'), b'1' * 9)
+        cache.put('d', b'4' * 9)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1' * 9)
+        self.assertEqual(cache.get('d'), b'4' * 9)
+        self.assertEqual(cache.size, 30)
+        self.assertEqual(cache.stats().get('evictions'), 1)
+        # responses larger than the cache are never held
+        cache.put('e', b'5' * 30)
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(cache.size, 30)
+
+    def test_ttl_expiry(self):
+        """Verify responses expire after the lesser of their ttl and the ttl of the cache"""
+        cache = ResponseCache(max_size=1024, ttl=5)
+        now = time.monotonic()
+        with patch('blog.utils.cache.time.monotonic', return_value=now):
+            cache.put('a', b'1')
+            cache.put('b', b'2', ttl=1)
+            cache.put('c', b'3', ttl=60)
+        with patch('blog.utils.cache.time.monotonic', return_value=now + 2):
+            self.assertEqual(cache.get('a'), b'1')
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('c'), b'3')
+        with patch('blog.utils.cache.time.monotonic', return_value=now + 5):
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.size, 0)
+
+    def test_prefix_eviction(self):
+        """Verify responses cached under every query of a resource are evicted by prefix"""
+        cache = ResponseCache(max_size=1024, ttl=60)
+        cache.put('http://blog/v1/posts?start=0', b'1')
+        cache.put('http://blog/v1/posts?start=10', b'2')
+        cache.put('http://blog/v1/post/1', b'3')
+        cache.evict([], ['http://blog/v1/posts'])
+        self.assertIsNone(cache.get('http://blog/v1/posts?start=0'))
+        self.assertIsNone(cache.get('http://blog/v1/posts?start=10'))
+        self.assertEqual(cache.get('http://blog/v1/post/1'), b'3')
+        cache.evict(['http://blog/v1/post/1'])
+        self.assertIsNone(cache.get('http://blog/v1/post/1'))
+        self.assertEqual(cache.size, 0)
+
+    def test_disabled(self):
+        """Verify caches without size or ttl hold nothing"""
+        for cache in (ResponseCache(max_size=0, ttl=60), ResponseCache(max_size=1024, ttl=0)):
+            self.assertFalse(cache.enabled)
+
+
+class ResponseCacheBroadcastTests(testing.TestCase):
+
+    def setUp(self):
+        super(ResponseCacheBroadcastTests, self).setUp()
+        # binds the redis client invalidations are broadcast with
+        self.app = api
+
+    def test_broadcast_eviction(self):
+        """Verify invalidations are broadcast to the caches of every worker"""
+        channel = 'response-cache:test'
+        worker, other_worker = ResponseCache(1024, 60, channel), ResponseCache(1024, 60, channel)
+        worker.put('a', b'1')
+        worker.put('b', b'2')
+        worker.listen()
+        deadline = time.monotonic() + 5
+        while not worker.client.pubsub_numsub(channel)[0][1] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        other_worker.invalidate(['a'])
+        while worker.get('a') is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(worker.get('a'))
+        self.assertEqual(worker.get('b'), b'2')
+
+
+class RenderedResource(BaseResource):
+
+    route = '/v1/rendered/'
+
+    def __init__(self, delay: float = 0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.renders = 0
+        self.lock = threading.Lock()
+
+    @CacheProvider.from_cache
+    def on_get(self, req, resp):
+        with self.lock:
+            self.renders += 1
+            failed = self.renders <= self.failures
+        time.sleep(self.delay)
+        if failed:
+            raise falcon.HTTPInternalServerError()
+        resp.body = json.dumps({'rendered': True})
+
+
+class RevalidatedResource(BaseResource):
+
+    route = '/v1/revalidated/'
+    cache_soft_ttl = 30
+    cache_hard_ttl = 600
+
+    def __init__(self):
+        self.renders = 0
+
+    @CacheProvider.from_cache
+    def on_get(self, req, resp):
+        self.renders += 1
+        resp.body = json.dumps({'renders': self.renders})
+
+
+class ResponseCoalescingTests(testing.TestCase):
+
+    def setUp(self):
+        super(ResponseCoalescingTests, self).setUp()
+        self.client = StrictRedis(host=BLOG_REDIS_HOST, port=BLOG_REDIS_PORT)
+        self.client.flushdb()
+        get_response_cache().clear()
+        self.middleware = TieredCacheMiddleware(BLOG_REDIS_HOST, BLOG_REDIS_PORT)
+        self.app = falcon.API(middleware=[self.middleware])
+        self.middleware.bind(self.app)
+
+    def serve(self, resource, count: int) -> list:
+        """Request resource from concurrent threads, returns their responses."""
+        self.app.add_route(resource.route, resource)
+        barrier = threading.Barrier(count)
+        responses = [None] * count
+
+        def request(index: int):
+            barrier.wait()
+            responses[index] = self.simulate_get(resource.route)
+
+        threads = [threading.Thread(target=request, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_coalesce_missing_response(self):
+        """Verify concurrent requests missing a response render it once"""
+        resource = RenderedResource(delay=0.2)
+        responses = self.serve(resource, 8)
+        self.assertEqual(resource.renders, 1)
+        for res in responses:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json, {'rendered': True})
+
+    def test_coalesce_failed_render(self):
+        """Verify requests waiting on a failed render render the response themselves"""
+        resource = RenderedResource(delay=0.2, failures=1)
+        responses = self.serve(resource, 2)
+        self.assertEqual(resource.renders, 2)
+        self.assertEqual(sorted(res.status_code for res in responses), [200, 500])
+
+    def test_coalesce_stale_response(self):
+        """Verify requests timing out on the lease of another worker are served the stale response"""
+        resource = RenderedResource()
+        self.app.add_route(resource.route, resource)
+        key = resource_cache_key(falcon.Request(testing.create_environ()), RenderedResource)
+        self.client.set(lease_key(key), 'other-worker')
+        self.client.set(stale_key(key), b'{"rendered": false}')
+        with patch('blog.utils.cache.BLOG_RESPONSE_LEASE_WAIT', 0.1):
+            res = self.simulate_get(resource.route)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json, {'rendered': False})
+        self.assertEqual(resource.renders, 0)
+
+    def test_release_taken_over_lease(self):
+        """Verify expired leases taken over by another worker are not released by their former holder"""
+        token = acquire_lease(self.client, 'leased')
+        self.assertTrue(token)
+        self.assertIsNone(acquire_lease(self.client, 'leased'))
+        # lease expires and is acquired by another worker
+        self.client.delete(lease_key('leased'))
+        other_token = acquire_lease(self.client, 'leased')
+        release_lease(self.client, 'leased', token)
+        self.assertEqual(self.client.get(lease_key('leased')).decode('utf-8'), other_token)
+        release_lease(self.client, 'leased', other_token)
+        self.assertIsNone(self.client.get(lease_key('leased')))
+
+    def test_revalidate_stale_response(self):
+        """Verify responses past their soft ttl are served while re-rendered"""
+        resource = RevalidatedResource()
+        self.app.add_route(resource.route, resource)
+        key = resource_cache_key(falcon.Request(testing.create_environ()), RevalidatedResource)
+        self.assertEqual(self.simulate_get(resource.route).json, {'renders': 1})
+        self.assertTrue(self.client.exists(fresh_key(key)))
+        # response passes its soft ttl
+        self.client.delete(fresh_key(key))
+        get_response_cache().clear()
+        with patch.object(self.middleware, 'revalidate') as revalidate:
+            self.assertEqual(self.simulate_get(resource.route).json, {'renders': 1})
+        revalidate.assert_called_once()
+        self.assertEqual(resource.renders, 1)
+        # re-render as the refresh executor would
+        token = acquire_lease(self.client, key)
+        env = testing.create_environ(path=resource.route)
+        env[RESPONSE_REFRESH_ENVIRON] = True
+        self.middleware.refresh(env, key, token)
+        self.assertEqual(resource.renders, 2)
+        self.assertEqual(json.loads(self.client.get(key)), {'renders': 2})
+        self.assertTrue(self.client.exists(fresh_key(key)))
+        self.assertIsNone(self.client.get(lease_key(key)))
+        self.assertEqual(self.simulate_get(resource.route).json, {'renders': 2})
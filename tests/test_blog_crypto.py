@@ -0,0 +1,93 @@
+import os
+from unittest import TestCase
+from blog.utils.crypto import PlaintextCache, EnvelopeCipher, ENVELOPE_FLAG_ZLIB
+
+
+COMPRESS_THRESHOLD = 512
+
+
+class PlaintextCacheTests(TestCase):
+
+    def test_byte_bounded_eviction(self):
+        """Verify least recently used plaintext is evicted once the cache exceeds its size"""
+        keys = [PlaintextCache.key(f'ciphertext {index}') for index in range(4)]
+        entry_size = PlaintextCache.sizeof(keys[0], 'plaintext')
+        cache = PlaintextCache(entry_size * 3)
+        for key in keys[:3]:
+            cache.put(key, 'plaintext')
+        self.assertEqual(cache.size, entry_size * 3)
+        # mark first entry as recently used, the second is evicted first
+        self.assertEqual(cache.get(keys[0]), 'plaintext')
+        cache.put(keys[3], 'plaintext')
+        self.assertIsNone(cache.get(keys[1]))
+        for key in (keys[0], keys[2], keys[3]):
+            self.assertEqual(cache.get(key), 'plaintext')
+        self.assertEqual(cache.size, entry_size * 3)
+        self.assertEqual(cache.stats().get('evictions'), 1)
+        self.assertEqual(cache.stats().get('entries'), 3)
+
+    def test_oversized_entry(self):
+        """Verify plaintext larger than the cache is never held"""
+        key = PlaintextCache.key(b'ciphertext')
+        cache = PlaintextCache(PlaintextCache.sizeof(key, 'plaintext'))
+        cache.put(key, 'plaintext')
+        cache.put(PlaintextCache.key(b'long ciphertext'), 'plaintext' * 10)
+        self.assertEqual(cache.get(key), 'plaintext')
+        self.assertEqual(cache.stats().get('entries'), 1)
+        self.assertEqual(cache.stats().get('evictions'), 0)
+
+    def test_counters(self):
+        """Verify hits and misses are counted"""
+        cache = PlaintextCache(1024)
+        key = PlaintextCache.key(b'ciphertext')
+        self.assertIsNone(cache.get(key))
+        cache.put(key, 'plaintext')
+        cache.get(key)
+        cache.get(key)
+        stats = cache.stats()
+        self.assertEqual(stats.get('hits'), 2)
+        self.assertEqual(stats.get('misses'), 1)
+        self.assertEqual(stats.get('size'), PlaintextCache.sizeof(key, 'plaintext'))
+        self.assertEqual(stats.get('max_size'), 1024)
+        cache.clear()
+        self.assertEqual(cache.stats().get('entries'), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_disabled(self):
+        """Verify caches without size hold nothing"""
+        cache = PlaintextCache(0)
+        self.assertFalse(cache.enabled)
+        key = PlaintextCache.key(b'ciphertext')
+        cache.put(key, 'plaintext')
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.size, 0)
+
+
+class EnvelopeCompressionTests(TestCase):
+
+    def setUp(self):
+        self.cipher = EnvelopeCipher({0: 'content key'}, 0)
+
+    def test_compressed_content(self):
+        """Verify repetitive content above the threshold is compressed and decrypted back"""
+        content = 'compressible content ' * 50
+        self.assertGreater(len(content.encode('utf-8')), COMPRESS_THRESHOLD)
+        enc = self.cipher.encrypt(content, COMPRESS_THRESHOLD)
+        self.assertTrue(enc[1] & ENVELOPE_FLAG_ZLIB)
+        self.assertLess(len(enc), len(content))
+        self.assertEqual(self.cipher.decrypt(enc), content)
+
+    def test_incompressible_content(self):
+        """Verify content larger once compressed is stored as is"""
+        # random tokens are too short to offset the zlib header and checksum
+        content = os.urandom(16).hex()
+        enc = self.cipher.encrypt(content, 1)
+        self.assertFalse(enc[1] & ENVELOPE_FLAG_ZLIB)
+        self.assertEqual(self.cipher.decrypt(enc), content)
+
+    def test_content_below_threshold(self):
+        """Verify content below the threshold is never compressed"""
+        content = 'a' * (COMPRESS_THRESHOLD - 1)
+        enc = self.cipher.encrypt(content, COMPRESS_THRESHOLD)
+        self.assertFalse(enc[1] & ENVELOPE_FLAG_ZLIB)
+        self.assertEqual(self.cipher.decrypt(enc), content)
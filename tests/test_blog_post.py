@@ -1,12 +1,21 @@
 import time
+from unittest.mock import patch
 from falcon.testing import TestCase
+from redis import StrictRedis
 from blog.blog import api
+from blog.constants import BLOG_CONTENT_KEY, BLOG_REDIS_HOST, BLOG_REDIS_PORT
+from blog.db import Post, PostLike, PostView, ReencryptCheckpoint
+from blog.jobs.reencrypt import ENCRYPTED_FIELDS, reencrypt, reencrypt_batch, get_checkpoint
+from blog.jobs.views import flush_post_views
 from blog.mediatypes import PostFormDtoSerializer, CommentFormDtoSerializer, \
     PostSearchSettingsDto, PostSearchSettingsDtoSerializer, PostSearchOptions
 from blog.resources.posts import PostResource, PostCollectionResource, \
-    PostSearchResource
+    PostSearchResource, PostLikeResource, PostViewResource
 from blog.settings import settings
+from blog.utils.cache import post_tag, tag_key
+from blog.utils.crypto import AESCipher, decrypt_content, get_cipher
 from blog.utils.serializers import to_json
+from blog.utils.text import excerpt
 from tests.generators.comments import generate_comment_form_dto
 from tests.generators.posts import generate_post_form_dto
 from tests.mocks.users import create_user
@@ -105,7 +114,9 @@ class BlogPostTests(TestCase):
         for res, post in zip(posts, post_collection[5:]):
             self.assertEqual(res['title'], post.title)
             self.assertEqual(res['description'], post.description)
-            self.assertEqual(res['content'], post.content)
+            # collections only return an excerpt of post content by default
+            self.assertEqual(res['excerpt'], post.content)
+            self.assertIsNone(res['content'])
             self.assertEqual(res['private'], post.private)
             self.assertEqual(res['featured'], post.featured)
             self.assertEqual(len(res['tags']), len(post.tags))
@@ -115,6 +126,59 @@ class BlogPostTests(TestCase):
         post_collection_res = self.simulate_get(PostCollectionResource.route, params={'start': 5, 'count': 10})
         self.assertEqual(len(post_collection_res.json.get('posts')), 5)
 
+    def test_post_collection_cursor_pagination(self):
+        """Verify post collection can be paginated with cursors"""
+        post_collection = [generate_post_form_dto() for _ in range(10)]
+        for post in post_collection:
+            self.simulate_post(
+                PostCollectionResource.route,
+                body=to_json(PostFormDtoSerializer, post),
+                headers=self.headers)
+        post_collection_res = self.simulate_get(PostCollectionResource.route, params={'count': 4})
+        self.assertEqual(post_collection_res.status_code, 200)
+        found_posts = post_collection_res.json.get('posts')
+        cursor = post_collection_res.json.get('nextCursor')
+        # follow cursors until a partial page is returned
+        while cursor:
+            post_collection_res = self.simulate_get(PostCollectionResource.route, params={'count': 4, 'cursor': cursor})
+            self.assertEqual(post_collection_res.status_code, 200)
+            found_posts.extend(post_collection_res.json.get('posts'))
+            cursor = post_collection_res.json.get('nextCursor')
+        self.assertEqual(len(found_posts), len(post_collection))
+        for res, post in zip(found_posts, post_collection):
+            self.assertEqual(res['title'], post.title)
+        # ensure malformed cursors are rejected
+        post_collection_res = self.simulate_get(PostCollectionResource.route, params={'count': 4, 'cursor': 'invalid'})
+        self.assertEqual(post_collection_res.status_code, 400)
+
+    def test_post_collection_excerpt(self):
+        """Verify post collections return excerpts of long post content"""
+        words = [random_string(9) for _ in range(settings.rules.post.excerpt_max_char)]
+        post_form_dto = generate_post_form_dto(content=' '.join(words))
+        self.simulate_post(
+            PostCollectionResource.route,
+            body=to_json(PostFormDtoSerializer, post_form_dto),
+            headers=self.headers)
+        post_collection_res = self.simulate_get(PostCollectionResource.route)
+        found_post = post_collection_res.json.get('posts')[0]
+        self.assertEqual(found_post.get('excerpt'), excerpt(post_form_dto.content, settings.rules.post.excerpt_max_char))
+        self.assertLessEqual(len(found_post.get('excerpt')), settings.rules.post.excerpt_max_char)
+        self.assertTrue(found_post.get('excerpt').endswith('…'))
+        # excerpts end at a word boundary
+        self.assertTrue(post_form_dto.content.startswith(found_post.get('excerpt')[:-1] + ' '))
+        self.assertIsNone(found_post.get('content'))
+        post_res = self.simulate_get(normalize_href(found_post.get('href')))
+        self.assertEqual(post_res.json.get('content'), post_form_dto.content)
+
+    def test_post_collection_cache_control(self):
+        """Verify post collections may be served while revalidated"""
+        cache_control = f'public, max-age=0, stale-while-revalidate={PostCollectionResource.cache_soft_ttl}'
+        # rendered and cached responses alike
+        for _ in range(2):
+            post_collection_res = self.simulate_get(PostCollectionResource.route)
+            self.assertEqual(post_collection_res.status_code, 200)
+            self.assertEqual(post_collection_res.headers.get('cache-control'), cache_control)
+
     def test_search_post_critera(self):
         """Verify post resources can be searched by critera"""
         post_collection = [generate_post_form_dto() for _ in range(10)]
@@ -130,12 +194,14 @@ class BlogPostTests(TestCase):
         post_search_res = self.simulate_post(
             PostSearchResource.route,
             body=to_json(PostSearchSettingsDtoSerializer, search_settings),
-            headers=self.headers)
+            headers=self.headers,
+            params={'content': True})
         self.assertEqual(post_search_res.status_code, 201)
         self.assertEqual(len(post_search_res.json.get('posts')), 1)
         found_post = post_search_res.json.get('posts')[0]
         self.assertEqual(target_post.title, found_post.get('title'))
         self.assertEqual(target_post.description, found_post.get('description'))
+        self.assertEqual(target_post.content, found_post.get('excerpt'))
         self.assertEqual(target_post.content, found_post.get('content'))
         self.assertEqual(target_post.private, found_post.get('private'))
         self.assertEqual(target_post.featured, found_post.get('featured'))
@@ -158,6 +224,37 @@ class BlogPostTests(TestCase):
         self.assertEqual(post_search_res.status_code, 201)
         self.assertEqual(len(post_search_res.json.get('posts')), 10)
 
+    def test_search_post_short_query(self):
+        """Verify post content searches without a word of blind indexed length are rejected"""
+        self.simulate_post(
+            PostCollectionResource.route,
+            body=to_json(PostFormDtoSerializer, generate_post_form_dto()),
+            headers=self.headers)
+        search_settings = PostSearchSettingsDto(
+            query='ab',
+            options=[PostSearchOptions.CONTENT])
+        post_search_res = self.simulate_post(
+            PostSearchResource.route,
+            body=to_json(PostSearchSettingsDtoSerializer, search_settings),
+            headers=self.headers)
+        self.assertEqual(post_search_res.status_code, 400)
+
+    def test_search_post_rate_limit(self):
+        """Verify post searches are limited to one per search delay"""
+        search_settings = PostSearchSettingsDto(
+            query=self.user.username,
+            options=[PostSearchOptions.AUTHOR])
+        post_search_res = self.simulate_post(
+            PostSearchResource.route,
+            body=to_json(PostSearchSettingsDtoSerializer, search_settings),
+            headers=self.headers)
+        self.assertEqual(post_search_res.status_code, 201)
+        post_search_res = self.simulate_post(
+            PostSearchResource.route,
+            body=to_json(PostSearchSettingsDtoSerializer, search_settings),
+            headers=self.headers)
+        self.assertEqual(post_search_res.status_code, 403)
+
     def test_post_search_pagination(self):
         """Verify post search results are paginated"""
         post_collection = [generate_post_form_dto() for _ in range(10)]
@@ -183,7 +280,8 @@ class BlogPostTests(TestCase):
         for res, post in zip(posts, post_collection[5:]):
             self.assertEqual(res['title'], post.title)
             self.assertEqual(res['description'], post.description)
-            self.assertEqual(res['content'], post.content)
+            self.assertEqual(res['excerpt'], post.content)
+            self.assertIsNone(res['content'])
             self.assertEqual(res['private'], post.private)
             self.assertEqual(res['featured'], post.featured)
             self.assertEqual(len(res['tags']), len(post.tags))
@@ -208,6 +306,93 @@ class BlogPostTests(TestCase):
         self.simulate_put(post_like_href, headers=self.headers)
         post_res = self.simulate_get(post_href)
         self.assertEqual(post_res.json.get('likes'), 0)
+        # explicit likes and dislikes are idempotent
+        for _ in range(2):
+            like_res = self.simulate_put(post_like_href, headers=self.headers, params={'liked': 'true'})
+            self.assertEqual(like_res.json, {'liked': True, 'likes': 1})
+        for _ in range(2):
+            like_res = self.simulate_delete(post_like_href, headers=self.headers)
+            self.assertEqual(like_res.json, {'liked': False, 'likes': 0})
+        # likes of posts which do not exist are never written
+        missing_post_like_href = PostLikeResource.url_to('', post_id='0' * 24)
+        self.assertEqual(self.simulate_put(missing_post_like_href, headers=self.headers).status_code, 404)
+        self.assertEqual(PostLike.objects(post_id='0' * 24).count(), 0)
+
+    def test_like_post_cache_eviction(self):
+        """Verify liking a post only evicts cached responses including the liked post"""
+        for _ in range(2):
+            self.simulate_post(
+                PostCollectionResource.route,
+                body=to_json(PostFormDtoSerializer, generate_post_form_dto()),
+                headers=self.headers)
+        liked_post, other_post = Post.objects.order_by('created')
+        for post in (liked_post, other_post):
+            self.assertEqual(self.simulate_get(PostResource.url_to('', post_id=post.id)).status_code, 200)
+        client = StrictRedis(host=BLOG_REDIS_HOST, port=BLOG_REDIS_PORT)
+        liked_keys = client.smembers(tag_key(post_tag(liked_post.id)))
+        other_keys = client.smembers(tag_key(post_tag(other_post.id)))
+        self.assertTrue(liked_keys)
+        self.assertTrue(other_keys)
+        self.assertTrue(all(client.exists(key) for key in liked_keys | other_keys))
+        self.simulate_put(PostLikeResource.url_to('', post_id=liked_post.id), headers=self.headers)
+        self.assertFalse(any(client.exists(key) for key in liked_keys))
+        self.assertTrue(all(client.exists(key) for key in other_keys))
+        post_res = self.simulate_get(PostResource.url_to('', post_id=liked_post.id))
+        self.assertEqual(post_res.json.get('likes'), 1)
+
+    def test_reencrypt_legacy_post(self):
+        """Verify legacy encrypted post resources are readable and re-encrypted"""
+        post_form_dto = generate_post_form_dto()
+        self.simulate_post(
+            PostCollectionResource.route,
+            body=to_json(PostFormDtoSerializer, post_form_dto),
+            headers=self.headers)
+        post = Post.objects.first()
+        Post.objects(pk=post.id).update_one(set__content=AESCipher(BLOG_CONTENT_KEY).encrypt(post_form_dto.content))
+        post_res = self.simulate_get(PostResource.url_to('', post_id=post.id))
+        self.assertEqual(post_res.json.get('content'), post_form_dto.content)
+        reencrypt()
+        self.assertIsInstance(Post._get_collection().find_one({'_id': post.id})['content'], bytes)
+        self.assertEqual(decrypt_content(Post.objects.first().content), post_form_dto.content)
+        # progress is checkpointed, completed collections are skipped by later runs
+        self.assertTrue(ReencryptCheckpoint.objects.get(collection=Post._get_collection_name()).completed)
+
+    def test_reencrypt_rotated_key(self):
+        """Verify post resources are re-encrypted once the content key is rotated, resuming from checkpoints"""
+        post_collection = [generate_post_form_dto() for _ in range(3)]
+        for post in post_collection:
+            self.simulate_post(
+                PostCollectionResource.route,
+                body=to_json(PostFormDtoSerializer, post),
+                headers=self.headers)
+        posts = list(Post.objects.order_by('id'))
+        rotated_keys = {0: BLOG_CONTENT_KEY, 1: random_string(24)}
+        get_cipher.cache_clear()
+        try:
+            with patch('blog.utils.crypto.BLOG_CONTENT_KEYS', rotated_keys), \
+                    patch('blog.utils.crypto.BLOG_CONTENT_KEY_ID', 1):
+                cipher = get_cipher()
+                self.assertFalse(any(cipher.is_current(post.content) for post in posts))
+                # interrupted after the first batch
+                checkpoint = get_checkpoint(Post)
+                modified, checkpoint.after = reencrypt_batch(Post, ENCRYPTED_FIELDS[Post], 1)
+                checkpoint.modified = modified
+                checkpoint.save()
+                self.assertEqual(modified, 1)
+                # documents before the checkpoint are not read again once resumed
+                Post.objects(pk=posts[0].id).update_one(set__content=posts[0].content)
+                reencrypt()
+                checkpoint = ReencryptCheckpoint.objects.get(collection=Post._get_collection_name())
+                self.assertTrue(checkpoint.completed)
+                self.assertEqual(checkpoint.key_id, 1)
+                self.assertEqual(checkpoint.modified, 3)
+                stored = {post.id: post.content for post in Post.objects}
+                self.assertFalse(cipher.is_current(stored[posts[0].id]))
+                self.assertTrue(all(cipher.is_current(stored[post.id]) for post in posts[1:]))
+                for post, post_form_dto in zip(posts, post_collection):
+                    self.assertEqual(decrypt_content(stored[post.id]), post_form_dto.content)
+        finally:
+            get_cipher.cache_clear()
 
     def test_view_post(self):
         """Verify post resources can be viewed"""
@@ -219,11 +404,19 @@ class BlogPostTests(TestCase):
         created_post = post_collection_res.json.get('posts')[0]
         post_href = normalize_href(created_post.get('href'))
         self.assertEqual(created_post.get('views'), 0)
+        # cached post responses are evicted once views are flushed
+        self.assertEqual(self.simulate_get(post_href).json.get('views'), 0)
         post_view_href = normalize_href(
             next(ln.get('href') for ln in created_post.get('links') if ln.get('rel') == 'post-view'))
         self.simulate_put(post_view_href, headers=self.headers)
+        # views of posts which do not exist are accepted, then discarded once flushed
+        missing_post_view_href = PostViewResource.url_to('', post_id='0' * 24)
+        self.simulate_put(missing_post_view_href, headers=self.headers)
+        # views are buffered until flushed
+        flush_post_views()
         post_res = self.simulate_get(post_href)
         self.assertEqual(post_res.json.get('views'), 1)
+        self.assertEqual(PostView.objects(post_id='0' * 24).count(), 0)
 
     def test_comment_post(self):
         """Verify comment resources can be created, updated, and deleted"""
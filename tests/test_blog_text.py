@@ -0,0 +1,26 @@
+from unittest import TestCase
+from blog.utils.text import ELLIPSIS, excerpt
+
+
+class TextTests(TestCase):
+
+    def test_excerpt(self):
+        """Verify text is shortened at a word boundary"""
+        self.assertEqual(excerpt('hello world', 20), 'hello world')
+        self.assertEqual(excerpt('hello world', 11), 'hello world')
+        self.assertEqual(excerpt('hello world', 10), f'hello{ELLIPSIS}')
+        # single words are cut
+        self.assertEqual(excerpt('helloworld', 6), f'hello{ELLIPSIS}')
+        # excerpts are left unchanged when shortened again
+        shortened = excerpt('hello brave new world', 12)
+        self.assertLessEqual(len(shortened), 12)
+        self.assertEqual(excerpt(shortened, 12), shortened)
+
+    def test_excerpt_max_char(self):
+        """Verify excerpts are never longer than max_char"""
+        self.assertEqual(excerpt('hello', 1), ELLIPSIS)
+        self.assertEqual(excerpt('hello', 0), '')
+        self.assertEqual(excerpt('hello', -1), '')
+        self.assertEqual(excerpt('', 0), '')
+        for max_char in range(-1, 8):
+            self.assertLessEqual(len(excerpt('hello world', max_char)), max(max_char, 0))
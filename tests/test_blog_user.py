@@ -4,12 +4,17 @@ import io
 import os
 import time
 from falcon.testing import TestCase
+from r2dto import ValidationError
 from blog.blog import api
 from blog.constants import BLOG_FAKE_S3_HOST, BLOG_AWS_S3_BUCKET
-from blog.mediatypes import UserFormDtoSerializer
-from blog.resources.users import UserResource, BLOG_USER_RESOURCE_HREF_REL
-from blog.settings import settings, save_settings, SettingsSerializer
+from blog.core.users import invalidate_session
+from blog.db import User
+from blog.mediatypes import UserFormDtoSerializer, UserAuthDto, UserAuthDtoSerializer, UserRoles
+from blog.resources.admin import BlogMetricsResource
+from blog.resources.users import UserResource, UserAuthenticationResource, BLOG_USER_RESOURCE_HREF_REL
+from blog.settings import settings, save_settings, SettingsSerializer, PasswordSettingsSerializer
 from blog.utils.serializers import to_json
+from blog.utils.sessions import get_session_cache
 from tests.generators.users import generate_user_form_dto
 from tests.mocks.users import create_user, create_auth_token
 from tests.utils import drop_database, normalize_href, random_string, find_link_href_json
@@ -82,6 +87,63 @@ class BlogPostTests(TestCase):
         self.assertEqual(user_profile_res.json.get('email'), user_profile.email)
         self.assertEqual(user_profile_res.json.get('fullName'), user_profile.full_name)
 
+    def test_user_session_cache(self):
+        """Ensure authenticated users are cached and reloaded once changed."""
+        sessions = get_session_cache()
+        user_res = self.simulate_get(UserResource.route, headers=self.headers)
+        self.assertEqual(user_res.status_code, 200)
+        # verify the session of the first request is reused
+        hits = sessions.stats().get('hits')
+        self.assertEqual(self.simulate_get(UserResource.route, headers=self.headers).status_code, 200)
+        self.assertGreater(sessions.stats().get('hits'), hits)
+        # verify edited users are reloaded
+        invalidations = sessions.stats().get('invalidations')
+        user_profile = generate_user_form_dto()
+        put_user_res = self.simulate_put(
+            UserResource.route,
+            body=to_json(UserFormDtoSerializer, user_profile),
+            headers=self.headers)
+        self.assertEqual(put_user_res.status_code, 204)
+        self.assertGreater(sessions.stats().get('invalidations'), invalidations)
+        user_res = self.simulate_get(UserResource.route, headers=self.headers)
+        self.assertEqual(user_res.json.get('email'), user_profile.email)
+        self.assertEqual(user_res.json.get('fullName'), user_profile.full_name)
+        # verify users are reloaded once their avatar is uploaded
+        invalidations, misses = sessions.stats().get('invalidations'), sessions.stats().get('misses')
+        avatar_path = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests/resources/afro.jpg'))
+        body, headers = create_multipart_form(open(avatar_path, 'rb').read(), 'image', avatar_path, 'image/jpeg')
+        upload_headers = self.headers.copy()
+        upload_headers.update(headers)
+        avatar_res = self.simulate_post(
+            normalize_href(find_link_href_json(user_res.json.get('links'),
+                                               BLOG_USER_RESOURCE_HREF_REL.USER_AVATAR_UPLOAD)),
+            headers=upload_headers,
+            body=body)
+        self.assertEqual(avatar_res.status_code, 201)
+        self.assertGreater(sessions.stats().get('invalidations'), invalidations)
+        user_res = self.simulate_get(UserResource.route, headers=self.headers)
+        self.assertEqual(user_res.status_code, 200)
+        self.assertGreater(sessions.stats().get('misses'), misses)
+        avatar_res = self.simulate_get(normalize_href(user_res.json.get('avatarHref')))
+        self.assertEqual(avatar_res.headers.get('content-type'), 'image/jpeg')
+
+    def test_blog_metrics(self):
+        """Ensure blog metrics are only available to administrators."""
+        metrics_res = self.simulate_get(BlogMetricsResource.route, headers=self.headers)
+        self.assertEqual(metrics_res.status_code, 401)
+        user = User.objects.get(username=self.user.username)
+        user.update(set__role=UserRoles.ADMIN)
+        # cached sessions keep their role until invalidated
+        invalidate_session(user.id)
+        metrics_res = self.simulate_get(BlogMetricsResource.route, headers=self.headers)
+        self.assertEqual(metrics_res.status_code, 200)
+        sessions = metrics_res.json.get('sessions')
+        self.assertGreaterEqual(sessions.get('hits'), 1)
+        self.assertGreaterEqual(sessions.get('invalidations'), 1)
+        self.assertEqual(sessions.get('maxEntries'), get_session_cache().max_entries)
+        self.assertIn('hits', metrics_res.json.get('plaintext'))
+        self.assertIn('hits', metrics_res.json.get('responses'))
+
     def test_user_avatar_disabled(self):
         """Ensure user avatar resources are not accessible when the feature is disabled."""
         global settings
@@ -147,6 +209,29 @@ class BlogPostTests(TestCase):
         self.assertEqual(avatar_res.headers.get('content-type'), 'image/png')
         self.assertEqual(len(avatar_res.content), 6957)
 
+    def test_user_avatar_conditional_requests(self):
+        """Ensure avatars can be revalidated and fetched by byte range."""
+        user_res = self.simulate_get(UserResource.route, headers=self.headers)
+        avatar_href = normalize_href(user_res.json.get('avatarHref'))
+        avatar_res = self.simulate_get(avatar_href)
+        self.assertEqual(avatar_res.status_code, 200)
+        etag, last_modified = avatar_res.headers.get('etag'), avatar_res.headers.get('last-modified')
+        self.assertTrue(etag)
+        self.assertIn('max-age', avatar_res.headers.get('cache-control'))
+        # verify unchanged avatars are not sent again
+        avatar_res = self.simulate_get(avatar_href, headers={'If-None-Match': etag})
+        self.assertEqual(avatar_res.status_code, 304)
+        self.assertEqual(len(avatar_res.content), 0)
+        avatar_res = self.simulate_get(avatar_href, headers={'If-Modified-Since': last_modified})
+        self.assertEqual(avatar_res.status_code, 304)
+        # verify byte ranges are served
+        avatar_res = self.simulate_get(avatar_href, headers={'Range': 'bytes=0-99'})
+        self.assertEqual(avatar_res.status_code, 206)
+        self.assertEqual(len(avatar_res.content), 100)
+        self.assertEqual(avatar_res.headers.get('content-range'), 'bytes 0-99/6957')
+        avatar_res = self.simulate_get(avatar_href, headers={'Range': 'bytes=7000-'})
+        self.assertEqual(avatar_res.status_code, 416)
+
     def test_user_avatar_resource_s3(self):
         """Ensure a user can upload an avatar via s3 (this test was designed for fakes3)"""
         global settings
@@ -186,3 +271,64 @@ class BlogPostTests(TestCase):
         token = create_auth_token(user_id, datetime.datetime.utcnow().timestamp(), '')
         invalid_host_req = self.simulate_get(UserResource.route, headers={'Authorization': token})
         self.assertEqual(invalid_host_req.status_code, 401)
+
+    def test_user_authentication_rehash(self):
+        """Ensure users can authenticate and passwords are rehashed once password settings change"""
+        user = User.objects.get(username=self.user.username)
+        self.assertTrue(user.password.startswith(f'{settings.password.algorithm}${settings.password.cost}$'))
+        original_cost = settings.password.cost
+        settings.password.cost = original_cost + 1
+        try:
+            auth_res = self.simulate_post(
+                UserAuthenticationResource.route,
+                body=to_json(UserAuthDtoSerializer, UserAuthDto(
+                    username=self.user.username,
+                    password=self.user.password)))
+            self.assertEqual(auth_res.status_code, 201)
+            self.assertTrue(auth_res.json.get('token'))
+            user = User.objects.get(username=self.user.username)
+            self.assertTrue(user.password.startswith(f'{settings.password.algorithm}${original_cost + 1}$'))
+        finally:
+            settings.password.cost = original_cost
+
+    def test_user_authentication_rehash_failure(self):
+        """Ensure users can authenticate when their password cannot be rehashed"""
+        user = User.objects.get(username=self.user.username)
+        original_algorithm, original_cost = settings.password.algorithm, settings.password.cost
+        # scrypt work factor overflows, rejected by settings validation but set directly
+        settings.password.algorithm, settings.password.cost = 'scrypt', 100000
+        try:
+            auth_res = self.simulate_post(
+                UserAuthenticationResource.route,
+                body=to_json(UserAuthDtoSerializer, UserAuthDto(
+                    username=self.user.username,
+                    password=self.user.password)))
+            self.assertEqual(auth_res.status_code, 201)
+            self.assertEqual(User.objects.get(username=self.user.username).password, user.password)
+        finally:
+            settings.password.algorithm, settings.password.cost = original_algorithm, original_cost
+
+    def test_user_authentication_failed_logins(self):
+        """Ensure users are locked out after consecutive failed logins only"""
+        def login(password):
+            return self.simulate_post(
+                UserAuthenticationResource.route,
+                body=to_json(UserAuthDtoSerializer, UserAuthDto(username=self.user.username, password=password)))
+        # successful logins reset failed logins
+        for _ in range(settings.login.max_failed_login - 1):
+            self.assertEqual(login(random_string(16)).status_code, 201)
+        self.assertEqual(login(self.user.password).status_code, 201)
+        for _ in range(settings.login.max_failed_login):
+            self.assertEqual(login(random_string(16)).status_code, 201)
+        self.assertEqual(login(self.user.password).status_code, 403)
+
+    def test_password_settings_validation(self):
+        """Ensure password settings are bounded by algorithm"""
+        for password_settings in (
+                {'algorithm': 'md5', 'cost': 100000, 'workers': 2, 'max_pending': 8},
+                {'algorithm': 'scrypt', 'cost': 100000, 'workers': 2, 'max_pending': 8},
+                {'algorithm': 'pbkdf2_sha256', 'cost': 1, 'workers': 2, 'max_pending': 8},
+                {'algorithm': 'pbkdf2_sha256', 'cost': 100000, 'workers': 0, 'max_pending': 8}):
+            with self.assertRaises(ValidationError):
+                PasswordSettingsSerializer(data=password_settings).validate()
+        PasswordSettingsSerializer(data={'algorithm': 'scrypt', 'cost': 14, 'workers': 1, 'max_pending': 0}).validate()